@@ -0,0 +1,282 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Startup benchmarks for the Tenzir Platform CLI.
+
+Usage:
+  run.py [--runs=<n>] [--budgets=<file>] [--output=<file>] [--filter=<pattern>]
+         [--top=<n>]
+
+Options:
+  --runs=<n>          The number of timed runs per command. [default: 10]
+  --budgets=<file>    The budgets to check the results against.
+                      [default: benchmarks/budgets.json]
+  --output=<file>     Where to write the results as JSON, or '-' for stdout.
+                      [default: benchmarks/results.json]
+  --filter=<pattern>  Only run the commands matching this glob pattern,
+                      e.g. 'node *'.
+  --top=<n>           The number of packages to list in the import time
+                      breakdown of every command. [default: 10]
+
+Every command runs in a fresh interpreter, as it would for an operator:
+
+- `--help` of the CLI and of every subcommand, as well as other commands
+  that never contact the platform,
+- representative commands against a local stub of the platform API, see
+  `stub_api.py`, with a warm cache of the id token and user key.
+
+For every command, the benchmark measures the wall time of the process
+and its peak resident set size over `--runs` runs after one warm-up run,
+and breaks down the time spent on imports by package with a single run
+under `python -X importtime`.
+
+The budgets file maps glob patterns over the commands to limits; the
+`default` entry applies to all commands and later patterns override
+earlier ones:
+
+    {"default": {"wall_ms": 700}, "* --help": {"wall_ms": 120}}
+
+A budget can limit the median `wall_ms`, the `import_ms` and the
+`peak_rss_mib`, and list `forbidden_packages` that must not be imported.
+The exit status is 1 if any command exceeds its budget or fails.
+
+Run the benchmarks from the `cli` directory, in the environment of the
+CLI, e.g. `uv run python benchmarks/run.py`."""
+
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+from docopt import docopt  # type: ignore[import-untyped]
+from stub_api import WORKSPACE_NAME, StubApi
+
+from tenzir_platform.tenzir_platform import _SUBCOMMANDS
+
+# The interpreter is started just like the `tenzir-platform` script does.
+_ENTRY_POINT = "import sys; from tenzir_platform.tenzir_platform import main; sys.exit(main())"
+
+# Commands that don't contact the platform.
+_LOCAL_COMMANDS = [
+    ["--help"],
+    ["--version"],
+    *[[subcommand, "--help"] for subcommand in _SUBCOMMANDS],
+    ["tools", "print-auth-rule", "allow-all"],
+    ["tools", "generate-workspace-token", "t-12345678"],
+]
+
+# Representative commands against the stub API.
+_API_COMMANDS = [
+    ["workspace", "list"],
+    ["node", "list"],
+    ["node", "list", "--json"],
+    ["node", "ping", "node-42"],
+    ["secret", "list"],
+    ["secret", "store", "list"],
+    ["alert", "list"],
+]
+
+
+class CommandFailed(Exception):
+    pass
+
+
+def _run(
+    argv: list[str], env: dict[str, str], cwd: str, python_flags: list[str] | None = None
+) -> tuple[float, int, bytes]:
+    """Run the CLI once and return its wall time in seconds, its peak RSS
+    in KiB and its stderr"""
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, *(python_flags or []), "-c", _ENTRY_POINT, *argv],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            env=env,
+            cwd=cwd,
+        )
+        # Unlike `Popen.wait()`, this also returns the resource usage of
+        # exactly this child.
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        output = stderr.read()
+    if process.returncode != 0:
+        raise CommandFailed(
+            f"'{' '.join(argv)}' exited with status {process.returncode}:\n"
+            + output.decode(errors="replace")
+        )
+    # Linux reports KiB, macOS bytes.
+    peak_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return elapsed, peak_rss, output
+
+
+def _import_times(stderr: bytes) -> dict[str, float]:
+    """The time spent importing each module, in ms, from the output of
+    `-X importtime`"""
+    modules = {}
+    for line in stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The header line.
+        # Use the time excluding nested imports, so nothing is counted twice.
+        modules[fields[2].strip()] = int(fields[0]) / 1000
+    return modules
+
+
+def _by_package(modules: dict[str, float]) -> dict[str, float]:
+    packages: dict[str, float] = {}
+    for module, ms in modules.items():
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + ms
+    return packages
+
+
+def _budget(budgets: dict[str, dict[str, Any]], name: str) -> dict[str, Any]:
+    budget: dict[str, Any] = {}
+    for pattern, limits in budgets.items():
+        if pattern == "default" or fnmatch.fnmatchcase(name, pattern):
+            budget.update(limits)
+    return budget
+
+
+def _violations(result: dict[str, Any], budget: dict[str, Any]) -> list[str]:
+    violations = []
+    if "wall_ms" in budget and result["wall_ms"]["median"] > budget["wall_ms"]:
+        violations.append(
+            f"median wall time {result['wall_ms']['median']:.0f}ms > {budget['wall_ms']}ms"
+        )
+    if "import_ms" in budget and result["import_ms"] > budget["import_ms"]:
+        violations.append(f"import time {result['import_ms']:.0f}ms > {budget['import_ms']}ms")
+    if "peak_rss_mib" in budget and result["peak_rss_mib"] > budget["peak_rss_mib"]:
+        violations.append(f"peak RSS {result['peak_rss_mib']:.1f}MiB > {budget['peak_rss_mib']}MiB")
+    imported = [
+        package
+        for package in budget.get("forbidden_packages", [])
+        if package in result["imported_packages"]
+    ]
+    if imported:
+        violations.append(f"imports forbidden packages {', '.join(imported)}")
+    return violations
+
+
+def _benchmark(
+    argv: list[str], kind: str, runs: int, top: int, env: dict[str, str], cwd: str
+) -> dict[str, Any]:
+    _run(argv, env, cwd)  # Warm up the caches of the OS and the CLI.
+    wall_times = []
+    peak_rss = 0
+    for _ in range(runs):
+        elapsed, rss, _ = _run(argv, env, cwd)
+        wall_times.append(elapsed * 1000)
+        peak_rss = max(peak_rss, rss)
+    _, _, stderr = _run(argv, env, cwd, ["-X", "importtime"])
+    packages = _by_package(_import_times(stderr))
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "command": " ".join(argv),
+        "kind": kind,
+        "wall_ms": {
+            "min": round(min(wall_times), 3),
+            "median": round(statistics.median(wall_times), 3),
+            "max": round(max(wall_times), 3),
+        },
+        "peak_rss_mib": round(peak_rss / 1024, 3),
+        "import_ms": round(sum(packages.values()), 3),
+        "packages": {package: round(ms, 3) for package, ms in slowest},
+        # Kept in full for checking the forbidden packages.
+        "imported_packages": sorted(packages),
+    }
+
+
+def _baseline(runs: int, env: dict[str, str], cwd: str) -> dict[str, float]:
+    """The wall time of a bare interpreter, for putting the results into
+    perspective across machines"""
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, cwd=cwd, check=True)
+        wall_times.append((time.perf_counter() - start) * 1000)
+    return {"min": round(min(wall_times), 3), "median": round(statistics.median(wall_times), 3)}
+
+
+def main() -> int:
+    arguments = docopt(__doc__)
+    runs = int(arguments["--runs"])
+    top = int(arguments["--top"])
+    with open(arguments["--budgets"]) as f:
+        budgets = json.load(f)
+    commands = [(argv, "local") for argv in _LOCAL_COMMANDS]
+    commands += [(argv, "api") for argv in _API_COMMANDS]
+    if arguments["--filter"] is not None:
+        commands = [
+            (argv, kind)
+            for argv, kind in commands
+            if fnmatch.fnmatchcase(" ".join(argv), arguments["--filter"])
+        ]
+
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as cwd, StubApi() as api:
+        # Benchmark this checkout with an empty cache, isolated from the
+        # configuration of the user.
+        env = {
+            name: value
+            for name, value in os.environ.items()
+            if not name.startswith("TENZIR_PLATFORM_CLI_")
+        }
+        env.update(api.env())
+        env["XDG_CACHE_HOME"] = cwd
+        env["PYTHONPATH"] = source_dir
+        baseline = _baseline(runs, env, cwd)
+        results = []
+        failed = False
+        try:
+            _run(["workspace", "select", WORKSPACE_NAME], env, cwd)
+            for argv, kind in commands:
+                result = _benchmark(argv, kind, runs, top, env, cwd)
+                budget = _budget(budgets, result["command"])
+                result["budget"] = budget
+                result["violations"] = _violations(result, budget)
+                del result["imported_packages"]
+                failed = failed or bool(result["violations"])
+                results.append(result)
+                print(
+                    f"{result['command']:<45} {result['wall_ms']['median']:7.1f}ms"
+                    f" {result['import_ms']:7.1f}ms imports {result['peak_rss_mib']:6.1f}MiB"
+                    + ("  " + "; ".join(result["violations"]) if result["violations"] else ""),
+                    file=sys.stderr,
+                )
+        except CommandFailed as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    report = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "runs": runs,
+        "interpreter_ms": baseline,
+        "results": results,
+        "ok": not failed,
+    }
+    if arguments["--output"] == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(arguments["--output"], "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""A minimal local stand-in for the platform API and its identity provider.
+
+It answers just enough of the API for the representative commands of the
+benchmarks, with fixed objects and without any network latency, so that
+the measurements show the cost of the CLI itself. The id token is signed
+with a key generated on startup and published via OIDC discovery.
+
+Run it directly to experiment with the CLI against it:
+
+    python benchmarks/stub_api.py [<port>]
+
+It prints the environment variables that point the CLI to the stub."""
+
+import contextlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+CLIENT_ID = "tenzir-platform-benchmark"
+STAGE_IDENTIFIER = "benchmark"
+WORKSPACE_ID = "t-12345678"
+WORKSPACE_NAME = "benchmark"
+
+# Large enough that parsing and printing the lists shows up in the numbers.
+_NODES = [
+    {
+        "node_id": f"n-{i:08d}",
+        "name": f"node-{i}",
+        "lifecycle_state": "connected" if i % 3 else "disconnected",
+    }
+    for i in range(200)
+]
+_SECRETS = [
+    {
+        "id": f"s-{i:08d}",
+        "name": f"secret-{i}",
+        "last_updated": "2024-01-01T00:00:00Z",
+        "last_accessed": None,
+    }
+    for i in range(200)
+]
+_STORES = [{"id": "st-00000000", "name": "builtin"}, {"id": "st-00000001", "name": "vault"}]
+_ALERTS = [
+    {
+        "id": f"a-{i:08d}",
+        "node_id": f"n-{i:08d}",
+        "duration": 60,
+        "webhook_url": "https://example.com",
+        "webhook_body": "{}",
+    }
+    for i in range(20)
+]
+
+
+class StubApi:
+    """Serves the stub API from a background thread.
+
+    Use it as a context manager; `env()` returns the environment variables
+    for the CLI."""
+
+    def __init__(self, port: int = 0) -> None:
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(RSAAlgorithm.to_jwk(key.public_key()))
+        jwk.update(kid="benchmark", use="sig", alg="RS256")
+        now = int(time.time())
+        self.id_token = jwt.encode(
+            {
+                "sub": "benchmark|user",
+                "iss": self.url + "/",
+                "aud": CLIENT_ID,
+                "iat": now,
+                "exp": now + 24 * 3600,
+            },
+            key,
+            algorithm="RS256",
+            headers={"kid": "benchmark"},
+        )
+        self._server.stub = {"url": self.url, "jwks": {"keys": [jwk]}}  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StubApi":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def env(self) -> dict[str, str]:
+        return {
+            "TENZIR_PLATFORM_CLI_API_ENDPOINT": self.url,
+            "TENZIR_PLATFORM_CLI_ISSUER_URL": self.url + "/",
+            "TENZIR_PLATFORM_CLI_CLIENT_ID": CLIENT_ID,
+            "TENZIR_PLATFORM_CLI_STAGE_IDENTIFIER": STAGE_IDENTIFIER,
+            "TENZIR_PLATFORM_CLI_ID_TOKEN": self.id_token,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, obj: Any, status: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        stub = self.server.stub  # type: ignore[attr-defined]
+        if self.path == "/.well-known/openid-configuration":
+            self._send(
+                {
+                    "issuer": stub["url"] + "/",
+                    "jwks_uri": stub["url"] + "/jwks",
+                    "token_endpoint": stub["url"] + "/token",
+                    "device_authorization_endpoint": stub["url"] + "/device",
+                }
+            )
+        elif self.path == "/jwks":
+            self._send(stub["jwks"])
+        else:
+            self._send({"detail": "not found"}, 404)
+
+    def do_HEAD(self) -> None:
+        # Sent by the CLI to open the connection ahead of time.
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.removeprefix("/user")
+        if path == "/get-login-info":
+            self._send(
+                {
+                    "allowed_tenants": [{"tenant_id": WORKSPACE_ID, "name": WORKSPACE_NAME}],
+                    "organization": None,
+                }
+            )
+        elif path == "/switch-tenant":
+            self._send(
+                {"user_key": f"uk-{body['tenant_id']}", "expires_at": time.time() + 24 * 3600}
+            )
+        elif not self.headers.get("X-Tenzir-UserKey", "").startswith("uk-"):
+            self._send({"detail": "invalid user key"}, 403)
+        elif path == "/list-nodes":
+            self._send({"nodes": _NODES})
+        elif path == "/secrets/list":
+            self._send({"secrets": _SECRETS})
+        elif path == "/secrets/list-stores":
+            self._send({"stores": _STORES, "default_store_id": _STORES[0]["id"]})
+        elif path == "/alert/list":
+            self._send({"alerts": _ALERTS})
+        elif path == "/proxy":
+            self._send({})
+        else:
+            self._send({"detail": "not found"}, 404)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    with StubApi(port) as api:
+        for name, value in api.env().items():
+            print(f"export {name}={value}")
+        sys.stdout.flush()
+        with contextlib.suppress(KeyboardInterrupt):
+            threading.Event().wait()
@@ -0,0 +1,341 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""A background agent that runs CLI commands on behalf of short-lived
+`tenzir-platform` processes.
+
+The agent keeps the authentication state and the connections to the
+platform between commands. Clients send their arguments over a Unix domain
+socket and receive the output of the command as a stream of JSON messages:
+
+    -> {"argv": ["node", "list"]}
+    <- {"stream": "stdout", "data": "..."}
+    <- {"exit_status": 0}
+
+The client side of this module only depends on the standard library, so
+that forwarding a command doesn't require loading the rest of the CLI."""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from tenzir_platform.helpers.streams import ThreadLocalStream
+
+_ENV_PREFIX = "TENZIR_PLATFORM_CLI_"
+
+# Global options that the agent can handle on behalf of the client.
+_FORWARDED_OPTIONS = {"-v", "--verbose", "--cached", "--no-cache"}
+
+# Commands that depend on the local process, e.g. because they read from
+# stdin or the local filesystem, or run for a long time.
+_LOCAL_COMMANDS = {"agent", "batch", "shell", "tools", "node run", "node config"}
+
+
+def _cache_directory() -> str:
+    return os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")) + "/tenzir-platform"
+
+
+def _configuration_hash() -> str:
+    """Identify the configuration of the current process.
+
+    Every distinct configuration gets its own agent, so that the agent
+    always runs with the same settings as the client."""
+    configuration = sorted(
+        (key, value) for key, value in os.environ.items() if key.startswith(_ENV_PREFIX)
+    )
+    configuration.append(("XDG_CACHE_HOME", _cache_directory()))
+    return hashlib.sha256(json.dumps(configuration).encode()).hexdigest()[:16]
+
+
+def socket_path() -> str:
+    return f"{_cache_directory()}/agent-{_configuration_hash()}.sock"
+
+
+def _lock_path() -> str:
+    return f"{_cache_directory()}/agent-{_configuration_hash()}.lock"
+
+
+def forwardable(argv: list[str]) -> bool:
+    """Whether the agent can run the command given by `argv`"""
+    options = []
+    for index, arg in enumerate(argv):
+        if not arg.startswith("-"):
+            break
+        options.append(arg)
+    else:
+        return False
+    # Options with values are only forwarded in their `--option=value` form,
+    # so the value can't be mistaken for the command.
+    if not all(
+        option in _FORWARDED_OPTIONS or option.startswith(("--deadline=", "--workspace="))
+        for option in options
+    ):
+        return False
+    command = argv[index:]
+    if "-h" in command or "--help" in command:
+        return False
+    if command[0] in _LOCAL_COMMANDS or " ".join(command[:2]) in _LOCAL_COMMANDS:
+        return False
+    # Without `--value`, secrets are read from a file, the environment or
+    # an interactive prompt.
+    if command[:2] in (["secret", "add"], ["secret", "update"]):
+        return any(arg == "--value" or arg.startswith("--value=") for arg in command)
+    return True
+
+
+def _connect() -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path())
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _messages(sock: socket.socket) -> Iterator[dict[str, Any]]:
+    with sock.makefile("r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _request(sock: socket.socket, request: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    sock.sendall(json.dumps(request).encode() + b"\n")
+    yield from _messages(sock)
+
+
+def start() -> None:
+    """Start the agent in the background"""
+    subprocess.Popen(
+        [sys.executable, "-m", "tenzir_platform.tenzir_platform", "agent", "run"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def forward(argv: list[str]) -> int | None:
+    """Run a command in the agent and return its exit status.
+
+    Returns `None` if the command must be run in-process instead, e.g.
+    because the agent is not running yet. In that case, the agent is
+    started in the background for subsequent commands."""
+    if not forwardable(argv):
+        return None
+    sock = _connect()
+    if sock is None:
+        with contextlib.suppress(OSError):
+            start()
+        return None
+    with sock:
+        received = False
+        try:
+            for message in _request(sock, {"argv": argv}):
+                received = True
+                if "exit_status" in message:
+                    return message["exit_status"]
+                stream = sys.stderr if message.get("stream") == "stderr" else sys.stdout
+                stream.write(message.get("data", ""))
+                stream.flush()
+        except BrokenPipeError:
+            # Our own output was closed, e.g. by `| head`.
+            raise
+        except (OSError, ValueError):
+            pass
+    # Only fall back if the agent didn't start running the command, so
+    # that no command is ever executed twice.
+    if not received:
+        return None
+    print("error: lost connection to the agent", file=sys.stderr)
+    return -1
+
+
+def control(command: str) -> dict[str, Any] | None:
+    """Send a control command to the agent, if it is running"""
+    sock = _connect()
+    if sock is None:
+        return None
+    with sock:
+        for message in _request(sock, {"control": command}):
+            return message
+    return None
+
+
+def _peer_uid(conn: socket.socket) -> int | None:
+    """The user id of the process on the other end of the socket, if known"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid
+
+
+class _MessageStream(io.TextIOBase):
+    """Sends everything written to it to the client as messages"""
+
+    def __init__(self, conn: socket.socket, name: str, lock: threading.Lock) -> None:
+        self._conn = conn
+        self._name = name
+        self._lock = lock
+
+    def write(self, s: str) -> int:
+        if s:
+            message = json.dumps({"stream": self._name, "data": s}).encode() + b"\n"
+            with self._lock, contextlib.suppress(OSError):
+                self._conn.sendall(message)
+        return len(s)
+
+
+class Agent:
+    """Runs the commands received on the agent socket.
+
+    `run` executes a command line in-process and returns its exit status.
+    The agent exits after being idle for `idle_timeout` seconds."""
+
+    def __init__(self, run: Callable[[list[str]], int], idle_timeout: float, verbose: bool) -> None:
+        self.run = run
+        self.idle_timeout = idle_timeout
+        self.verbose = verbose
+        self.started = time.time()
+        self.commands = 0
+        self.stopping = False
+        self._active = 0
+        self._last_activity = time.monotonic()
+        self._lock = threading.Lock()
+        self._stdout = ThreadLocalStream(sys.stdout)
+        self._stderr = ThreadLocalStream(sys.stderr)
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(f"agent: {message}", file=sys.stderr)
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            uid = _peer_uid(conn)
+            if uid is not None and uid != os.getuid():
+                self._log(f"rejected connection from user {uid}")
+                return
+            with conn.makefile("r", encoding="utf-8") as f:
+                line = f.readline()
+            try:
+                request = json.loads(line)
+            except ValueError:
+                return
+            lock = threading.Lock()
+            if "control" in request:
+                response = self._control(request["control"])
+                conn.sendall(json.dumps(response).encode() + b"\n")
+                return
+            argv = request.get("argv")
+            if not isinstance(argv, list) or not forwardable(argv):
+                status = -1
+                _MessageStream(conn, "stderr", lock).write("error: invalid command for agent\n")
+            else:
+                self._log(f"running {argv}")
+                with (
+                    self._stdout.redirect(_MessageStream(conn, "stdout", lock)),
+                    self._stderr.redirect(_MessageStream(conn, "stderr", lock)),
+                ):
+                    status = self._run(argv)
+            with contextlib.suppress(OSError):
+                conn.sendall(json.dumps({"exit_status": status}).encode() + b"\n")
+
+    def _run(self, argv: list[str]) -> int:
+        with self._lock:
+            self.commands += 1
+        try:
+            return self.run(argv)
+        except SystemExit as e:
+            if e.code is None:
+                return 0
+            if isinstance(e.code, int):
+                return e.code
+            # docopt exits with the usage message on invalid arguments.
+            print(e.code, file=sys.stderr)
+            return 1
+        except Exception as e:
+            print(f"unexpected error: {e!r}", file=sys.stderr)
+            return 1
+
+    def _control(self, command: str) -> dict[str, Any]:
+        if command == "stop":
+            self.stopping = True
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "commands": self.commands,
+            "stopping": self.stopping,
+        }
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        try:
+            self._handle(conn)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_activity = time.monotonic()
+
+    def _idle(self) -> bool:
+        with self._lock:
+            return self._active == 0 and (
+                self.stopping or time.monotonic() - self._last_activity > self.idle_timeout
+            )
+
+    def serve(self) -> bool:
+        """Serve commands until the agent is stopped or idle.
+
+        Returns `False` if another agent is already running."""
+        import fcntl
+
+        os.makedirs(_cache_directory(), exist_ok=True)
+        with open(_lock_path(), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            path = socket_path()
+            # We hold the lock, so any existing socket is stale.
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            umask = os.umask(0o177)
+            try:
+                server.bind(path)
+            finally:
+                os.umask(umask)
+            server.listen()
+            server.settimeout(1.0)
+            self._log(f"listening on {path}")
+            original_streams = sys.stdout, sys.stderr
+            sys.stdout, sys.stderr = self._stdout, self._stderr  # type: ignore[assignment]
+            try:
+                while not self._idle():
+                    try:
+                        conn, _ = server.accept()
+                    except TimeoutError:
+                        continue
+                    conn.settimeout(None)
+                    with self._lock:
+                        self._active += 1
+                        self._last_activity = time.monotonic()
+                    threading.Thread(
+                        target=self._serve_connection, args=(conn,), daemon=True
+                    ).start()
+            finally:
+                server.close()
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                sys.stdout, sys.stderr = original_streams
+            self._log("stopped")
+        return True
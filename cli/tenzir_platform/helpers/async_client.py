@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import contextvars
+from collections.abc import Awaitable, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from requests import Response
+
+from tenzir_platform.helpers.client import AppClient, TargetApi
+from tenzir_platform.helpers.environment import PlatformEnvironment
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AsyncAppClient:
+    """Asyncio counterpart of the `AppClient`.
+
+    Requests are routed and authenticated exactly like with the
+    synchronous client, which performs the actual I/O on a worker
+    thread. At most `max_concurrency` requests are in flight at once."""
+
+    def __init__(
+        self,
+        platform: PlatformEnvironment,
+        max_concurrency: int | None = None,
+    ) -> None:
+        self._client = AppClient(platform)
+        if max_concurrency is None:
+            max_concurrency = platform.max_concurrency
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    @staticmethod
+    def wrap(client: AppClient, max_concurrency: int | None = None) -> "AsyncAppClient":
+        """Create an async client that shares the login state of `client`"""
+        if max_concurrency is None:
+            max_concurrency = client.max_concurrency
+        async_client = AsyncAppClient.__new__(AsyncAppClient)
+        async_client._client = client
+        async_client._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        return async_client
+
+    @property
+    def id_token(self) -> str:
+        return self._client.id_token
+
+    @property
+    def user_key(self) -> str:
+        return self._client.user_key
+
+    def user_login(self, id_token: str):
+        self._client.user_login(id_token)
+
+    def workspace_login(self, user_key: str, renew: Callable[[], str | None] | None = None):
+        self._client.workspace_login(user_key, renew)
+
+    async def request(
+        self,
+        method: str,
+        endpoint_suffix: str,
+        json: dict | list | None,
+        target_api: TargetApi = TargetApi.USER,
+        connection_retry: int = 0,
+    ) -> Response:
+        async with self._semaphore:
+            return await asyncio.to_thread(
+                self._client.request,
+                method=method,
+                endpoint_suffix=endpoint_suffix,
+                json=json,
+                target_api=target_api,
+                connection_retry=connection_retry,
+            )
+
+    async def post(
+        self,
+        endpoint_suffix: str,
+        json: dict | list,
+        target_api: TargetApi = TargetApi.USER,
+        connection_retry: int = 0,
+    ) -> Response:
+        return await self.request(
+            method="POST",
+            endpoint_suffix=endpoint_suffix,
+            json=json,
+            target_api=target_api,
+            connection_retry=connection_retry,
+        )
+
+    async def get(
+        self,
+        endpoint_suffix: str,
+        target_api: TargetApi = TargetApi.USER,
+        connection_retry: int = 0,
+    ) -> Response:
+        return await self.request(
+            method="GET",
+            endpoint_suffix=endpoint_suffix,
+            json=None,
+            target_api=target_api,
+            connection_retry=connection_retry,
+        )
+
+
+async def gather_bounded(
+    awaitables: Iterable[Awaitable[T]],
+    limit: int,
+    return_exceptions: bool = False,
+) -> list[T | BaseException]:
+    """Await all `awaitables` with at most `limit` of them running at once.
+
+    Results are returned in the order of the inputs."""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _bounded(awaitable: Awaitable[T]) -> T:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(
+        *(_bounded(awaitable) for awaitable in awaitables),
+        return_exceptions=return_exceptions,
+    )
+
+
+async def map_bounded(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    limit: int,
+) -> list[R]:
+    """Apply the async function `fn` to all `items` concurrently"""
+    results = await gather_bounded((fn(item) for item in items), limit)
+    return results  # type: ignore[return-value]
+
+
+def run_concurrently(
+    client: AppClient,
+    calls: list[tuple[str, dict | list]],
+    target_api: TargetApi = TargetApi.USER,
+    max_concurrency: int | None = None,
+) -> list[Response]:
+    """Issue independent POST requests concurrently from synchronous code.
+
+    Returns the responses in the order of `calls`. This also works when
+    called from a coroutine, but blocks its event loop until all
+    responses arrived."""
+
+    async def _run() -> list[Response]:
+        async_client = AsyncAppClient.wrap(client, max_concurrency)
+        return await asyncio.gather(
+            *(
+                async_client.post(endpoint, json=body, target_api=target_api)
+                for endpoint, body in calls
+            )
+        )
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run())
+    # `asyncio.run` can't be called while an event loop is running in this
+    # thread, so run the requests in a loop of their own on another one.
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(context.run, asyncio.run, _run()).result()
@@ -1,12 +1,27 @@
 # SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
 # SPDX-License-Identifier: BSD-3-Clause
 
-from typing import Literal
+import dataclasses
+import json
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from tenzir_platform.helpers.exceptions import PlatformCliError
 
 
-class RoleAndOrganizationRule(BaseModel):
+# The rules are plain dataclasses rather than pydantic models, because
+# `tools print-auth-rule` is used in scripts and should start quickly.
+# They mimic the part of the pydantic interface that we need.
+@dataclasses.dataclass(kw_only=True)
+class _Rule:
+    def model_dump(self) -> dict[str, Any]:
+        return dataclasses.asdict(self)
+
+    def model_dump_json(self) -> str:
+        return json.dumps(self.model_dump(), separators=(",", ":"), ensure_ascii=False)
+
+
+@dataclasses.dataclass(kw_only=True)
+class RoleAndOrganizationRule(_Rule):
     """
     Grants access to users who have some role in some organization.
     """
@@ -23,7 +38,8 @@ class RoleAndOrganizationRule(BaseModel):
     organization: str
 
 
-class OrganizationMembershipRule(BaseModel):
+@dataclasses.dataclass(kw_only=True)
+class OrganizationMembershipRule(_Rule):
     """
     Grants access to users that belong to some organization.
     """
@@ -34,7 +50,8 @@ class OrganizationMembershipRule(BaseModel):
     organization: str
 
 
-class EmailDomainRule(BaseModel):
+@dataclasses.dataclass(kw_only=True)
+class EmailDomainRule(_Rule):
     """
     Grants access for users from a specific connection (e.g. google-oauth2)
     having email addresses from a given domain (e.g. @tenzir.com)
@@ -45,12 +62,14 @@ class EmailDomainRule(BaseModel):
     email_domain: str
 
 
-class UserAuthRule(BaseModel):
+@dataclasses.dataclass(kw_only=True)
+class UserAuthRule(_Rule):
     auth_fn: Literal["auth_user"] = "auth_user"
     user_id: str
 
 
-class AllowAllRule(BaseModel):
+@dataclasses.dataclass(kw_only=True)
+class AllowAllRule(_Rule):
     auth_fn: Literal["auth_allow_all"] = "auth_allow_all"
 
 
@@ -61,3 +80,37 @@ AuthRule = (
     | OrganizationMembershipRule
     | AllowAllRule
 )
+
+
+def auth_rule_from_arguments(arguments) -> AuthRule:
+    connection = arguments["--connection"]
+    domain = arguments["<domain>"]
+    user_id = arguments["<user_id>"]
+    organization_claim = arguments["<organization_claim>"]
+    organization = arguments["<organization>"]
+    roles_claim = arguments["<roles_claim>"]
+    role = arguments["<role>"]
+    auth_rule: AuthRule
+    if arguments["email-domain"]:
+        auth_rule = EmailDomainRule(connection=connection, email_domain=domain)
+    elif arguments["organization-membership"]:
+        auth_rule = OrganizationMembershipRule(
+            connection=connection,
+            organization_claim=organization_claim,
+            organization=organization,
+        )
+    elif arguments["organization-role"]:
+        auth_rule = RoleAndOrganizationRule(
+            connection=connection,
+            roles_claim=roles_claim,
+            role=role,
+            organization_claim=organization_claim,
+            organization=organization,
+        )
+    elif arguments["user"]:
+        auth_rule = UserAuthRule(user_id=user_id)
+    elif arguments["allow-all"]:
+        auth_rule = AllowAllRule()
+    else:
+        raise PlatformCliError("couldn't determine auth rule from command-line arguments")
+    return auth_rule
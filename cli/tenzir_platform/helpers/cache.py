@@ -1,10 +1,33 @@
 # SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
 # SPDX-License-Identifier: BSD-3-Clause
 
+import contextlib
+import hashlib
 import json
 import os
+import re
+import shutil
+import tempfile
+import time
+from collections.abc import Iterator
+from email.utils import parsedate_to_datetime
+from typing import Any
 
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from tenzir_platform.helpers.deadline import deadline_exceeded, remaining
 from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+try:
+    import fcntl
+except ImportError:
+    # File locks are not available on Windows.
+    fcntl = None  # type: ignore[assignment]
+
+# How long to wait for another process to finish updating a cache file.
+_LOCK_TIMEOUT = 120
 
 
 def filename_in_cache(platform: PlatformEnvironment, filename: str):
@@ -18,21 +41,378 @@ def filename_in_cache(platform: PlatformEnvironment, filename: str):
     )
 
 
-def store_workspace(platform: PlatformEnvironment, workspace_id: str, user_key: str):
-    content = json.dumps({"workspace_id": workspace_id, "user_key": user_key})
-    filename = filename_in_cache(platform, "workspace")
-    if platform.verbose:
-        print(f"saving workspace id to {filename}")
+def write_cache_file(filename: str, content: str, mode: int = 0o600):
+    """Atomically replace the contents of a file in the cache directory"""
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(temp_filename, mode)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+
+
+@contextlib.contextmanager
+def cache_lock(filename: str) -> Iterator[None]:
+    """Hold an exclusive lock for updating a file in the cache directory.
+
+    Processes that want to update the same file, e.g. to renew an expired
+    token, take turns. The later ones should check the file again after
+    acquiring the lock and use the result of the first one if possible."""
+    if fcntl is None:
+        yield
+        return
     os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, "w") as f:
-        f.write(content)
+    fd = os.open(f"{filename}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        timeout: float = _LOCK_TIMEOUT
+        left = remaining()
+        if left is not None:
+            timeout = min(timeout, left)
+        give_up = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= give_up:
+                    if left is not None and left <= _LOCK_TIMEOUT:
+                        raise deadline_exceeded()
+                    raise PlatformCliError(
+                        f"timed out waiting for the lock on {filename}"
+                    ).add_hint("another 'tenzir-platform' process is updating the file")
+                time.sleep(0.05)
+        yield
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
 
 
-def load_current_workspace(platform: PlatformEnvironment) -> tuple[str, str]:
+def cache_lifetime(resp: Response, default: float) -> float:
+    """The number of seconds for which a response may be reused, according
+    to its `Cache-Control` and `Expires` headers"""
+    directives = {}
+    for directive in resp.headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+    try:
+        age = float(resp.headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    if "max-age" in directives:
+        try:
+            return max(float(directives["max-age"]) - age, 0)
+        except ValueError:
+            return 0
+    if "Expires" in resp.headers:
+        try:
+            expires = parsedate_to_datetime(resp.headers["Expires"]).timestamp()
+            date = (
+                parsedate_to_datetime(resp.headers["Date"]).timestamp()
+                if "Date" in resp.headers
+                else time.time()
+            )
+        except (TypeError, ValueError):
+            # An invalid `Expires` header means that the response is stale.
+            return 0
+        return max(expires - date - age, 0)
+    return default
+
+
+# Workspaces can be renamed, so a name in the vault is only used for this
+# many seconds after the platform confirmed it.
+_WORKSPACE_NAME_TTL = 300
+
+
+def _vault_filename(platform: PlatformEnvironment, workspace_id: str) -> str:
+    return filename_in_cache(platform, f"workspaces/{workspace_id}.json")
+
+
+def _vault_entries(platform: PlatformEnvironment) -> list[tuple[str, dict[str, Any]]]:
+    directory = filename_in_cache(platform, "workspaces")
+    try:
+        filenames = sorted(os.listdir(directory))
+    except OSError:
+        return []
+    entries = []
+    for filename in filenames:
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                entries.append((os.path.join(directory, filename), json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def _load_vault_file(platform: PlatformEnvironment, workspace_id: str) -> dict[str, Any] | None:
+    if not re.fullmatch(r"[\w-]+", workspace_id):
+        return None
+    try:
+        with open(_vault_filename(platform, workspace_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_vault_entry(platform: PlatformEnvironment, identifier: str) -> dict[str, Any] | None:
+    """Return the cached user key for a workspace id or name, if any.
+
+    A name is only used if it belongs to a single workspace and the
+    platform confirmed it recently, otherwise it must be resolved again."""
+    entry = _load_vault_file(platform, identifier)
+    if entry is not None:
+        return entry
+    matches = [entry for _, entry in _vault_entries(platform) if entry.get("name") == identifier]
+    if len(matches) > 1:
+        workspace_ids = [entry.get("workspace_id") for entry in matches]
+        raise PlatformCliError(
+            f"ambiguous name {identifier} is shared by workspaces {workspace_ids}"
+        ).add_hint("use the workspace id instead")
+    if not matches:
+        return None
+    named_at = matches[0].get("named_at")
+    if not isinstance(named_at, int | float) or time.time() - named_at >= _WORKSPACE_NAME_TTL:
+        return None
+    return matches[0]
+
+
+def workspace_lock(platform: PlatformEnvironment, workspace_id: str):
+    """Lock the stored user key of a workspace while renewing it"""
+    return cache_lock(_vault_filename(platform, workspace_id))
+
+
+def store_workspace(
+    platform: PlatformEnvironment,
+    workspace_id: str,
+    user_key: str,
+    expires_at: float | None = None,
+    name: str | None = None,
+    select: bool = True,
+) -> dict[str, Any]:
+    """Store the user key of a workspace and return the new cache entry.
+
+    Keys for all workspaces are kept, so switching between them doesn't
+    require minting new keys. Unless `select` is set, the selected
+    workspace only changes its key, if it is the same workspace.
+
+    A `name` must come from the platform; it replaces the name of the
+    workspace and is removed from all other workspaces in the vault."""
+    if name is None:
+        previous = _load_vault_file(platform, workspace_id)
+        if previous is not None:
+            name, named_at = previous.get("name"), previous.get("named_at")
+        else:
+            named_at = None
+    else:
+        named_at = time.time()
+        # Another workspace had this name before, e.g. before a rename.
+        for filename, other in _vault_entries(platform):
+            if other.get("name") == name and other.get("workspace_id") != workspace_id:
+                other["name"] = other["named_at"] = None
+                write_cache_file(filename, json.dumps(other))
+    entry = {
+        "workspace_id": workspace_id,
+        "user_key": user_key,
+        "expires_at": expires_at,
+        "name": name,
+        "named_at": named_at,
+    }
+    write_cache_file(_vault_filename(platform, workspace_id), json.dumps(entry))
+    if not select:
+        try:
+            select = load_workspace_entry(platform)["workspace_id"] == workspace_id
+        except (OSError, ValueError, KeyError):
+            select = False
+    if select:
+        filename = filename_in_cache(platform, "workspace")
+        if platform.verbose:
+            print(f"saving workspace id to {filename}")
+        write_cache_file(filename, json.dumps(entry))
+    return entry
+
+
+# The last workspace loaded from every cache file, together with the
+# modification time of the file at that point.
+_current_workspaces: dict[str, tuple[int, dict[str, Any]]] = {}
+
+
+def load_workspace_entry(platform: PlatformEnvironment) -> dict[str, Any]:
+    """Return the selected workspace, its user key and the expiry time of
+    the key, if known"""
     filename = filename_in_cache(platform, "workspace")
+    # Long-running processes like the interactive shell load the workspace
+    # for every command, so don't parse the file again unless it changed.
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _current_workspaces.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
     with open(filename) as f:
         content_str = f.read().rstrip()
         content = json.loads(content_str)
         if platform.verbose:
             print(f"loaded workspace from {filename}")
-        return content["workspace_id"], content["user_key"]
+        entry = {
+            "workspace_id": content["workspace_id"],
+            "user_key": content["user_key"],
+            "expires_at": content.get("expires_at"),
+        }
+    if mtime is not None:
+        _current_workspaces[filename] = (mtime, entry)
+    return entry
+
+
+def load_current_workspace(platform: PlatformEnvironment) -> tuple[str, str]:
+    entry = load_workspace_entry(platform)
+    return entry["workspace_id"], entry["user_key"]
+
+
+# Entries for responses that are not scoped to a single workspace.
+_GLOBAL_SCOPE = "global"
+
+
+class ResponseCache:
+    """On-disk cache for responses of read-only platform endpoints.
+
+    Entries are stored per stage, workspace and credentials and are served
+    without contacting the platform until their TTL expires. Afterwards,
+    entries that came with an `ETag` are revalidated with `If-None-Match`.
+    Any modifying request drops the entries of the affected workspace, as
+    well as all entries not tied to a specific workspace."""
+
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        self.enabled = platform.response_cache
+        self.ttls = platform.response_cache_ttls
+        self.verbose = platform.verbose
+        self.directory = filename_in_cache(platform, "responses")
+
+    def ttl(self, endpoint_suffix: str) -> int | None:
+        """The TTL for responses of an endpoint, or `None` if not cacheable"""
+        if not self.enabled:
+            return None
+        return self.ttls.get(endpoint_suffix)
+
+    @staticmethod
+    def _scope(json_body: dict | list | None) -> str:
+        if isinstance(json_body, dict) and isinstance(json_body.get("tenant_id"), str):
+            return json_body["tenant_id"]
+        return _GLOBAL_SCOPE
+
+    def _filename(
+        self,
+        api: str,
+        endpoint_suffix: str,
+        json_body: dict | list | None,
+        headers: dict[str, str],
+    ) -> str:
+        # The headers carry the user key or admin key, so a response is
+        # never served to other credentials than the ones it was sent to.
+        credentials = sorted(
+            (name, value) for name, value in headers.items() if name != "If-None-Match"
+        )
+        key = json.dumps([api, endpoint_suffix, json_body, credentials], sort_keys=True)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, self._scope(json_body), digest)
+
+    def lookup(
+        self,
+        api: str,
+        endpoint_suffix: str,
+        json_body: dict | list | None,
+        headers: dict[str, str],
+    ) -> dict | None:
+        """Return the cache entry for a request, if there is a valid one"""
+        try:
+            with open(self._filename(api, endpoint_suffix, json_body, headers)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Ignore entries that were damaged or written by other versions.
+        if not (
+            isinstance(entry, dict)
+            and isinstance(entry.get("stored_at"), int | float)
+            and isinstance(entry.get("status_code"), int)
+            and isinstance(entry.get("content"), str)
+        ):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict, endpoint_suffix: str) -> bool:
+        ttl = self.ttl(endpoint_suffix)
+        stored_at = entry.get("stored_at")
+        if ttl is None or not isinstance(stored_at, int | float):
+            return False
+        return time.time() - stored_at < ttl
+
+    def store(
+        self,
+        api: str,
+        endpoint_suffix: str,
+        json_body: dict | list | None,
+        headers: dict[str, str],
+        resp: Response,
+    ) -> None:
+        entry = {
+            "stored_at": time.time(),
+            "status_code": resp.status_code,
+            "content_type": resp.headers.get("Content-Type"),
+            "etag": resp.headers.get("ETag"),
+            "content": resp.content.decode("utf-8", errors="replace"),
+        }
+        self._write(api, endpoint_suffix, json_body, headers, entry)
+
+    def refresh(
+        self,
+        api: str,
+        endpoint_suffix: str,
+        json_body: dict | list | None,
+        headers: dict[str, str],
+        entry: dict,
+    ) -> None:
+        """Mark an entry as fresh again after the server confirmed it"""
+        entry["stored_at"] = time.time()
+        self._write(api, endpoint_suffix, json_body, headers, entry)
+
+    def _write(
+        self,
+        api: str,
+        endpoint_suffix: str,
+        json_body: dict | list | None,
+        headers: dict[str, str],
+        entry: dict,
+    ) -> None:
+        # Caching is best-effort only.
+        filename = self._filename(api, endpoint_suffix, json_body, headers)
+        with contextlib.suppress(OSError):
+            write_cache_file(filename, json.dumps(entry))
+
+    def invalidate(self, json_body: dict | list | None) -> None:
+        """Drop all entries that a modifying request may have affected"""
+        scopes = {self._scope(json_body), _GLOBAL_SCOPE}
+        for scope in scopes:
+            if self.verbose:
+                print(f"invalidating cached responses for {scope}")
+            shutil.rmtree(os.path.join(self.directory, scope), ignore_errors=True)
+
+    @staticmethod
+    def to_response(entry: dict, url: str) -> Response:
+        resp = Response()
+        resp.status_code = entry["status_code"]
+        resp._content = entry["content"].encode("utf-8")
+        resp.headers = CaseInsensitiveDict()
+        if entry.get("content_type"):
+            resp.headers["Content-Type"] = entry["content_type"]
+        if entry.get("etag"):
+            resp.headers["ETag"] = entry["etag"]
+        resp.url = url
+        resp.reason = "OK"
+        resp.encoding = "utf-8"
+        return resp
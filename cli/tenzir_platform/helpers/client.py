@@ -1,14 +1,37 @@
 # SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
 # SPDX-License-Identifier: BSD-3-Clause
 
+import functools
+import json as jsonlib
+import threading
 import time
+from collections.abc import Callable
 from enum import Enum
 
 import requests
 import requests.exceptions
 from requests import Response
 
+from tenzir_platform.helpers.cache import ResponseCache
+from tenzir_platform.helpers.compression import compress_body, wire_bytes
+from tenzir_platform.helpers.deadline import (
+    deadline_exceeded,
+    exceeded,
+    remaining,
+    request_timeout,
+)
 from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.memo import current_memo
+from tenzir_platform.helpers.rate_limit import shared_throttle
+from tenzir_platform.helpers.retry import (
+    EndpointKind,
+    RetryPolicy,
+    certificate_rejected,
+    endpoint_kind,
+    is_read_only,
+)
+from tenzir_platform.helpers.session import shared_session
 
 UNAUTHENTICATED = "unauthenticated"
 
@@ -19,6 +42,23 @@ class TargetApi(Enum):
     ADMIN = "admin"
 
 
+def _user_key_rejected(resp: Response) -> bool:
+    """Whether the platform may have rejected the user key itself, e.g.
+    because it expired.
+
+    The platform doesn't tell a rejected key apart from other denials, so
+    every 403 counts, except for a required MFA, which a new key can't
+    fix."""
+    if resp.status_code != 403:
+        return False
+    try:
+        body = resp.json()
+    except ValueError:
+        return True
+    detail = body.get("detail") if isinstance(body, dict) else None
+    return not (isinstance(detail, dict) and detail.get("error") == "mfa_required")
+
+
 class AppClient:
     def __init__(
         self,
@@ -29,12 +69,67 @@ class AppClient:
         self.user_key: str = UNAUTHENTICATED
         self.endpoint_prefix = platform.api_endpoint.rstrip("/")
         self.extra_headers = platform.extra_headers
+        self.session = shared_session(platform)
+        self.connect_timeout = platform.connect_timeout
+        self.read_timeout = platform.read_timeout
+        self.max_concurrency = platform.max_concurrency
+        self.request_compression = platform.request_compression
+        self.compression_threshold = platform.compression_threshold
+        self.retry_policy = RetryPolicy(platform)
+        self.throttle = shared_throttle(platform)
+        self.response_cache = ResponseCache(platform)
+        # The total number of retries performed by this client.
+        self.retries = 0
+        self._renew_user_key: Callable[[], str | None] | None = None
+        self._renew_lock = threading.Lock()
 
     def user_login(self, id_token: str):
         self.id_token = id_token
 
-    def workspace_login(self, user_key: str):
+    def workspace_login(self, user_key: str, renew: Callable[[], str | None] | None = None):
+        """Use the given user key for requests to the user API.
+
+        If the platform rejects the key, e.g. because it expired, `renew`
+        is called once to mint a new key and the request is retried."""
         self.user_key = user_key
+        self._renew_user_key = renew
+
+    def _renewed_user_key(self, rejected_key: str) -> str | None:
+        with self._renew_lock:
+            # A concurrent request may have renewed the key already.
+            if self.user_key != rejected_key:
+                return self.user_key
+            renew, self._renew_user_key = self._renew_user_key, None
+            if renew is None:
+                return None
+            if self.verbose:
+                print("the user key was rejected, renewing it")
+            user_key = renew()
+            if user_key is not None:
+                self.user_key = user_key
+            return user_key
+
+    def _send(
+        self, method: str, url: str, body: bytes | None, headers: dict[str, str]
+    ) -> Response:
+        start = self.throttle.acquire()
+        status_code = None
+        try:
+            resp = self.session.request(
+                method=method,
+                url=url,
+                data=body,
+                headers=headers,
+                timeout=request_timeout(self.connect_timeout, self.read_timeout),
+            )
+            status_code = resp.status_code
+            # The read timeout applies to every read, so a response that
+            # trickles in can take longer than the deadline.
+            if exceeded():
+                raise deadline_exceeded().add_context(f"while receiving {method} {url}")
+            return resp
+        finally:
+            self.throttle.release(start, status_code)
 
     def request(
         self,
@@ -43,6 +138,22 @@ class AppClient:
         json: dict | list | None,
         target_api: TargetApi = TargetApi.USER,
         connection_retry: int = 0,
+    ) -> Response:
+        user_key = self.user_key
+        resp = self._request(method, endpoint_suffix, json, target_api, connection_retry)
+        if target_api == TargetApi.USER and _user_key_rejected(resp):
+            renewed_key = self._renewed_user_key(user_key)
+            if renewed_key is not None:
+                resp = self._request(method, endpoint_suffix, json, target_api, connection_retry)
+        return resp
+
+    def _request(
+        self,
+        method: str,
+        endpoint_suffix: str,
+        json: dict | list | None,
+        target_api: TargetApi,
+        connection_retry: int,
     ) -> Response:
         match target_api:
             case TargetApi.USER:
@@ -65,27 +176,176 @@ class AppClient:
         for header, value in self.extra_headers.items():
             headers[header] = value
 
-        for i in range(connection_retry + 1):
-            try:
-                url = f"{endpoint}/{endpoint_suffix}"
+        # Serialize the body ourselves so that large payloads can be
+        # compressed before sending them.
+        body: bytes | None = None
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            headers["Content-Type"] = "application/json"
+            body, content_encoding = compress_body(
+                body, self.request_compression, self.compression_threshold
+            )
+            if content_encoding is not None:
+                headers["Content-Encoding"] = content_encoding
+
+        url = f"{endpoint}/{endpoint_suffix}"
+
+        fetch = functools.partial(
+            self._fetch,
+            method,
+            url,
+            target_api,
+            endpoint_suffix,
+            json,
+            body,
+            headers,
+            connection_retry,
+        )
+
+        # Identical reads within the same command share a single request.
+        memo = current_memo()
+        if memo is None:
+            return fetch()
+        if not is_read_only(method, endpoint_suffix):
+            resp = fetch()
+            memo.invalidate()
+            return resp
+        key = (method, url, body, tuple(sorted(headers.items())))
+        resp, shared = memo.fetch(key, fetch)
+        if shared and self.verbose:
+            print(f"{method} {url}: sharing the response of an identical request")
+        return resp
+
+    def _fetch(
+        self,
+        method: str,
+        url: str,
+        target_api: TargetApi,
+        endpoint_suffix: str,
+        json: dict | list | None,
+        body: bytes | None,
+        headers: dict[str, str],
+        connection_retry: int,
+    ) -> Response:
+        kind = endpoint_kind(method, endpoint_suffix)
+        idempotent = kind is not EndpointKind.MODIFYING
+
+        # Serve read-only requests from the local cache where possible.
+        api = target_api.value
+        cacheable = (
+            kind is EndpointKind.READ_ONLY and self.response_cache.ttl(endpoint_suffix) is not None
+        )
+        cached = None
+        if cacheable:
+            cached = self.response_cache.lookup(api, endpoint_suffix, json, headers)
+            if cached is not None:
+                if self.response_cache.is_fresh(cached, endpoint_suffix):
+                    if self.verbose:
+                        print(f"{method} {url}: using cached response")
+                    return ResponseCache.to_response(cached, url)
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+
+        resp = self._request_with_retries(
+            method, url, body, headers, idempotent, connection_retry
+        )
+
+        if cacheable:
+            if resp.status_code == 304 and cached is not None:
                 if self.verbose:
-                    print(f"{method} {url}")
-                resp = requests.request(
-                    method=method,
-                    url=url,
-                    json=json,
-                    headers=headers,
+                    print(f"{method} {url}: cached response is still valid")
+                self.response_cache.refresh(api, endpoint_suffix, json, headers, cached)
+                resp = ResponseCache.to_response(cached, url)
+            elif resp.status_code == 200:
+                self.response_cache.store(api, endpoint_suffix, json, headers, resp)
+        elif not idempotent:
+            self.response_cache.invalidate(json)
+        return resp
+
+    def _request_with_retries(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None,
+        headers: dict[str, str],
+        idempotent: bool,
+        connection_retry: int,
+    ) -> Response:
+        # Callers can explicitly allow more retries on connection errors.
+        max_retries = max(self.retry_policy.max_retries, connection_retry)
+        start = time.monotonic()
+        retry = 0
+        while True:
+            if self.verbose:
+                print(f"{method} {url}")
+            try:
+                resp = self._send(method, url, body, headers)
+            except requests.exceptions.RequestException as e:
+                retryable = self.retry_policy.retryable_exception(e, idempotent) or (
+                    connection_retry > 0
+                    and isinstance(e, requests.exceptions.ConnectionError)
+                    and not certificate_rejected(e)
                 )
-            except requests.exceptions.ConnectionError:
-                if i == connection_retry:
+                delay = self.retry_policy.delay(retry + 1, None)
+                if (
+                    not retryable
+                    or retry >= max_retries
+                    or not self._within_budget(start, delay)
+                ):
+                    if exceeded():
+                        raise deadline_exceeded().add_context(
+                            f"while sending {method} {url}"
+                        ) from e
+                    if isinstance(e, requests.exceptions.Timeout):
+                        raise PlatformCliError("request timed out").add_context(
+                            f"while sending {method} {url}"
+                        ).add_hint(
+                            f"connect timeout {self.connect_timeout:g}s, "
+                            f"read timeout {self.read_timeout:g}s"
+                        ) from e
+                    if isinstance(e, requests.exceptions.ConnectionError):
+                        raise PlatformCliError("connection to the platform failed").add_context(
+                            f"while sending {method} {url}"
+                        ).add_hint(f"reason: {e}") from e
                     raise
-                print("connection error, retrying in 3s...")
-                time.sleep(3)
-                continue
-            break
+                reason = f"connection error ({type(e).__name__})"
+            else:
+                if not self.retry_policy.retryable_response(resp, idempotent):
+                    break
+                delay = self.retry_policy.delay(retry + 1, resp)
+                if retry >= max_retries or not self._within_budget(start, delay):
+                    break
+                reason = f"status {resp.status_code}"
+            retry += 1
+            self.retries += 1
+            if self.verbose:
+                print(
+                    f"{reason}, retrying {method} {url} in {delay:.1f}s "
+                    f"(retry {retry}/{max_retries})"
+                )
+            time.sleep(delay)
 
+        if self.verbose:
+            sent = len(body) if body is not None else 0
+            sent_encoding = headers.get("Content-Encoding", "identity")
+            received = wire_bytes(resp)
+            received_encoding = resp.headers.get("Content-Encoding", "identity")
+            print(
+                f"{resp.status_code} {method} {url}: "
+                f"sent {sent} bytes ({sent_encoding}), "
+                f"received {received} bytes ({received_encoding}, "
+                f"{len(resp.content)} decoded)"
+                + (f" after {retry} retries" if retry > 0 else "")
+            )
         return resp
 
+    def _within_budget(self, start: float, delay: float) -> bool:
+        """Whether a retry after `delay` seconds fits into the time budget"""
+        left = remaining()
+        if left is not None and delay >= left:
+            return False
+        return self.retry_policy.within_budget(start, delay)
+
     def post(
         self,
         endpoint_suffix: str,
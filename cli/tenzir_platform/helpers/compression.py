@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import gzip
+
+from requests import Response
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+def compress_body(body: bytes, algorithm: str, threshold: int) -> tuple[bytes, str | None]:
+    """Compress a request body according to the configured algorithm.
+
+    Returns the (possibly unchanged) body and the value for the
+    `Content-Encoding` header, or `None` if the body was left as-is."""
+    if algorithm == "none" or len(body) < threshold:
+        return body, None
+    if algorithm == "auto":
+        algorithm = "zstd" if ZSTD_AVAILABLE else "gzip"
+    if algorithm == "zstd" and ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor().compress(body), "zstd"
+    # Also used as fallback when zstd was requested but isn't available.
+    return gzip.compress(body, compresslevel=6), "gzip"
+
+
+def wire_bytes(resp: Response) -> int:
+    """The number of body bytes received over the network for `resp`.
+
+    For compressed responses this is the compressed size, which can be
+    much smaller than `len(resp.content)`."""
+    downloaded = getattr(resp, "wire_bytes", None)
+    if downloaded is not None:
+        return downloaded
+    if resp.raw is not None and hasattr(resp.raw, "tell"):
+        try:
+            return resp.raw.tell()
+        except Exception:
+            pass
+    content_length = resp.headers.get("Content-Length")
+    if content_length is not None and content_length.isdigit():
+        return int(content_length)
+    return len(resp.content)
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+# The deadline of the current command as a pair of the monotonic expiry time
+# and the total budget in seconds. Context variables are inherited by the
+# threads started via `asyncio.to_thread()`, so the concurrent requests of
+# a command share its budget.
+_deadline: ContextVar[tuple[float, float] | None] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def command_deadline(seconds: float | None) -> Iterator[None]:
+    """Limit the total time of all requests made within the block"""
+    if seconds is None:
+        yield
+        return
+    token = _deadline.set((time.monotonic() + seconds, seconds))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """The remaining time until the deadline, or `None` if there is none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline[0] - time.monotonic()
+
+
+def exceeded() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def deadline_exceeded() -> PlatformCliError:
+    deadline = _deadline.get()
+    budget = f" of {deadline[1]:g}s" if deadline is not None else ""
+    return PlatformCliError(f"deadline{budget} exceeded").add_hint(
+        "increase the time budget of the command with '--deadline'"
+    )
+
+
+def request_timeout(connect: float, read: float) -> tuple[float, float]:
+    """The (connect, read) timeouts for a request, capped by the deadline"""
+    left = remaining()
+    if left is None:
+        return connect, read
+    if left <= 0:
+        raise deadline_exceeded()
+    return min(connect, left), min(read, left)
@@ -1,6 +1,7 @@
 # SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
 # SPDX-License-Identifier: BSD-3-Clause
 
+from typing import Literal
 
 from pydantic_settings import BaseSettings  # type: ignore[import-not-found]
 from pydantic_settings.exceptions import SettingsError  # type: ignore[import-not-found]
@@ -44,13 +45,123 @@ class PlatformEnvironment(BaseSettings):
     # Override the default OIDC scopes.
     scope: str | None = None
 
+    # Request a refresh token (the `offline_access` scope) on interactive
+    # logins, so that expired id tokens are renewed without user
+    # interaction. Cached id tokens that expire within `token_refresh_margin`
+    # seconds are renewed in the background ahead of time.
+    offline_access: bool = False
+    token_refresh_margin: float = 300
+
+    # Use this workspace id or name instead of the selected workspace,
+    # without changing the selection. Also set by `--workspace`.
+    workspace: str | None = None
+
     # Additional headers that should be sent with any request
     # to the Tenzir Platform.
     extra_headers: dict[str, str] = {}
 
+    # TLS settings for self-hosted platforms. `ca_bundle` is a PEM file or
+    # a directory of certificates that are trusted in addition to the
+    # default CAs. `client_certificate` and `client_key` are PEM files used
+    # for mutual TLS. If `pinned_certificates` is not empty, the certificate
+    # of the platform API must have one of the given SHA-256 fingerprints,
+    # e.g. `TENZIR_PLATFORM_CLI_PINNED_CERTIFICATES='["9f:86:d0:..."]'`.
+    ca_bundle: str | None = None
+    client_certificate: str | None = None
+    client_key: str | None = None
+    pinned_certificates: list[str] = []
+
+    # Connection pooling for all HTTP requests made by the CLI.
+    # `pool_connections` is the number of hosts to keep a pool for,
+    # `pool_maxsize` the number of connections kept open per host.
+    # When `pool_block` is set, requests wait for a free connection
+    # instead of opening additional ones beyond `pool_maxsize`.
+    pool_connections: int = 4
+    pool_maxsize: int = 10
+    pool_block: bool = False
+
+    # Keep connections open between requests.
+    keep_alive: bool = True
+
+    # Open the connection to the platform while the command is still
+    # starting up. This sends an additional `HEAD` request to the API
+    # endpoint, which counts against rate limits and shows up in the logs
+    # of the server, so it is opt-in.
+    preconnect: bool = False
+
+    # Use HTTP/2 where the server supports it, so that concurrent requests
+    # are multiplexed over a single connection. Requires the optional
+    # `http2` extra; without it the CLI falls back to HTTP/1.1.
+    http2: bool = False
+
+    # Compress request bodies of at least `compression_threshold` bytes.
+    # The value "auto" selects zstd when the `zstandard` package is
+    # installed and gzip otherwise. Responses are always requested in
+    # compressed form.
+    request_compression: Literal["none", "gzip", "zstd", "auto"] = "none"
+    compression_threshold: int = 4096
+
+    # Timeouts in seconds for establishing a connection and for waiting on
+    # data from the server. The optional `deadline` limits the total time
+    # of all requests made by a single command, including retries.
+    connect_timeout: float = 10
+    read_timeout: float = 60
+    deadline: float | None = None
+
+    # Retries of failed requests. Connection errors and 429/502/503/504
+    # responses are retried with exponential backoff and jitter, or after
+    # the delay requested by the server via `Retry-After`. Requests that
+    # modify state are only retried if the server cannot have processed
+    # them. No retry is started that would end after `retry_max_elapsed`
+    # seconds.
+    retry_max_retries: int = 3
+    retry_backoff_base: float = 0.5
+    retry_backoff_max: float = 10.0
+    retry_max_elapsed: float = 60.0
+
+    # Client-side flow control for platform API requests. `rate_limit` caps
+    # the sustained number of requests per second (0 means unlimited),
+    # allowing bursts of up to `rate_limit_burst` requests. With
+    # `adaptive_concurrency`, the number of concurrent requests is halved
+    # whenever the platform responds with 429/5xx or latency spikes, and
+    # slowly grows back up to `max_concurrency` while it recovers. The
+    # rate limit adapts in the same way.
+    rate_limit: float = 0
+    rate_limit_burst: int = 10
+    adaptive_concurrency: bool = True
+
+    # Cache responses of read-only endpoints on disk. Entries are used
+    # without contacting the platform for the number of seconds given in
+    # `response_cache_ttls`, and are revalidated via ETag afterwards. This
+    # is opt-in, because cached lists don't show changes made elsewhere,
+    # e.g. in the web UI, until the entries expire.
+    response_cache: bool = False
+    response_cache_ttls: dict[str, int] = {
+        "list-nodes": 10,
+        "alert/list": 30,
+        "secrets/list": 30,
+        "secrets/list-stores": 300,
+        "get-login-info": 300,
+        "global-tenant-list": 60,
+    }
+
+    # The maximum number of requests that commands issue concurrently
+    # when they need to make several independent API calls.
+    max_concurrency: int = 8
+
+    # Forward commands to a background agent that keeps the authentication
+    # state and the connections to the platform between invocations. The
+    # agent is started on demand and exits after `agent_idle_timeout`
+    # seconds without commands.
+    agent: bool = False
+    agent_idle_timeout: float = 900
+
     # Enable more verbose print statements.
     verbose: bool = False
 
+    # Record a timing breakdown of every HTTP request.
+    timings: bool = False
+
     @staticmethod
     def load():
         try:
@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Optional HTTP/2 transport based on `httpx`.
+
+The rest of the CLI is written against the `requests` API, so this module
+exposes a small session object that accepts the same arguments as
+`requests.Session.request()` and converts the results back into
+`requests.Response` objects. Error handling in the subcommands (e.g.
+`resp.raise_for_status()` raising a `requests.HTTPError`) therefore works
+unchanged regardless of the transport."""
+
+from typing import Any
+
+import requests
+import requests.exceptions
+from requests.structures import CaseInsensitiveDict
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.timings import Http2TraceRecorder
+from tenzir_platform.helpers.tls import shared_ssl_context
+
+try:
+    import h2  # type: ignore[import-not-found]  # noqa: F401
+    import httpx  # type: ignore[import-not-found]
+
+    HTTP2_AVAILABLE = True
+    CONNECT_ERRORS: tuple[type[Exception], ...] = (httpx.ConnectError, httpx.ConnectTimeout)
+except ImportError:
+    HTTP2_AVAILABLE = False
+    CONNECT_ERRORS = ()
+
+
+class Http2Session:
+    """A `requests.Session` look-alike that multiplexes requests over HTTP/2.
+
+    Servers that don't negotiate HTTP/2 via ALPN, as well as plain `http://`
+    endpoints, are transparently served over HTTP/1.1."""
+
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        assert HTTP2_AVAILABLE, "the 'http2' extra is not installed"
+        self.headers: dict[str, str] = {}
+        self.timings = platform.timings
+        keepalive = platform.pool_maxsize if platform.keep_alive else 0
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=platform.pool_connections * platform.pool_maxsize,
+                max_keepalive_connections=keepalive,
+            ),
+            timeout=None,
+            verify=shared_ssl_context(platform),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        json: Any = None,
+        data: Any = None,
+        headers: dict[str, str] | None = None,
+        timeout: Any = None,
+        **_: Any,
+    ) -> requests.Response:
+        merged_headers = {**self.headers, **(headers or {})}
+        extensions: dict[str, Any] = {}
+        trace = None
+        if self.timings:
+            trace = Http2TraceRecorder(method, url)
+            extensions["trace"] = trace
+        # httpx only takes form fields as `data`, raw bodies like the
+        # compressed ones go into `content`.
+        content = None
+        if isinstance(data, bytes | str):
+            content, data = data, None
+        try:
+            resp = self._client.request(
+                method,
+                url,
+                json=json,
+                data=data,
+                content=content,
+                headers=merged_headers,
+                timeout=_convert_timeout(timeout),
+                extensions=extensions,
+            )
+        except Exception as e:
+            if trace is not None:
+                trace.finish(None, error=e)
+            if isinstance(e, httpx.ConnectTimeout):
+                raise requests.exceptions.ConnectTimeout(str(e)) from e
+            if isinstance(e, httpx.TimeoutException):
+                raise requests.exceptions.Timeout(str(e)) from e
+            if isinstance(e, httpx.TransportError):
+                raise requests.exceptions.ConnectionError(str(e)) from e
+            raise
+        if trace is not None:
+            trace.finish(resp)
+        return _to_requests_response(method, resp)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def _convert_timeout(timeout: Any) -> Any:
+    # `requests` accepts either a single number or a (connect, read) tuple.
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return timeout
+
+
+def _to_requests_response(method: str, resp: "httpx.Response") -> requests.Response:
+    result = requests.Response()
+    result.status_code = resp.status_code
+    result._content = resp.content
+    result.headers = CaseInsensitiveDict(resp.headers)
+    result.url = str(resp.url)
+    result.reason = resp.reason_phrase
+    result.encoding = resp.encoding
+    result.elapsed = resp.elapsed
+    result.request = requests.Request(
+        method, str(resp.request.url), headers=dict(resp.request.headers)
+    ).prepare()
+    # Not part of the `requests` API, but useful for verbose output.
+    result.http_version = resp.http_version  # type: ignore[attr-defined]
+    result.wire_bytes = resp.num_bytes_downloaded  # type: ignore[attr-defined]
+    return result
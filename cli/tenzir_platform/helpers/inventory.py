@@ -0,0 +1,180 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""A local snapshot of the objects in the platform.
+
+The inventory is a SQLite database in the cache directory of every stage.
+It is filled by `tenzir-platform sync` and answers list commands run with
+`--offline` without contacting the platform. Objects are stored as JSON
+together with their id and name, grouped by workspace and kind, e.g.
+`nodes` or `secrets:default`."""
+
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from tenzir_platform.helpers.cache import filename_in_cache
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+# Workspaces are not part of a workspace themselves.
+GLOBAL = ""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    workspace_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    name TEXT,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (workspace_id, kind, object_id)
+);
+CREATE INDEX IF NOT EXISTS objects_by_name ON objects (workspace_id, kind, name);
+CREATE TABLE IF NOT EXISTS syncs (
+    workspace_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (workspace_id, kind)
+);
+"""
+
+
+def secrets_kind(store_id: str | None) -> str:
+    """The kind of the secrets in a store, or in the default store"""
+    return f"secrets:{store_id or 'default'}"
+
+
+class Snapshot:
+    """The objects of one kind as of the last sync"""
+
+    def __init__(self, objects: list[dict[str, Any]], metadata: dict[str, Any], synced_at: float):
+        self.objects = objects
+        self.metadata = metadata
+        self.synced_at = synced_at
+
+    def age(self) -> str:
+        seconds = max(time.time() - self.synced_at, 0)
+        if seconds < 120:
+            return f"{seconds:.0f}s"
+        if seconds < 7200:
+            return f"{seconds / 60:.0f}m"
+        return f"{seconds / 3600:.0f}h"
+
+
+class SyncResult:
+    def __init__(self) -> None:
+        self.added = 0
+        self.changed = 0
+        self.removed = 0
+        self.total = 0
+
+    def __str__(self) -> str:
+        return f"{self.total} ({self.added} added, {self.changed} changed, {self.removed} removed)"
+
+
+class Inventory:
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        self.filename = filename_in_cache(platform, "inventory.sqlite3")
+        self.verbose = platform.verbose
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        # Concurrent syncs wait for each other instead of failing.
+        connection = sqlite3.connect(self.filename, timeout=30)
+        try:
+            connection.executescript(_SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _error(self, message: str, e: sqlite3.Error) -> PlatformCliError:
+        return (
+            PlatformCliError(message)
+            .add_hint(f"reason: {e}")
+            .add_hint(f"the inventory is stored at {self.filename}")
+        )
+
+    def record(
+        self,
+        workspace_id: str,
+        kind: str,
+        objects: list[dict[str, Any]],
+        id_key: str,
+        name_key: str | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> SyncResult:
+        """Replace the stored objects of a kind with the current ones.
+
+        Only rows that actually changed are written."""
+        result = SyncResult()
+        result.total = len(objects)
+        try:
+            with self._connect() as connection:
+                stored = {
+                    object_id: (position, data)
+                    for object_id, position, data in connection.execute(
+                        "SELECT object_id, position, data FROM objects WHERE workspace_id = ? AND kind = ?",
+                        (workspace_id, kind),
+                    )
+                }
+                seen = set()
+                for position, obj in enumerate(objects):
+                    object_id = str(obj[id_key])
+                    seen.add(object_id)
+                    data = json.dumps(obj)
+                    previous = stored.get(object_id)
+                    if previous == (position, data):
+                        continue
+                    if previous is None:
+                        result.added += 1
+                    elif previous[1] != data:
+                        result.changed += 1
+                    name = obj.get(name_key) if name_key is not None else None
+                    connection.execute(
+                        "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                        (workspace_id, kind, object_id, name, position, data),
+                    )
+                removed = [object_id for object_id in stored if object_id not in seen]
+                result.removed = len(removed)
+                connection.executemany(
+                    "DELETE FROM objects WHERE workspace_id = ? AND kind = ? AND object_id = ?",
+                    [(workspace_id, kind, object_id) for object_id in removed],
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?)",
+                    (workspace_id, kind, time.time(), json.dumps(metadata or {})),
+                )
+        except sqlite3.Error as e:
+            raise self._error("failed to update the local inventory", e)
+        return result
+
+    def load(self, workspace_id: str, kind: str) -> Snapshot:
+        """Return the objects of a kind from the last sync"""
+        try:
+            with self._connect() as connection:
+                sync = connection.execute(
+                    "SELECT synced_at, metadata FROM syncs WHERE workspace_id = ? AND kind = ?",
+                    (workspace_id, kind),
+                ).fetchone()
+                rows = connection.execute(
+                    "SELECT data FROM objects WHERE workspace_id = ? AND kind = ? ORDER BY position",
+                    (workspace_id, kind),
+                ).fetchall()
+        except sqlite3.Error as e:
+            raise self._error("failed to read the local inventory", e)
+        if sync is None:
+            raise PlatformCliError(f"no {kind.split(':')[0]} in the local inventory").add_hint(
+                "run 'tenzir-platform sync' to download the inventory"
+            )
+        snapshot = Snapshot([json.loads(data) for (data,) in rows], json.loads(sync[1]), sync[0])
+        if self.verbose:
+            print(f"using {kind} from the local inventory, synced {snapshot.age()} ago")
+        return snapshot
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+from collections.abc import Callable, Hashable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from requests import Response
+
+T = TypeVar("T")
+
+
+class RequestMemo:
+    """Coalesces identical read-only requests.
+
+    The first caller performs the request, concurrent callers with the same
+    key wait for its response instead of sending their own. Successful
+    responses are kept until the memo is invalidated, failed ones are only
+    shared with the callers that were already waiting.
+
+    The memo also keeps values derived from the responses, like the
+    indexes for resolving names, which are dropped together with them."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._responses: dict[Hashable, Future[Response]] = {}
+        self._derived: dict[Hashable, Any] = {}
+
+    def fetch(self, key: Hashable, fetch: Callable[[], Response]) -> tuple[Response, bool]:
+        """Return the response for `key`, and whether it was shared"""
+        with self._lock:
+            future = self._responses.get(key)
+            owner = future is None
+            if future is None:
+                future = Future()
+                self._responses[key] = future
+        if not owner:
+            return future.result(), True
+        try:
+            resp = fetch()
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+        if not resp.ok:
+            self._forget(key, future)
+        future.set_result(resp)
+        return resp, False
+
+    def _forget(self, key: Hashable, future: Future[Response]) -> None:
+        with self._lock:
+            if self._responses.get(key) is future:
+                del self._responses[key]
+
+    def derived(self, key: Hashable, build: Callable[[], T]) -> T:
+        """Return the value for `key`, building it on first use"""
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = build()
+        with self._lock:
+            return self._derived.setdefault(key, value)
+
+    def invalidate(self) -> None:
+        """Drop all responses, e.g. after a request that modified data"""
+        with self._lock:
+            self._responses.clear()
+            self._derived.clear()
+
+
+# The memo of the current command. Like the deadline, it's inherited by
+# the threads that run concurrent requests of the command, but commands
+# running side by side (e.g. in a `batch`) each get their own.
+_memo: ContextVar[RequestMemo | None] = ContextVar("request_memo", default=None)
+
+
+@contextmanager
+def memoize_requests() -> Iterator[RequestMemo]:
+    """Share the responses of read-only requests made within the block"""
+    memo = RequestMemo()
+    token = _memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _memo.reset(token)
+
+
+def current_memo() -> RequestMemo | None:
+    return _memo.get()
@@ -1,19 +1,32 @@
 # SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
 # SPDX-License-Identifier: BSD-3-Clause
 
+import atexit
 import base64
+import contextlib
+import json
 import os
 import sys
+import threading
 import time
 from typing import Any
 
 import jwt  # type: ignore[import-not-found]
-import requests
-from jwt import PyJWKClient  # type: ignore[import-not-found]
+import requests.exceptions
+from jwt import PyJWK, PyJWKSet  # type: ignore[import-not-found]
+from jwt.exceptions import PyJWKSetError  # type: ignore[import-not-found]
+from requests import Response
 
-from tenzir_platform.helpers.cache import filename_in_cache
+from tenzir_platform.helpers.cache import (
+    cache_lifetime,
+    cache_lock,
+    filename_in_cache,
+    write_cache_file,
+)
+from tenzir_platform.helpers.deadline import deadline_exceeded, exceeded, request_timeout
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.session import shared_session
 
 
 def INVALID_API_KEY(hint: str):
@@ -49,12 +62,100 @@ class ValidOidcToken:
             raise INVALID_API_KEY(f"{key} is expected to be a list of strings")
         return self._raw_oidc.get(key, default)
 
+    def get_expiry(self) -> float:
+        """The expiry time as UNIX timestamp, or infinity if there is none"""
+        exp = self._raw_oidc.get("exp")
+        return float(exp) if isinstance(exp, int | float) else float("inf")
+
     def __str__(self) -> str:
         return self._raw_oidc.__str__()
 
 
 x_www_form_urlencoded = {"Content-Type": "application/x-www-form-urlencoded"}
 
+# How long to keep a discovery document that came without cache headers.
+_DEFAULT_DISCOVERY_TTL = 24 * 60 * 60
+
+# How long to keep signing keys that came without cache headers. Tokens
+# signed with an unknown key trigger a refetch anyway, so key rotations are
+# picked up regardless.
+_DEFAULT_JWKS_TTL = 24 * 60 * 60
+
+# The minimum number of seconds between two fetches of the signing keys, so
+# that tokens with unknown key ids can't flood the identity provider.
+_JWKS_REFETCH_INTERVAL = 60
+
+
+class _SigningKeys:
+    """The signing keys of an identity provider, indexed by key id"""
+
+    def __init__(self, jwks: dict[str, Any], fetched_at: float, expires_at: float) -> None:
+        self.jwks = jwks
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.keys: dict[str | None, PyJWK] = {}
+        try:
+            key_set = PyJWKSet.from_dict(jwks)
+        except PyJWKSetError:
+            return
+        for key in key_set.keys:
+            if key.public_key_use in ("sig", None):
+                self.keys[key.key_id] = key
+
+    def get(self, kid: str | None) -> PyJWK | None:
+        # Tokens without a key id can only be matched against a single key.
+        if kid is None and len(self.keys) == 1:
+            return next(iter(self.keys.values()))
+        return self.keys.get(kid)
+
+    def is_fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def may_refetch(self) -> bool:
+        return time.time() - self.fetched_at >= _JWKS_REFETCH_INTERVAL
+
+
+# Discovery documents and signing keys are kept for the lifetime of the
+# process, so that commands running in the same process (e.g. as part of
+# a `batch`) don't need to fetch them again. Discovery documents are stored
+# together with their expiry time.
+_discovery_documents: dict[str, tuple[float, dict[str, Any]]] = {}
+_signing_key_sets: dict[str, _SigningKeys] = {}
+_validated_tokens: dict[tuple[str, str, str], ValidOidcToken] = {}
+_fetch_locks: dict[str, threading.Lock] = {}
+_fetch_locks_lock = threading.Lock()
+
+# The refresh token files for which a background refresh is running, and
+# the threads running them.
+_background_refreshes: set[str] = set()
+_background_refresh_threads: set[threading.Thread] = set()
+_background_refreshes_lock = threading.Lock()
+
+# How long the process waits for background refreshes when it exits, in
+# seconds. A refresh that is cut off may lose the rotated refresh token,
+# so that the user has to log in again.
+_BACKGROUND_REFRESH_GRACE_PERIOD = 2.0
+
+
+@atexit.register
+def _wait_for_background_refreshes() -> None:
+    deadline = time.monotonic() + _BACKGROUND_REFRESH_GRACE_PERIOD
+    with _background_refreshes_lock:
+        threads = list(_background_refresh_threads)
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def _fetch_lock(url: str) -> threading.Lock:
+    with _fetch_locks_lock:
+        return _fetch_locks.setdefault(url, threading.Lock())
+
+
+def prefetch(platform: PlatformEnvironment) -> None:
+    """Fetch the discovery document and the signing keys of the identity
+    provider, so they are ready when the id token is validated"""
+    IdTokenClient(platform)._signing_keys()
+
 
 class IdTokenClient:
     def __init__(self, platform: PlatformEnvironment):
@@ -66,23 +167,185 @@ class IdTokenClient:
             platform.audience if platform.audience is not None else platform.client_id
         )
         self.scope = platform.scope
+        self.offline_access = platform.offline_access
+        self.refresh_margin = platform.token_refresh_margin
         if platform.client_secret_file is not None:
             with open(platform.client_secret_file) as f:
                 self.client_secret = f.read()
         self.hardcoded_id_token = platform.id_token
         self.verbose = platform.verbose
+        self.session = shared_session(platform)
+        self.connect_timeout = platform.connect_timeout
+        self.read_timeout = platform.read_timeout
+
+    # The endpoints are only discovered when they are needed, so that
+    # commands with a valid cached token don't talk to the identity provider.
+    @property
+    def jwks_url(self) -> str:
+        return self._discover()["jwks_uri"]
+
+    @property
+    def token_endpoint(self) -> str:
+        return self._discover()["token_endpoint"]
+
+    @property
+    def device_authorization_endpoint(self) -> str:
+        return self._discover()["device_authorization_endpoint"]
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> Response:
+        timeout = request_timeout(self.connect_timeout, self.read_timeout)
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.Timeout as e:
+            error = (
+                deadline_exceeded()
+                if exceeded()
+                else PlatformCliError("request to identity provider timed out")
+            )
+            raise error.add_context(f"while sending {method} {url}") from e
+        except requests.exceptions.RequestException as e:
+            raise (
+                PlatformCliError("failed to reach the identity provider")
+                .add_context(f"while sending {method} {url}")
+                .add_hint(f"reason: {e}")
+            ) from e
+
+    def _discover(self) -> dict[str, Any]:
         discovery_url = f"{self.issuer.rstrip('/')}/.well-known/openid-configuration"
-        discovered_configuration = requests.get(discovery_url).json()
-        self.jwks_url = discovered_configuration["jwks_uri"]
-        self.token_endpoint = discovered_configuration["token_endpoint"]
-        self.device_authorization_endpoint = discovered_configuration[
-            "device_authorization_endpoint"
-        ]
+        cached = _discovery_documents.get(discovery_url)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        # Wait for a concurrent fetch instead of starting another one.
+        with _fetch_lock(discovery_url):
+            cached = _discovery_documents.get(discovery_url)
+            if cached is None or cached[0] <= time.time():
+                cached = self._load_discovery_document(discovery_url) or cached
+            if cached is None or cached[0] <= time.time():
+                try:
+                    cached = self._fetch_discovery_document(discovery_url)
+                except (requests.exceptions.RequestException, PlatformCliError, ValueError):
+                    if cached is None:
+                        raise
+                    # An outdated document is still better than none.
+                    if self.verbose:
+                        print(f"failed to refresh {discovery_url}, using cached document")
+            _discovery_documents[discovery_url] = cached
+        return cached[1]
+
+    def _discovery_cache_filename(self) -> str:
+        return filename_in_cache(self.platform_environment, "oidc-discovery.json")
+
+    def _load_discovery_document(self, url: str) -> tuple[float, dict[str, Any]] | None:
+        try:
+            with open(self._discovery_cache_filename()) as f:
+                entry = json.load(f)
+            if entry["url"] != url:
+                return None
+            return float(entry["expires_at"]), entry["document"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _fetch_discovery_document(self, url: str) -> tuple[float, dict[str, Any]]:
+        if self.verbose:
+            print(f"fetching {url}")
+        resp = self._request("GET", url)
+        resp.raise_for_status()
+        document = resp.json()
+        expires_at = time.time() + cache_lifetime(resp, _DEFAULT_DISCOVERY_TTL)
+        entry = {"url": url, "expires_at": expires_at, "document": document}
+        # Caching is best-effort only.
+        with contextlib.suppress(OSError):
+            write_cache_file(self._discovery_cache_filename(), json.dumps(entry))
+        return expires_at, document
+
+    def _signing_keys(self, outdated: _SigningKeys | None = None) -> _SigningKeys:
+        """Return the signing keys of the identity provider.
+
+        If `outdated` is given, it lacks a key that is required, so a newer
+        set of keys is fetched unless that happened only recently."""
+
+        def usable(keys: _SigningKeys | None) -> bool:
+            return (
+                keys is not None
+                and keys.is_fresh()
+                and (outdated is None or keys.fetched_at > outdated.fetched_at)
+            )
+
+        jwks_url = self.jwks_url
+        keys = _signing_key_sets.get(jwks_url)
+        if usable(keys):
+            assert keys is not None  # assist mypy
+            return keys
+        with _fetch_lock(jwks_url):
+            keys = _signing_key_sets.get(jwks_url)
+            if not usable(keys):
+                # Another process may have fetched newer keys already.
+                loaded = self._load_signing_keys(jwks_url)
+                if loaded is not None and (keys is None or loaded.fetched_at > keys.fetched_at):
+                    keys = loaded
+            if not usable(keys) and (keys is None or keys.may_refetch()):
+                try:
+                    keys = self._fetch_signing_keys(jwks_url)
+                except (requests.exceptions.RequestException, PlatformCliError, ValueError):
+                    if keys is None:
+                        raise
+                    # Outdated keys are still good for tokens they signed.
+                    if self.verbose:
+                        print(f"failed to refresh {jwks_url}, using cached keys")
+            assert keys is not None  # assist mypy
+            _signing_key_sets[jwks_url] = keys
+        return keys
+
+    def _jwks_cache_filename(self) -> str:
+        return filename_in_cache(self.platform_environment, "oidc-jwks.json")
+
+    def _load_signing_keys(self, url: str) -> _SigningKeys | None:
+        try:
+            with open(self._jwks_cache_filename()) as f:
+                entry = json.load(f)
+            if entry["url"] != url:
+                return None
+            return _SigningKeys(
+                entry["jwks"], float(entry["fetched_at"]), float(entry["expires_at"])
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _fetch_signing_keys(self, url: str) -> _SigningKeys:
+        if self.verbose:
+            print(f"fetching {url}")
+        resp = self._request("GET", url)
+        resp.raise_for_status()
+        jwks = resp.json()
+        fetched_at = time.time()
+        expires_at = fetched_at + cache_lifetime(resp, _DEFAULT_JWKS_TTL)
+        keys = _SigningKeys(jwks, fetched_at, expires_at)
+        entry = {"url": url, "fetched_at": fetched_at, "expires_at": expires_at, "jwks": jwks}
+        # Caching is best-effort only.
+        with contextlib.suppress(OSError):
+            write_cache_file(self._jwks_cache_filename(), json.dumps(entry))
+        return keys
+
+    def _signing_key(self, id_token: str) -> PyJWK:
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        keys = self._signing_keys()
+        key = keys.get(kid)
+        if key is None:
+            # The identity provider may have rotated its keys.
+            keys = self._signing_keys(outdated=keys)
+            key = keys.get(kid)
+        if key is None:
+            raise INVALID_API_KEY(f"no signing key with id {kid} found at {self.jwks_url}")
+        return key
 
     def validate_token(self, id_token: str) -> ValidOidcToken:
         """Verify the token using the audience specific to the CLI"""
-        jwks_client = PyJWKClient(self.jwks_url)
-        signing_key = jwks_client.get_signing_key_from_jwt(id_token)
+        # Tokens that were already validated in this process only need to
+        # be checked for expiry again.
+        validated = _validated_tokens.get((id_token, self.issuer, self.audience))
+        if validated is not None and validated.get_expiry() > time.time():
+            return validated
+        signing_key = self._signing_key(id_token)
         validated_token = jwt.decode(
             id_token,
             signing_key.key,
@@ -90,7 +353,9 @@ class IdTokenClient:
             issuer=self.issuer,
             audience=self.audience,
         )
-        return ValidOidcToken(validated_token)
+        validated = ValidOidcToken(validated_token)
+        _validated_tokens[(id_token, self.issuer, self.audience)] = validated
+        return validated
 
     def reauthenticate_token(self, interactive: bool = True) -> str:
         if interactive:
@@ -102,12 +367,16 @@ class IdTokenClient:
         return self._unwrap_flow_result(token_data)
 
     def _device_code_flow(self) -> dict[str, str]:
+        scope = self.scope if self.scope is not None else "openid email"
+        if self.offline_access and "offline_access" not in scope.split():
+            scope += " offline_access"
         device_code_payload = {
             "client_id": self.client_id,
-            "scope": self.scope if self.scope is not None else "openid email",
+            "scope": scope,
         }
 
-        device_code_response = requests.post(
+        device_code_response = self._request(
+            "POST",
             self.device_authorization_endpoint,
             data=device_code_payload,
             headers=x_www_form_urlencoded,
@@ -155,8 +424,8 @@ class IdTokenClient:
             token_payload["client_secret"] = self.client_secret
         authenticated = False
         while not authenticated:
-            token_response = requests.post(
-                self.token_endpoint, data=token_payload, headers=x_www_form_urlencoded
+            token_response = self._request(
+                "POST", self.token_endpoint, data=token_payload, headers=x_www_form_urlencoded
             )
             token_data = token_response.json()
             if token_response.status_code == 200:
@@ -166,8 +435,12 @@ class IdTokenClient:
                 raise PlatformCliError(
                     "failed to perform device code authentication"
                 ).add_hint(f"upstream error message: {token_data['error_description']}")
-            else:
-                time.sleep(device_code_data["interval"])
+            # Another process may have completed its login in the meantime.
+            token = self.load_cached_id_token()
+            if token is not None:
+                print("Authenticated by another 'tenzir-platform' process!")
+                return {"id_token": token}
+            time.sleep(device_code_data["interval"])
         return token_data
 
     def _client_credentials_flow(self) -> dict[str, str]:
@@ -186,7 +459,8 @@ class IdTokenClient:
         credentials = base64.b64encode(
             f"{self.client_id}:{client_secret}".encode()
         ).decode("utf-8")
-        response = requests.post(
+        response = self._request(
+            "POST",
             self.token_endpoint,
             data=client_credentials_payload,
             headers={
@@ -221,8 +495,107 @@ class IdTokenClient:
         if self.verbose:
             print(f"obtained id_token: {current_user}")
         self._store_id_token(id_token)
+        # Identity providers that rotate refresh tokens send a new one with
+        # every refresh, others only on login.
+        if "refresh_token" in token_data:
+            self._store_refresh_token(token_data["refresh_token"])
         return id_token
 
+    def _refresh_token_filename(self) -> str:
+        return filename_in_cache(self.platform_environment, "refresh_token")
+
+    def _load_refresh_token(self) -> str | None:
+        try:
+            with open(self._refresh_token_filename()) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _store_refresh_token(self, token: str) -> None:
+        filename = self._refresh_token_filename()
+        if self.verbose:
+            print(f"saving refresh token to {filename}")
+        write_cache_file(filename, token)
+
+    def _forget_refresh_token(self, token: str) -> None:
+        # Another process may have stored a newer refresh token meanwhile.
+        if self._load_refresh_token() == token:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self._refresh_token_filename())
+
+    def refresh_id_token(self) -> str | None:
+        """Obtain a new id token using the cached refresh token.
+
+        Returns `None` if there is no refresh token or the identity
+        provider didn't accept it."""
+        refresh_token = self._load_refresh_token()
+        if refresh_token is None:
+            return None
+        if self.verbose:
+            print("refreshing the id token")
+        refresh_payload = {
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+        }
+        if self.client_secret is not None:
+            refresh_payload["client_secret"] = self.client_secret
+        try:
+            response = self._request(
+                "POST", self.token_endpoint, data=refresh_payload, headers=x_www_form_urlencoded
+            )
+        except (requests.exceptions.RequestException, PlatformCliError) as e:
+            if self.verbose:
+                print(f"failed to refresh the id token: {e}")
+            return None
+        if response.status_code != 200:
+            if self.verbose:
+                print(f"failed to refresh the id token: {response.text}")
+            # The refresh token was revoked or has expired.
+            if response.status_code in (400, 401):
+                self._forget_refresh_token(refresh_token)
+            return None
+        try:
+            return self._unwrap_flow_result(response.json())
+        except Exception as e:
+            if self.verbose:
+                print(f"failed to refresh the id token: {e}")
+            return None
+
+    def _expires_soon(self, token: str) -> bool:
+        expiry = self.validate_token(token).get_expiry()
+        return expiry - time.time() < self.refresh_margin
+
+    def _refresh_in_background(self) -> None:
+        filename = self._refresh_token_filename()
+        if not os.path.exists(filename):
+            return
+        with _background_refreshes_lock:
+            if filename in _background_refreshes:
+                return
+            _background_refreshes.add(filename)
+        client = IdTokenClient(self.platform_environment.model_copy(update={"verbose": False}))
+
+        def refresh() -> None:
+            try:
+                with cache_lock(client._filename_in_cache()):
+                    # Another process may have refreshed the token already.
+                    token = client.load_cached_id_token()
+                    if token is None or client._expires_soon(token):
+                        client.refresh_id_token()
+            finally:
+                with _background_refreshes_lock:
+                    _background_refreshes.discard(filename)
+                    _background_refresh_threads.discard(thread)
+
+        # A daemon thread, so that an unresponsive identity provider can't
+        # keep the process alive after the command finished. Exiting waits
+        # for it for a short time, so that a rotated refresh token is stored.
+        thread = threading.Thread(target=refresh, daemon=True)
+        with _background_refreshes_lock:
+            _background_refresh_threads.add(thread)
+        thread.start()
+
     def _filename_in_cache(self):
         return filename_in_cache(self.platform_environment, "id_token")
 
@@ -230,9 +603,37 @@ class IdTokenClient:
         filename = self._filename_in_cache()
         if self.verbose:
             print(f"saving token to {filename}")
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, "w") as f:
-            f.write(token)
+        write_cache_file(filename, token)
+
+    def load_cached_id_token(self) -> str | None:
+        """Return the configured or cached id token if it is still valid,
+        without starting a new login"""
+        try:
+            if self.hardcoded_id_token:
+                token = self.hardcoded_id_token
+            else:
+                with open(self._filename_in_cache()) as f:
+                    token = f.read()
+            self.validate_token(token)
+            return token
+        except Exception:
+            return None
+
+    def load_id_token_silently(self) -> str | None:
+        """Return a valid id token if one can be obtained without user
+        interaction, i.e. from the cache, with a refresh token or with the
+        client credentials flow"""
+        token = self.load_cached_id_token()
+        if token is not None or self.hardcoded_id_token:
+            return token
+        with cache_lock(self._filename_in_cache()):
+            # Another process may have renewed the token while we waited.
+            token = self.load_cached_id_token()
+            if token is None:
+                token = self.refresh_id_token()
+            if token is None and self.client_secret is not None:
+                token = self.reauthenticate_token(interactive=False)
+        return token
 
     def load_id_token(self, interactive: bool | None = None) -> str:
         # If the user is explicitly passing an id token via
@@ -247,21 +648,34 @@ class IdTokenClient:
                 ).add_hint(f"upstream error: {e}")
         # Otherwise, try to load a valid token from the cache
         # in the filesystem.
-        filename = self._filename_in_cache()
-        try:
-            with open(filename) as f:
-                token = f.read()
-            self.validate_token(token)
+        token = self.load_cached_id_token()
+        if token is not None:
+            if self._expires_soon(token):
+                self._refresh_in_background()
             return token
-        except Exception:
+        # Only one process renews the token, the others wait for it and
+        # then find the new token in the cache.
+        with cache_lock(self._filename_in_cache()):
+            token = self.load_cached_id_token()
+            if token is not None:
+                return token
+            token = self.refresh_id_token()
+            if token is not None:
+                return token
             print(
                 "could not load valid token from cache, reauthenticating",
                 file=sys.stderr,
             )
-        # If the user didn't explicitly choose [non-]interactive login,
-        # assume that client credentials flow is desired whenever a client
-        # secret was set.
-        if interactive is None:
-            interactive = self.client_secret is None
-            assert interactive is not None  # assist mypy
-        return self.reauthenticate_token(interactive=interactive)
+            # If the user didn't explicitly choose [non-]interactive login,
+            # assume that client credentials flow is desired whenever a client
+            # secret was set.
+            if interactive is None:
+                interactive = self.client_secret is None
+                assert interactive is not None  # assist mypy
+            if not interactive:
+                return self.reauthenticate_token(interactive=False)
+        # The device code flow waits for the user, possibly for minutes, so
+        # it doesn't hold the lock. Processes that need a token meanwhile
+        # start their own login, and all of them finish as soon as the user
+        # completes any of them.
+        return self.reauthenticate_token(interactive=True)
@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+import time
+
+from tenzir_platform.helpers.deadline import deadline_exceeded, remaining
+from tenzir_platform.helpers.environment import PlatformEnvironment
+
+# Status codes that indicate that the platform is overloaded.
+_OVERLOAD_STATUS_CODES = {429, 502, 503, 504}
+
+# A request counts as a latency spike if it takes this many times
+# longer than the moving average of previous requests.
+_LATENCY_SPIKE_FACTOR = 3.0
+
+# Don't treat anything below this latency as a spike, to avoid reacting
+# to noise on fast connections.
+_LATENCY_SPIKE_MINIMUM = 0.5
+
+# The number of samples before latency spikes are detected.
+_LATENCY_WARMUP_SAMPLES = 5
+
+# Weight of the newest sample in the latency moving average.
+_LATENCY_EWMA_WEIGHT = 0.2
+
+
+class TokenBucket:
+    """Limits the sustained request rate while allowing short bursts"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.max_rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent.
+
+        Fails right away if the wait would exceed the command deadline."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            left = remaining()
+            if left is not None and wait > left:
+                raise deadline_exceeded().add_context("while waiting for the rate limit")
+            time.sleep(wait)
+
+    def decrease(self, start: float) -> bool:
+        """Halve the rate because of a request started at `start`, unless
+        that request was already in flight at the last decrease"""
+        with self._lock:
+            if start < self._last_decrease:
+                return False
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self._last_decrease = now
+            return True
+
+    def increase(self) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 16)
+
+
+class AdaptiveConcurrency:
+    """An AIMD limit on the number of requests in flight.
+
+    The limit grows by one for every window of successful requests and is
+    halved whenever the platform signals overload. Like in TCP, that
+    happens at most once per round trip: the requests that were already in
+    flight when the limit was halved were sent under the old limit, so
+    their failures don't halve it again."""
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until a request may be sent, but not past the command
+        deadline"""
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise deadline_exceeded().add_context(
+                        "while waiting for other requests to finish"
+                    )
+                self._condition.wait(left)
+            self._in_flight += 1
+
+    def cancel(self) -> None:
+        """Give up a slot without sending the request"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def release(self, start: float, overloaded: bool) -> bool:
+        """Record the outcome of a request started at `start`, and return
+        whether the limit was decreased"""
+        with self._condition:
+            self._in_flight -= 1
+            decreased = False
+            if not overloaded:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            elif start >= self._last_decrease:
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = time.monotonic()
+                decreased = True
+            self._condition.notify_all()
+            return decreased
+
+
+class Throttle:
+    """Client-side flow control for requests to one platform instance"""
+
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        self.verbose = platform.verbose
+        self.bucket = (
+            TokenBucket(platform.rate_limit, platform.rate_limit_burst)
+            if platform.rate_limit > 0
+            else None
+        )
+        self.concurrency = (
+            AdaptiveConcurrency(platform.max_concurrency) if platform.adaptive_concurrency else None
+        )
+        self._average_latency: float | None = None
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Wait until a request may be sent, and return the start time"""
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        if self.bucket is not None:
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                if self.concurrency is not None:
+                    self.concurrency.cancel()
+                raise
+        return time.monotonic()
+
+    def release(self, start: float, status_code: int | None) -> None:
+        """Record the outcome of a request started at `start`.
+
+        A `status_code` of `None` means that no response was received."""
+        latency = time.monotonic() - start
+        overloaded = (
+            status_code is None
+            or status_code in _OVERLOAD_STATUS_CODES
+            or self._is_latency_spike(latency)
+        )
+        decreased = False
+        if self.concurrency is not None:
+            decreased = self.concurrency.release(start, overloaded)
+        if self.bucket is not None:
+            if overloaded:
+                decreased = self.bucket.decrease(start) or decreased
+            else:
+                self.bucket.increase()
+        if decreased and self.verbose:
+            limits = []
+            if self.concurrency is not None:
+                limits.append(f"concurrency {int(self.concurrency.limit)}")
+            if self.bucket is not None:
+                limits.append(f"rate {self.bucket.rate:.1f}/s")
+            if limits:
+                print(f"platform overloaded, reducing {' and '.join(limits)}")
+
+    def _is_latency_spike(self, latency: float) -> bool:
+        with self._lock:
+            average = self._average_latency
+            self._samples += 1
+            if average is None:
+                self._average_latency = latency
+                return False
+            self._average_latency = (
+                _LATENCY_EWMA_WEIGHT * latency + (1 - _LATENCY_EWMA_WEIGHT) * average
+            )
+            return (
+                self._samples > _LATENCY_WARMUP_SAMPLES
+                and latency > _LATENCY_SPIKE_MINIMUM
+                and latency > _LATENCY_SPIKE_FACTOR * average
+            )
+
+
+# Like the HTTP sessions, throttles are shared between all clients in the
+# process that talk to the same platform instance.
+_throttles: dict[str, Throttle] = {}
+_throttles_lock = threading.Lock()
+
+
+def shared_throttle(platform: PlatformEnvironment) -> Throttle:
+    """Return the process-wide throttle for the platform's API endpoint"""
+    with _throttles_lock:
+        throttle = _throttles.get(platform.api_endpoint)
+        if throttle is None:
+            throttle = Throttle(platform)
+            _throttles[platform.api_endpoint] = throttle
+        return throttle
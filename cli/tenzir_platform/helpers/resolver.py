@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import bisect
+import difflib
+import re
+from collections.abc import Callable, Hashable, Iterable
+from typing import Generic, TypeVar
+
+from tenzir_platform.helpers.client import AppClient
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.memo import current_memo
+
+T = TypeVar("T")
+
+# The maximum number of suggestions for an unknown name.
+_MAX_SUGGESTIONS = 3
+
+# Abbreviated ids keep the type tag of the id and at least this many
+# characters after it.
+_MIN_ID_PREFIX_LENGTH = 4
+
+# The type tags of the ids of every kind of object that may be referred to
+# by an abbreviated id. Other kinds must be referred to by their full id.
+_ID_TAGS = {
+    "node": "n",
+    "secret store": "st",
+    "workspace": "t",
+}
+
+
+def _id_prefix_pattern(kind: str) -> re.Pattern[str] | None:
+    tag = _ID_TAGS.get(kind)
+    if tag is None:
+        return None
+    return re.compile(rf"^{re.escape(tag)}-[a-z0-9]{{{_MIN_ID_PREFIX_LENGTH},}}$")
+
+
+class Resolver(Generic[T]):
+    """Resolves the ids and names of a list of objects, e.g. nodes.
+
+    An identifier matches an object if it is its id or name. Ids may also
+    be abbreviated as long as the prefix is unique and keeps the type tag
+    of the kind and at least four more characters, e.g. `n-1a2b` for a
+    node. Names must match exactly, so that a typo can't select a different
+    object, but unknown names come with suggestions for similar ones."""
+
+    def __init__(
+        self,
+        kind: str,
+        objects: Iterable[T],
+        id_of: Callable[[T], str],
+        name_of: Callable[[T], str],
+    ) -> None:
+        self.kind = kind
+        self._id_prefix = _id_prefix_pattern(kind)
+        self.objects = list(objects)
+        self._by_id: dict[str, T] = {}
+        self._by_name: dict[str, list[T]] = {}
+        for obj in self.objects:
+            self._by_id[id_of(obj)] = obj
+            self._by_name.setdefault(name_of(obj), []).append(obj)
+        self._id_of = id_of
+        self._sorted_ids = sorted(self._by_id)
+        self._sorted_names = sorted(self._by_name)
+
+    @staticmethod
+    def _with_prefix(keys: list[str], prefix: str) -> list[str]:
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return keys[start:end]
+
+    def find(self, identifier: str) -> T | None:
+        """Return the object with the given id or name, if there is one"""
+        if identifier in self._by_id:
+            return self._by_id[identifier]
+        by_name = self._by_name.get(identifier, [])
+        if len(by_name) > 1:
+            matching_ids = [self._id_of(obj) for obj in by_name]
+            raise PlatformCliError(
+                f"ambiguous name {identifier} is shared by {self.kind}s {matching_ids}"
+            )
+        if by_name:
+            return by_name[0]
+        if self._id_prefix is None or not self._id_prefix.match(identifier):
+            return None
+        ids = self._with_prefix(self._sorted_ids, identifier)
+        if len(ids) > 1:
+            raise PlatformCliError(f"ambiguous {self.kind} id prefix {identifier}").add_hint(
+                f"matching ids: {', '.join(ids)}"
+            )
+        if ids:
+            return self._by_id[ids[0]]
+        return None
+
+    def suggestions(self, identifier: str) -> list[str]:
+        """Names that the user may have meant instead of `identifier`"""
+        names = self._with_prefix(self._sorted_names, identifier)[:_MAX_SUGGESTIONS]
+        for name in difflib.get_close_matches(identifier, self._sorted_names, _MAX_SUGGESTIONS):
+            if name not in names:
+                names.append(name)
+        return names[:_MAX_SUGGESTIONS]
+
+    def resolve(self, identifier: str) -> T:
+        """Return the object with the given id or name"""
+        obj = self.find(identifier)
+        if obj is not None:
+            return obj
+        error = PlatformCliError(f"unknown {self.kind} {identifier}")
+        suggestions = self.suggestions(identifier)
+        if suggestions:
+            error.add_hint(f"did you mean {' or '.join(repr(s) for s in suggestions)}?")
+        raise error
+
+
+def resolver(
+    kind: str,
+    key: Hashable,
+    fetch: Callable[[], Iterable[T]],
+    id_of: Callable[[T], str],
+    name_of: Callable[[T], str],
+) -> Resolver[T]:
+    """Return a resolver for the objects returned by `fetch`.
+
+    Within a command, the list is fetched and indexed only once for every
+    `key`, no matter how many identifiers are resolved. The resolver is
+    rebuilt after the command modified any data."""
+
+    def build() -> Resolver[T]:
+        return Resolver(kind, fetch(), id_of, name_of)
+
+    memo = current_memo()
+    if memo is None:
+        return build()
+    return memo.derived(("resolver", kind, key), build)
+
+
+def _is_node_id(identifier: str):
+    return bool(re.match(r"^n-[a-z0-9]{8}$", identifier))
+
+
+def get_node_list(client: AppClient, workspace_id: str) -> list:
+    resp = client.post(
+        "list-nodes",
+        json={
+            "tenant_id": workspace_id,
+        },
+    )
+    resp.raise_for_status()
+    return resp.json()["nodes"]
+
+
+def resolve_node_identifier(client: AppClient, workspace_id: str, identifier: str) -> str:
+    """Return the id of the node with the given id or name"""
+    # If we already have a node id, use that.
+    if _is_node_id(identifier):
+        return identifier
+
+    # Otherwise go through the list of nodes and look for a matching name.
+    nodes: Resolver[dict] = resolver(
+        "node",
+        workspace_id,
+        lambda: get_node_list(client, workspace_id),
+        id_of=lambda node: node["node_id"],
+        name_of=lambda node: node["name"],
+    )
+    return nodes.resolve(identifier)["node_id"]
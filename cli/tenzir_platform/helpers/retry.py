@@ -0,0 +1,155 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import random
+import ssl
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum
+
+import requests.exceptions
+from requests import Response
+from urllib3.exceptions import NewConnectionError
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.http2 import CONNECT_ERRORS
+
+
+class EndpointKind(Enum):
+    """The effect of a request on the platform, from weakest to strongest"""
+
+    # Only reads data, so it can be repeated, shared and cached.
+    READ_ONLY = "read-only"
+    # Repeating it has no additional side effects, e.g. because it only
+    # mints fresh credentials.
+    IDEMPOTENT = "idempotent"
+    MODIFYING = "modifying"
+
+
+# The platform API mostly uses POST for everything, so we can't rely on
+# the HTTP method to classify a request. Instead, we go by the name of the
+# endpoint: reads are called `get`, `get-*` or `list*`, everything else
+# modifies data unless it is listed here.
+_ENDPOINT_KINDS = {
+    "global-tenant-list": EndpointKind.READ_ONLY,
+    "authenticate": EndpointKind.IDEMPOTENT,
+    "switch-tenant": EndpointKind.IDEMPOTENT,
+}
+
+# Endpoints that forward the request to a node. The CLI can't know the
+# effect of the endpoints of a node, so they always count as modifying.
+_FORWARDING_ENDPOINTS = ("node-proxy/",)
+
+# Status codes which indicate that the server did not process the request,
+# so that it can be retried regardless of idempotency.
+_NOT_PROCESSED_STATUS_CODES = {429, 503}
+
+# Status codes that may be returned by a load balancer after the request
+# already reached the platform.
+_TRANSIENT_STATUS_CODES = {502, 504}
+
+
+def endpoint_kind(method: str, endpoint_suffix: str) -> EndpointKind:
+    """Classify a request by its effect on the platform"""
+    if endpoint_suffix.lstrip("/").startswith(_FORWARDING_ENDPOINTS):
+        return EndpointKind.MODIFYING
+    if method.upper() in ("GET", "HEAD", "OPTIONS"):
+        return EndpointKind.READ_ONLY
+    name = endpoint_suffix.strip("/").split("/")[-1]
+    if name in _ENDPOINT_KINDS:
+        return _ENDPOINT_KINDS[name]
+    if name == "get" or name.startswith(("get-", "list")):
+        return EndpointKind.READ_ONLY
+    return EndpointKind.MODIFYING
+
+
+def is_read_only(method: str, endpoint_suffix: str) -> bool:
+    """Whether the request only reads data from the platform"""
+    return endpoint_kind(method, endpoint_suffix) is EndpointKind.READ_ONLY
+
+
+def is_idempotent(method: str, endpoint_suffix: str) -> bool:
+    """Whether repeating the request has no additional side effects"""
+    return endpoint_kind(method, endpoint_suffix) is not EndpointKind.MODIFYING
+
+
+def _connection_not_established(e: requests.exceptions.RequestException) -> bool:
+    """Whether the request failed before anything was sent to the server"""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e.__cause__, CONNECT_ERRORS):
+        return True
+    return any(isinstance(getattr(arg, "reason", None), NewConnectionError) for arg in e.args)
+
+
+def certificate_rejected(e: BaseException) -> bool:
+    """Whether the certificate of the server failed verification, e.g.
+    because it doesn't match a pinned certificate, which no retry can fix"""
+    pending: list[BaseException] = [e]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, ssl.SSLCertVerificationError):
+            return True
+        # urllib3 and requests wrap the original error in various ways.
+        causes = (current.__cause__, current.__context__, getattr(current, "reason", None))
+        pending.extend(c for c in (*causes, *current.args) if isinstance(c, BaseException))
+    return False
+
+
+def _parse_retry_after(resp: Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Decides whether and when a failed request is repeated.
+
+    Delays grow exponentially with full jitter, a `Retry-After` header sent
+    by the server takes precedence, and no retry is scheduled that would
+    exceed the total time budget."""
+
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        self.max_retries = platform.retry_max_retries
+        self.backoff_base = platform.retry_backoff_base
+        self.backoff_max = platform.retry_backoff_max
+        self.max_elapsed = platform.retry_max_elapsed
+
+    def retryable_response(self, resp: Response, idempotent: bool) -> bool:
+        if resp.status_code in _NOT_PROCESSED_STATUS_CODES:
+            return True
+        return idempotent and resp.status_code in _TRANSIENT_STATUS_CODES
+
+    def retryable_exception(
+        self, e: requests.exceptions.RequestException, idempotent: bool
+    ) -> bool:
+        if not isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return False
+        if certificate_rejected(e):
+            return False
+        return idempotent or _connection_not_established(e)
+
+    def delay(self, retry: int, resp: Response | None) -> float:
+        """The time to wait before the `retry`-th retry (starting at 1)"""
+        if resp is not None:
+            hint = _parse_retry_after(resp)
+            if hint is not None:
+                return hint
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (retry - 1))
+        return random.uniform(0, ceiling)
+
+    def within_budget(self, start: float, delay: float) -> bool:
+        return time.monotonic() - start + delay <= self.max_elapsed
@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import sys
+import threading
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+
+from tenzir_platform.helpers.deadline import request_timeout
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.http2 import HTTP2_AVAILABLE, Http2Session
+from tenzir_platform.helpers.timings import TimingAdapter
+from tenzir_platform.helpers.tls import TlsAdapter, shared_ssl_context, tls_settings_key
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PreconnectingSession(requests.Session):
+    """A session that can open the connection to a host ahead of time.
+
+    Requests to a host wait until the connection that is being opened to
+    it is ready, so that they use it instead of opening another one."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        # The hosts that requests were sent to, and the connections that
+        # are being opened to them, by origin.
+        self._contacted: set[str] = set()
+        self._connecting: dict[str, threading.Event] = {}
+
+    def request(self, method: str | bytes, url: str | bytes, *args: Any, **kwargs: Any):
+        origin = _origin(url.decode() if isinstance(url, bytes) else url)
+        with self._lock:
+            self._contacted.add(origin)
+            connecting = self._connecting.get(origin)
+        if connecting is not None:
+            # Bounded by the timeouts of the request that opens the connection.
+            connecting.wait()
+        return super().request(method, url, *args, **kwargs)
+
+    def preconnect(self, url: str, timeout: tuple[float, float]) -> None:
+        """Open a pooled connection to the host of `url`, unless there
+        already is one"""
+        origin = _origin(url)
+        with self._lock:
+            if origin in self._contacted:
+                return
+            self._contacted.add(origin)
+            connecting = self._connecting[origin] = threading.Event()
+        try:
+            # There's no public API for opening a connection without a
+            # request, so send one that is cheap for both sides. The status
+            # doesn't matter; reading the response returns the connection to
+            # the pool.
+            super().request("HEAD", url, timeout=timeout, allow_redirects=False)
+        finally:
+            with self._lock:
+                del self._connecting[origin]
+            connecting.set()
+
+
+Session = PreconnectingSession | Http2Session
+
+# Sessions are shared by every client in the process that uses the same
+# pool configuration, so that connections opened by one request (e.g. a
+# name lookup) are still warm for the next one (e.g. the actual delete).
+_sessions: dict[tuple, Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _session_key(platform: PlatformEnvironment) -> tuple:
+    return (
+        platform.pool_connections,
+        platform.pool_maxsize,
+        platform.pool_block,
+        platform.keep_alive,
+        platform.http2,
+        platform.timings,
+        tls_settings_key(platform),
+    )
+
+
+def _create_session(platform: PlatformEnvironment) -> Session:
+    if platform.http2:
+        if HTTP2_AVAILABLE:
+            return Http2Session(platform)
+        print(
+            "warning: HTTP/2 support requires the 'http2' extra "
+            "(pip install 'tenzir-platform[http2]'), falling back to HTTP/1.1",
+            file=sys.stderr,
+        )
+    session = PreconnectingSession()
+    adapter_class = TimingAdapter if platform.timings else TlsAdapter
+    adapter = adapter_class(
+        ssl_context=shared_ssl_context(platform),
+        pool_connections=platform.pool_connections,
+        pool_maxsize=platform.pool_maxsize,
+        pool_block=platform.pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not platform.keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def shared_session(platform: PlatformEnvironment) -> Session:
+    """Return the process-wide HTTP session for the given configuration"""
+    key = _session_key(platform)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _create_session(platform)
+            _sessions[key] = session
+        return session
+
+
+def close_sessions() -> None:
+    """Close all pooled connections"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def preconnect(platform: PlatformEnvironment, url: str) -> None:
+    """Open a pooled connection to the host of `url` ahead of time, if
+    enabled with the `preconnect` setting.
+
+    The connection setup (DNS, TCP and TLS handshakes) is usually the
+    slowest part of the first request, and doesn't depend on anything
+    else the command does before sending it. Opening it takes a `HEAD`
+    request to `url`."""
+    if not platform.preconnect:
+        return
+    session = shared_session(platform)
+    if not isinstance(session, PreconnectingSession) or not platform.keep_alive:
+        # httpx doesn't support opening connections in advance.
+        return
+    session.preconnect(url, request_timeout(platform.connect_timeout, platform.read_timeout))
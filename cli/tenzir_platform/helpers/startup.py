@@ -0,0 +1,41 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import contextlib
+import contextvars
+import threading
+from collections.abc import Callable
+
+from tenzir_platform.helpers import oidc
+from tenzir_platform.helpers.cache import load_current_workspace
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.session import preconnect
+
+
+def _quietly(task: Callable[[], object]) -> None:
+    # Failures are reported by the command itself when it repeats the work.
+    with contextlib.suppress(Exception):
+        task()
+
+
+def warm_up(platform: PlatformEnvironment, oidc_login: bool = False, workspace: bool = False):
+    """Start the independent parts of a command's startup in the background.
+
+    Opens the connection to the platform if `preconnect` is set and, if
+    requested, fetches the identity provider configuration and signing
+    keys and reads the selected workspace. The command then runs as usual and finds the results in the
+    process-wide caches, or waits for the fetches that are still running,
+    so the startup takes about as long as the slowest of these steps
+    instead of their sum."""
+    # Background threads must not print, as their output can't be
+    # attributed to the command, e.g. in a `batch`.
+    quiet = platform.model_copy(update={"verbose": False})
+    tasks: list[Callable[[], object]] = [lambda: preconnect(quiet, quiet.api_endpoint)]
+    if oidc_login:
+        tasks.append(lambda: oidc.prefetch(quiet))
+    if workspace:
+        tasks.append(lambda: load_current_workspace(quiet))
+    for task in tasks:
+        # Copy the context, so the background work respects the deadline.
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(_quietly, task), daemon=True).start()
@@ -0,0 +1,44 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import io
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TextIO
+
+
+class ThreadLocalStream(io.TextIOBase):
+    """Redirects writes into a stream owned by the current thread, if any.
+
+    `contextlib.redirect_stdout()` replaces `sys.stdout` for all threads,
+    which doesn't work when several commands run concurrently."""
+
+    def __init__(self, fallback: TextIO) -> None:
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def _target(self) -> TextIO | io.TextIOBase:
+        return getattr(self._local, "target", None) or self._fallback
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    @contextmanager
+    def redirect(self, target: TextIO | io.TextIOBase) -> Iterator[TextIO | io.TextIOBase]:
+        """Redirect the writes of the current thread to `target`"""
+        self._local.target = target
+        try:
+            yield target
+        finally:
+            self._local.target = None
+
+    @contextmanager
+    def capture(self) -> Iterator[io.StringIO]:
+        """Collect the writes of the current thread in a buffer"""
+        with self.redirect(io.StringIO()) as buffer:
+            assert isinstance(buffer, io.StringIO)
+            yield buffer
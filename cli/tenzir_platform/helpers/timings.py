@@ -0,0 +1,235 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import socket
+import sys
+import threading
+import weakref
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+from tenzir_platform.helpers.tls import TlsAdapter
+
+
+class RequestTiming(BaseModel):
+    """Timing breakdown of a single HTTP request.
+
+    All durations are in seconds and measure consecutive phases, so they add
+    up to `total`. `ttfb` is the time between sending the request and
+    receiving the first byte of the response, i.e., the time spent by the
+    server. Connection setup phases are `None` if an existing connection
+    was reused, or if they can't be measured, see `TimingAdapter`."""
+
+    method: str
+    url: str
+    status_code: int | None = None
+    error: str | None = None
+    http_version: str | None = None
+    reused_connection: bool = True
+    dns: float | None = None
+    connect: float | None = None
+    tls: float | None = None
+    ttfb: float | None = None
+    transfer: float | None = None
+    total: float | None = None
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+# The lists that record the requests of the current command, and of the
+# commands that run it, e.g. a `batch`. Context variables are inherited
+# by the threads started via `asyncio.to_thread()`, so the concurrent
+# requests of a command are recorded as well.
+_scopes: ContextVar[tuple[list[RequestTiming], ...]] = ContextVar("timings", default=())
+_scopes_lock = threading.Lock()
+
+
+@contextmanager
+def record_requests() -> Iterator[list[RequestTiming]]:
+    """Record the timings of all requests made within the block"""
+    records: list[RequestTiming] = []
+    token = _scopes.set((*_scopes.get(), records))
+    try:
+        yield records
+    finally:
+        _scopes.reset(token)
+
+
+def begin_request(method: str, url: str) -> RequestTiming:
+    record = RequestTiming(method=method, url=url)
+    with _scopes_lock:
+        for records in _scopes.get():
+            records.append(record)
+    return record
+
+
+class TimingAdapter(TlsAdapter):
+    """An `HTTPAdapter` that records a `RequestTiming` for every request.
+
+    urllib3 has no public hooks into the connection setup, so this only
+    tells whether a new connection was opened. Its setup time is part of
+    `ttfb`; the separate `dns`, `connect` and `tls` phases are only
+    available with HTTP/2, see `Http2TraceRecorder`."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # The sockets that previous requests were sent over.
+        self._sockets: weakref.WeakSet[socket.socket] = weakref.WeakSet()
+        self._sockets_lock = threading.Lock()
+
+    def _is_new_connection(self, resp: Any) -> bool:
+        sock = getattr(getattr(resp.raw, "connection", None), "sock", None)
+        if sock is None:
+            return False
+        with self._sockets_lock:
+            if sock in self._sockets:
+                return False
+            self._sockets.add(sock)
+            return True
+
+    def send(self, request, stream=False, **kwargs):  # type: ignore[no-untyped-def]
+        record = begin_request(request.method or "", request.url or "")
+        body = request.body
+        record.bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+        start = perf_counter()
+        try:
+            # The adapter returns as soon as the response headers arrived,
+            # the body is only read afterwards.
+            resp = super().send(request, stream=stream, **kwargs)
+            headers_received = perf_counter()
+            record.ttfb = headers_received - start
+            record.reused_connection = not self._is_new_connection(resp)
+            record.status_code = resp.status_code
+            raw_version = getattr(resp.raw, "version", None)
+            if raw_version:
+                record.http_version = f"HTTP/{raw_version / 10:.1f}"
+            if not stream:
+                resp.content  # noqa: B018
+                record.transfer = perf_counter() - headers_received
+                record.bytes_received = resp.raw.tell()
+            return resp
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            record.total = perf_counter() - start
+
+
+class Http2TraceRecorder:
+    """Fills a `RequestTiming` from the trace events emitted by httpx"""
+
+    def __init__(self, method: str, url: str) -> None:
+        self.record = begin_request(method, url)
+        self.start = perf_counter()
+        self._started: dict[str, float] = {}
+
+    def __call__(self, event_name: str, info: dict) -> None:
+        now = perf_counter()
+        phase, _, state = event_name.rpartition(".")
+        if state == "started":
+            self._started[phase] = now
+            return
+        if state != "complete" or phase not in self._started:
+            return
+        duration = now - self._started[phase]
+        if phase == "connection.connect_tcp":
+            # httpx resolves the host name as part of connecting.
+            self.record.reused_connection = False
+            self.record.connect = duration
+        elif phase == "connection.start_tls":
+            self.record.tls = duration
+        elif phase.endswith("receive_response_headers"):
+            send_started = self._started.get(
+                phase.replace("receive_response_headers", "send_request_headers"),
+                self._started[phase],
+            )
+            self.record.ttfb = now - send_started
+            self._started["transfer"] = now
+
+    def finish(self, resp: Any, error: Exception | None = None) -> None:
+        now = perf_counter()
+        self.record.total = now - self.start
+        if "transfer" in self._started:
+            self.record.transfer = now - self._started["transfer"]
+        if error is not None:
+            self.record.error = type(error).__name__
+            return
+        self.record.status_code = resp.status_code
+        self.record.http_version = resp.http_version
+        self.record.bytes_received = resp.num_bytes_downloaded
+        self.record.bytes_sent = len(resp.request.content)
+
+
+def _ms(value: float | None) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_summary(records: list[RequestTiming], as_json: bool = False) -> None:
+    """Print the timings of the given requests to stderr"""
+    if as_json:
+        print(json.dumps([record.model_dump() for record in records]), file=sys.stderr)
+        return
+    if not records:
+        print("no requests were made", file=sys.stderr)
+        return
+    columns = [
+        "method",
+        "host",
+        "path",
+        "status",
+        "dns",
+        "connect",
+        "tls",
+        "ttfb",
+        "transfer",
+        "total",
+        "sent",
+        "received",
+    ]
+    rows = []
+    for record in records:
+        url = urlsplit(record.url)
+        rows.append(
+            [
+                record.method,
+                url.netloc,
+                url.path,
+                str(record.status_code) if record.status_code is not None else record.error or "-",
+                _ms(record.dns),
+                _ms(record.connect),
+                _ms(record.tls),
+                _ms(record.ttfb),
+                _ms(record.transfer),
+                _ms(record.total),
+                str(record.bytes_sent),
+                str(record.bytes_received),
+            ]
+        )
+    rows.append(
+        [
+            "total",
+            "",
+            f"{len(records)} requests",
+            "",
+            _ms(sum(r.dns or 0 for r in records)),
+            _ms(sum(r.connect or 0 for r in records)),
+            _ms(sum(r.tls or 0 for r in records)),
+            _ms(sum(r.ttfb or 0 for r in records)),
+            _ms(sum(r.transfer or 0 for r in records)),
+            _ms(sum(r.total or 0 for r in records)),
+            str(sum(r.bytes_sent for r in records)),
+            str(sum(r.bytes_received for r in records)),
+        ]
+    )
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("durations in ms, sizes in bytes", file=sys.stderr)
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths, strict=True)), file=sys.stderr)
+    for row in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(row, widths, strict=True)), file=sys.stderr)
@@ -0,0 +1,224 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import hashlib
+import os
+import socket
+import ssl
+import threading
+import time
+import weakref
+from typing import Any
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from urllib3.util.ssl_ import create_urllib3_context
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+
+def _normalize_fingerprint(fingerprint: str) -> str:
+    return fingerprint.replace(":", "").strip().lower()
+
+
+class PlatformSSLContext(ssl.SSLContext):
+    """An `SSLContext` that resumes TLS sessions and checks pinned certificates.
+
+    Python only resumes a TLS session if it is explicitly passed to
+    `wrap_socket()`, which neither urllib3 nor httpx do. This context
+    remembers the latest session for every server and offers it for the
+    next connection, so that only the first connection to a server in the
+    process does a full handshake.
+
+    Use `_create_ssl_context()` to create it with the same protocol
+    settings as the context that urllib3 would create."""
+
+    pinned_hosts: set[str]
+    pinned_fingerprints: set[str]
+
+    def configure(self, pinned_hosts: set[str], pinned_fingerprints: set[str]) -> None:
+        self.pinned_hosts = pinned_hosts
+        self.pinned_fingerprints = pinned_fingerprints
+        self._sessions: dict[str, ssl.SSLSession] = {}
+        # TLS 1.3 session tickets arrive after the handshake, so sessions
+        # are read from the latest socket when it's needed or closed.
+        self._sockets: dict[str, weakref.ref[ssl.SSLSocket]] = {}
+        self._sessions_lock = threading.Lock()
+
+    def save_session(self, sock: ssl.SSLSocket) -> None:
+        try:
+            server = f"{sock.server_hostname}:{_peer_port(sock)}"
+            session = sock.session
+        except (OSError, ValueError):
+            return
+        if session is not None:
+            with self._sessions_lock:
+                self._sessions[server] = session
+
+    def _session_for(self, server: str) -> ssl.SSLSession | None:
+        ref = self._sockets.get(server)
+        sock = ref() if ref is not None else None
+        if sock is not None:
+            self.save_session(sock)
+        with self._sessions_lock:
+            session = self._sessions.get(server)
+            if session is not None and session.time + session.timeout <= time.time():
+                del self._sessions[server]
+                return None
+            return session
+
+    def wrap_socket(  # type: ignore[override]
+        self,
+        sock: socket.socket,
+        server_side: bool = False,
+        do_handshake_on_connect: bool = True,
+        suppress_ragged_eofs: bool = True,
+        server_hostname: str | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLSocket:
+        server = f"{server_hostname}:{_peer_port(sock)}"
+        if session is None:
+            session = self._session_for(server)
+        ssock = super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
+        if server_hostname in self.pinned_hosts and self.pinned_fingerprints:
+            self._check_pin(ssock, server_hostname)
+        self._sockets[server] = weakref.ref(ssock)
+        return ssock
+
+    def _check_pin(self, ssock: ssl.SSLSocket, server_hostname: str | None) -> None:
+        certificate = ssock.getpeercert(binary_form=True)
+        fingerprint = hashlib.sha256(certificate or b"").hexdigest()
+        if fingerprint not in self.pinned_fingerprints:
+            ssock.close()
+            raise ssl.SSLCertVerificationError(
+                f"certificate of {server_hostname} with SHA-256 fingerprint "
+                f"{fingerprint} doesn't match any pinned certificate"
+            )
+
+
+def _peer_port(sock: socket.socket) -> int | None:
+    try:
+        return sock.getpeername()[1]
+    except (OSError, IndexError):
+        return None
+
+
+# The settings of an `SSLContext` that `create_urllib3_context()` sets.
+_URLLIB3_CONTEXT_SETTINGS = (
+    "minimum_version",
+    "maximum_version",
+    "options",
+    "verify_flags",
+    "post_handshake_auth",
+    "verify_mode",
+    "check_hostname",
+    "hostname_checks_common_name",
+    "keylog_filename",
+)
+
+
+def _create_ssl_context(platform: PlatformEnvironment) -> PlatformSSLContext:
+    # urllib3 can't create a context of a subclass, so its settings are
+    # copied over. The order matters, as `check_hostname` requires
+    # `verify_mode` to be set first.
+    defaults = create_urllib3_context()
+    context = PlatformSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    for setting in _URLLIB3_CONTEXT_SETTINGS:
+        if getattr(defaults, setting, None) is not None:
+            setattr(context, setting, getattr(defaults, setting))
+    try:
+        # A custom CA bundle is trusted in addition to the default one, so
+        # that the identity provider can still use a public certificate.
+        context.load_verify_locations(cafile=DEFAULT_CA_BUNDLE_PATH)
+        if platform.ca_bundle is not None:
+            if os.path.isdir(platform.ca_bundle):
+                context.load_verify_locations(capath=platform.ca_bundle)
+            else:
+                context.load_verify_locations(cafile=platform.ca_bundle)
+        if platform.client_certificate is not None:
+            context.load_cert_chain(platform.client_certificate, platform.client_key)
+    except (OSError, ssl.SSLError) as e:
+        raise PlatformCliError("failed to load the TLS configuration").add_hint(f"reason: {e}")
+    pinned_host = urlsplit(platform.api_endpoint).hostname
+    context.configure(
+        pinned_hosts={pinned_host} if pinned_host else set(),
+        pinned_fingerprints={_normalize_fingerprint(f) for f in platform.pinned_certificates},
+    )
+    return context
+
+
+def tls_settings_key(platform: PlatformEnvironment) -> tuple:
+    return (
+        platform.api_endpoint,
+        platform.ca_bundle,
+        platform.client_certificate,
+        platform.client_key,
+        tuple(platform.pinned_certificates),
+    )
+
+
+# Like the HTTP sessions, the context is shared by all connections in the
+# process, which is what makes session resumption across connections work.
+_ssl_contexts: dict[tuple, PlatformSSLContext] = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def shared_ssl_context(platform: PlatformEnvironment) -> PlatformSSLContext:
+    """Return the process-wide TLS context for the given configuration"""
+    key = tls_settings_key(platform)
+    with _ssl_contexts_lock:
+        context = _ssl_contexts.get(key)
+        if context is None:
+            context = _create_ssl_context(platform)
+            _ssl_contexts[key] = context
+        return context
+
+
+class TlsAdapter(HTTPAdapter):
+    """An `HTTPAdapter` that uses a shared `SSLContext` for all connections"""
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs: Any) -> None:
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        kwargs["ssl_context"] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):  # type: ignore[no-untyped-def]
+        resp = super().send(request, *args, **kwargs)
+        # TLS 1.3 sends the session after the handshake, so it's only
+        # available once the response arrived. Save it now, as the
+        # connection may be closed before the next one is opened.
+        connection = getattr(resp.raw, "connection", None)
+        sock = getattr(connection, "sock", None)
+        if isinstance(sock, ssl.SSLSocket) and isinstance(self.ssl_context, PlatformSSLContext):
+            self.ssl_context.save_session(sock)
+        return resp
+
+    def build_connection_pool_key_attributes(  # type: ignore[no-untyped-def]
+        self, request, verify, cert=None
+    ):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert
+        )
+        if verify is not False:
+            pool_kwargs["ssl_context"] = self.ssl_context
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):  # type: ignore[no-untyped-def]
+        super().cert_verify(conn, url, verify, cert)
+        # The trust store is already part of the context, so don't let
+        # urllib3 load the default bundle into it for every connection.
+        if verify is True:
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import time
+from typing import Any
+
+from tenzir_platform.helpers.cache import (
+    load_vault_entry,
+    load_workspace_entry,
+    store_workspace,
+    workspace_lock,
+)
+from tenzir_platform.helpers.client import AppClient, TargetApi
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.resolver import Resolver
+from tenzir_platform.helpers.workspaces import find_workspace, is_workspace_id, resolve_workspace
+
+# User keys that expire within this many seconds are renewed before use.
+_RENEWAL_MARGIN = 60
+
+
+def _expiry(body: dict[str, Any]) -> float | None:
+    """The expiry time of a user key as UNIX timestamp, if the platform
+    sent one"""
+    expires_at = body.get("expires_at")
+    if isinstance(expires_at, int | float):
+        return float(expires_at)
+    expires_in = body.get("expires_in")
+    if isinstance(expires_in, int | float):
+        return time.time() + expires_in
+    return None
+
+
+def mint_user_key(client: AppClient, workspace_id: str, id_token: str) -> tuple[str, float | None]:
+    """Create a new user key for a workspace and return it together with
+    its expiry time"""
+    resp = client.post(
+        "switch-tenant",
+        json={
+            "id_token": id_token,
+            "tenant_id": workspace_id,
+        },
+        target_api=TargetApi.USER_PUBLIC,
+    )
+    resp.raise_for_status()
+    body = resp.json()
+    return body["user_key"], _expiry(body)
+
+
+def _stored_entry(platform: PlatformEnvironment, workspace_id: str) -> dict[str, Any] | None:
+    entry = load_vault_entry(platform, workspace_id)
+    if entry is None:
+        try:
+            selected = load_workspace_entry(platform)
+        except (OSError, ValueError, KeyError):
+            return None
+        if selected["workspace_id"] == workspace_id:
+            entry = selected
+    return entry
+
+
+def renew_user_key(
+    platform: PlatformEnvironment, client: AppClient, workspace_id: str, outdated_key: str
+) -> str | None:
+    """Replace the outdated user key of a workspace.
+
+    Returns `None` if that isn't possible without user interaction."""
+    with workspace_lock(platform, workspace_id):
+        # Another process may have renewed the key while we waited.
+        entry = _stored_entry(platform, workspace_id)
+        if entry is not None and entry["user_key"] != outdated_key and not is_expiring(entry):
+            return entry["user_key"]
+        id_token = IdTokenClient(platform).load_id_token_silently()
+        if id_token is None:
+            return None
+        user_key, expires_at = mint_user_key(client, workspace_id, id_token)
+        store_workspace(platform, workspace_id, user_key, expires_at, select=False)
+    return user_key
+
+
+def is_expiring(entry: dict[str, Any]) -> bool:
+    """Whether the user key of a cache entry should be renewed"""
+    expires_at = entry.get("expires_at")
+    return expires_at is not None and expires_at - time.time() < _RENEWAL_MARGIN
+
+
+def _resolve_workspace(
+    platform: PlatformEnvironment, client: AppClient
+) -> tuple[str, dict[str, Any] | None, str | None]:
+    """Return the id of the workspace to use for the command, its cached
+    user key, if there is one, and its name, if the platform just sent it"""
+    if platform.workspace is None:
+        selected = load_workspace_entry(platform)
+        return selected["workspace_id"], selected, None
+    entry = load_vault_entry(platform, platform.workspace)
+    if entry is not None:
+        return entry["workspace_id"], entry, None
+    id_token = IdTokenClient(platform).load_id_token()
+    workspace_id, name = resolve_workspace(client, id_token, platform.workspace)
+    entry = _stored_entry(platform, workspace_id)
+    if entry is not None and name is not None:
+        # Remember the name, so the key can be found by name next time.
+        entry = store_workspace(
+            platform, workspace_id, entry["user_key"], entry.get("expires_at"), name, select=False
+        )
+    return workspace_id, entry, name
+
+
+def current_workspace_id(platform: PlatformEnvironment, client: AppClient) -> str:
+    """The id of the workspace to use for the command, i.e. the one given
+    with `--workspace` or else the selected one"""
+    workspace_id, _, _ = _resolve_workspace(platform, client)
+    return workspace_id
+
+
+def offline_workspace_id(platform: PlatformEnvironment) -> str:
+    """Like `current_workspace_id()`, but without contacting the platform.
+
+    Workspace names that are not in the vault are resolved against the
+    workspaces in the local inventory."""
+    if platform.workspace is None:
+        return load_workspace_entry(platform)["workspace_id"]
+    entry = load_vault_entry(platform, platform.workspace)
+    if entry is not None:
+        return entry["workspace_id"]
+    if is_workspace_id(platform.workspace):
+        return platform.workspace
+    # Imported here because only offline commands need SQLite.
+    from tenzir_platform.helpers.inventory import GLOBAL, Inventory
+
+    workspaces = Resolver(
+        "workspace",
+        Inventory(platform).load(GLOBAL, "workspaces").objects,
+        id_of=lambda workspace: workspace["tenant_id"],
+        name_of=lambda workspace: workspace["name"],
+    )
+    return find_workspace(workspaces, platform.workspace)["tenant_id"]
+
+
+def workspace_login(platform: PlatformEnvironment, client: AppClient) -> str:
+    """Log the client in to the workspace to use for the command and
+    return its id.
+
+    A workspace given with `--workspace` uses its cached user key, or gets
+    a new one, without changing the selected workspace. The user key is
+    renewed if it is about to expire, and once more if the platform
+    rejects it anyway."""
+    workspace_id, entry, name = _resolve_workspace(platform, client)
+    if entry is None:
+        entry = _create_user_key(platform, client, workspace_id, name)
+    user_key = entry["user_key"]
+    if is_expiring(entry):
+        if platform.verbose:
+            print(f"renewing the user key for workspace {workspace_id}")
+        user_key = renew_user_key(platform, client, workspace_id, user_key) or user_key
+    client.workspace_login(
+        user_key,
+        # The client only renews the key that it is currently using.
+        renew=lambda: renew_user_key(platform, client, workspace_id, client.user_key),
+    )
+    return workspace_id
+
+
+def _create_user_key(
+    platform: PlatformEnvironment, client: AppClient, workspace_id: str, name: str | None
+) -> dict[str, Any]:
+    with workspace_lock(platform, workspace_id):
+        entry = _stored_entry(platform, workspace_id)
+        if entry is not None:
+            return entry
+        if platform.verbose:
+            print(f"creating a user key for workspace {workspace_id}")
+        id_token = IdTokenClient(platform).load_id_token()
+        user_key, expires_at = mint_user_key(client, workspace_id, id_token)
+        return store_workspace(platform, workspace_id, user_key, expires_at, name, select=False)
@@ -0,0 +1,64 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import re
+
+from tenzir_platform.helpers.client import AppClient, TargetApi
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.resolver import Resolver, resolver
+
+
+def is_workspace_id(identifier: str) -> bool:
+    return bool(re.match(r"^t-[a-z0-9]{8}$", identifier))
+
+
+def get_workspace_list(client: AppClient, id_token: str) -> list[dict[str, str]]:
+    resp = client.post(
+        "get-login-info",
+        json={
+            "id_token": id_token,
+        },
+        target_api=TargetApi.USER_PUBLIC,
+    )
+    resp.raise_for_status()
+    return resp.json()["allowed_tenants"]
+
+
+def resolve_workspace_identifier(client: AppClient, id_token: str, identifier: str) -> str:
+    """Return the id of the workspace with the given id, name or index in
+    the list of workspaces"""
+    workspace_id, _ = resolve_workspace(client, id_token, identifier)
+    return workspace_id
+
+
+def resolve_workspace(client: AppClient, id_token: str, identifier: str) -> tuple[str, str | None]:
+    """Like `resolve_workspace_identifier()`, but also return the name of
+    the workspace if the list of workspaces was needed to resolve it"""
+    # If we already have a workspace id, use that.
+    if is_workspace_id(identifier):
+        return identifier, None
+
+    # Otherwise go through the list of workspaces
+    workspaces = resolver(
+        "workspace",
+        id_token,
+        lambda: get_workspace_list(client, id_token),
+        id_of=lambda workspace: workspace["tenant_id"],
+        name_of=lambda workspace: workspace["name"],
+    )
+
+    workspace = find_workspace(workspaces, identifier)
+    return workspace["tenant_id"], workspace["name"]
+
+
+def find_workspace(workspaces: Resolver[dict[str, str]], identifier: str) -> dict[str, str]:
+    """Return the workspace with the given name or index in the list of
+    workspaces"""
+    # If we're given a number, interpret it as a workspace index
+    try:
+        return workspaces.objects[int(identifier)]
+    except ValueError:
+        # Else, look for a matching workspace name
+        return workspaces.resolve(identifier)
+    except IndexError:
+        raise PlatformCliError(f"only have {len(workspaces.objects)} workspaces")
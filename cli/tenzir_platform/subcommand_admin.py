@@ -39,18 +39,11 @@ import json
 
 from docopt import docopt
 
-from tenzir_platform.helpers.auth_rule import (
-    AllowAllRule,
-    AuthRule,
-    EmailDomainRule,
-    OrganizationMembershipRule,
-    RoleAndOrganizationRule,
-    UserAuthRule,
-)
+from tenzir_platform.helpers.auth_rule import AuthRule, auth_rule_from_arguments
 from tenzir_platform.helpers.client import AppClient, TargetApi
 from tenzir_platform.helpers.environment import PlatformEnvironment
-from tenzir_platform.helpers.exceptions import PlatformCliError
 from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.startup import warm_up
 
 
 def _get_global_workspaces(client: AppClient):
@@ -191,44 +184,9 @@ def spawn_node(client: AppClient, workspace_id: str, image: str, lifetime: int):
     print(json.dumps(result, indent=4))
 
 
-def auth_rule_from_arguments(arguments) -> AuthRule:
-    connection = arguments["--connection"]
-    domain = arguments["<domain>"]
-    user_id = arguments["<user_id>"]
-    organization_claim = arguments["<organization_claim>"]
-    organization = arguments["<organization>"]
-    roles_claim = arguments["<roles_claim>"]
-    role = arguments["<role>"]
-    auth_rule: AuthRule
-    if arguments["email-domain"]:
-        auth_rule = EmailDomainRule(connection=connection, email_domain=domain)
-    elif arguments["organization-membership"]:
-        auth_rule = OrganizationMembershipRule(
-            connection=connection,
-            organization_claim=organization_claim,
-            organization=organization,
-        )
-    elif arguments["organization-role"]:
-        auth_rule = RoleAndOrganizationRule(
-            connection=connection,
-            roles_claim=roles_claim,
-            role=role,
-            organization_claim=organization_claim,
-            organization=organization,
-        )
-    elif arguments["user"]:
-        auth_rule = UserAuthRule(user_id=user_id)
-    elif arguments["allow-all"]:
-        auth_rule = AllowAllRule()
-    else:
-        raise PlatformCliError(
-            "couldn't determine auth rule from command-line arguments"
-        )
-    return auth_rule
-
-
 def admin_subcommand(platform: PlatformEnvironment, argv):
     arguments = docopt(__doc__, argv=argv)
+    warm_up(platform, oidc_login=True)
 
     def connect_and_login() -> AppClient:
         token_client = IdTokenClient(platform)
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Usage:
+  tenzir-platform agent run
+  tenzir-platform agent start
+  tenzir-platform agent stop
+  tenzir-platform agent status
+
+Description:
+  tenzir-platform agent run
+    Run the agent in the foreground.
+
+  tenzir-platform agent start
+    Start the agent in the background.
+
+  tenzir-platform agent stop
+    Stop the running agent.
+
+  tenzir-platform agent status
+    Show whether the agent is running.
+
+  The agent is a background process that runs commands on behalf of
+  'tenzir-platform'. It keeps the authentication state and the connections
+  to the platform between commands, which makes many short invocations much
+  faster. Set TENZIR_PLATFORM_CLI_AGENT=true to forward commands to the
+  agent; it is started automatically on first use and exits after being
+  idle for TENZIR_PLATFORM_CLI_AGENT_IDLE_TIMEOUT seconds. Commands that
+  need the local terminal or filesystem always run in-process.
+"""
+
+from docopt import docopt  # type: ignore[import-untyped]
+
+from tenzir_platform.helpers import agent
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+
+def run(platform: PlatformEnvironment):
+    # Imported here, because the entry point itself depends on this module.
+    from tenzir_platform.tenzir_platform import run_cli
+
+    runner = agent.Agent(
+        lambda argv: run_cli(argv, platform),
+        idle_timeout=platform.agent_idle_timeout,
+        verbose=platform.verbose,
+    )
+    if not runner.serve():
+        raise PlatformCliError("the agent is already running").add_hint(
+            f"the agent listens on {agent.socket_path()}"
+        )
+
+
+def start():
+    if agent.control("status") is not None:
+        print("the agent is already running")
+        return
+    agent.start()
+    print("started the agent")
+
+
+def stop():
+    status = agent.control("stop")
+    if status is None:
+        print("the agent is not running")
+        return
+    print(f"stopping the agent (pid {status['pid']})")
+
+
+def status():
+    status = agent.control("status")
+    if status is None:
+        print("the agent is not running")
+        return
+    print(f"the agent is running (pid {status['pid']})")
+    print(f"socket: {agent.socket_path()}")
+    print(f"uptime: {status['uptime']:.0f}s")
+    print(f"commands: {status['commands']}")
+
+
+def agent_subcommand(platform: PlatformEnvironment, argv):
+    args = docopt(__doc__, argv=argv)
+    if args["run"]:
+        run(platform)
+    elif args["start"]:
+        start()
+    elif args["stop"]:
+        stop()
+    elif args["status"]:
+        status()
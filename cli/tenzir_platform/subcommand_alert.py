@@ -4,13 +4,15 @@
 """Usage:
   tenzir-platform alert add <node> <duration> <webhook_url> [<webhook_body>]
   tenzir-platform alert delete <alert_id>
-  tenzir-platform alert list
+  tenzir-platform alert list [--offline]
 
 Options:
   <node>         The node to be monitored.
   <duration>     The amount of time to wait before triggering the alert.
   <webhook_url>  The URL to call when the alert triggers
   <webhook_body> The body to send along with the webhook. Must be valid JSON.
+  --offline      Answer from the local inventory instead of the platform,
+                 see 'tenzir-platform sync'.
 
 Description:
   tenzir-platform alert add <node> <duration> <webhook>
@@ -24,50 +26,16 @@ Description:
 """
 
 import json
-import re
 
 from docopt import docopt
 from pytimeparse2 import parse as parse_duration
 
-from tenzir_platform.helpers.cache import load_current_workspace
 from tenzir_platform.helpers.client import AppClient
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
-
-
-def _is_node_id(identifier: str):
-    return bool(re.match(r"^n-[a-z0-9]{8}$", identifier))
-
-
-def _get_node_list(client: AppClient, workspace_id: str) -> list:
-    resp = client.post(
-        "list-nodes",
-        json={
-            "tenant_id": workspace_id,
-        },
-    )
-    resp.raise_for_status()
-    return resp.json()["nodes"]
-
-
-def _resolve_node_identifier(
-    client: AppClient, workspace_id: str, identifier: str
-) -> str:
-    # If we already have a node id, use that.
-    if _is_node_id(identifier):
-        return identifier
-
-    # Otherwise go through the list of nodes and look for a matching name.
-    nodes = _get_node_list(client, workspace_id)
-    name_matched = [node for node in nodes if node["name"] == identifier]
-    if len(name_matched) == 0:
-        raise PlatformCliError(f"unknown node {identifier}")
-    if len(name_matched) > 1:
-        matching_ids = [node["node_id"] for node in name_matched]
-        raise PlatformCliError(
-            f"ambiguous name {identifier} is shared by nodes {matching_ids}"
-        )
-    return name_matched[0]["node_id"]
+from tenzir_platform.helpers.inventory import Inventory
+from tenzir_platform.helpers.resolver import resolve_node_identifier
+from tenzir_platform.helpers.user_keys import offline_workspace_id, workspace_login
 
 
 def add(
@@ -78,7 +46,7 @@ def add(
     webhook_url: str,
     webhook_body: str,
 ):
-    node_id = _resolve_node_identifier(client, workspace_id, node)
+    node_id = resolve_node_identifier(client, workspace_id, node)
     seconds = parse_duration(duration)
     if not seconds:
         print(f"invalid duration: {duration}")
@@ -117,15 +85,19 @@ def delete(client: AppClient, workspace_id: str, alert_id: str):
 def list(
     client: AppClient,
     workspace_id: str,
+    inventory: Inventory | None = None,
 ):
-    resp = client.post(
-        "alert/list",
-        json={
-            "tenant_id": workspace_id,
-        },
-    )
-    resp.raise_for_status()
-    alerts = resp.json()["alerts"]
+    if inventory is not None:
+        alerts = inventory.load(workspace_id, "alerts").objects
+    else:
+        resp = client.post(
+            "alert/list",
+            json={
+                "tenant_id": workspace_id,
+            },
+        )
+        resp.raise_for_status()
+        alerts = resp.json()["alerts"]
     if len(alerts) == 0:
         print("no alerts configured")
         return
@@ -141,9 +113,11 @@ def list(
 def alert_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(__doc__, argv=argv)
     try:
-        workspace_id, user_key = load_current_workspace(platform)
         client = AppClient(platform=platform)
-        client.workspace_login(user_key)
+        if args["--offline"]:
+            workspace_id = offline_workspace_id(platform)
+        else:
+            workspace_id = workspace_login(platform, client)
     except Exception as e:
         raise PlatformCliError(f"failed to load current workspace: {e}").add_context(
             "please run 'tenzir-platform workspace select' first"
@@ -164,4 +138,5 @@ def alert_subcommand(platform: PlatformEnvironment, argv):
         alert = args["<alert_id>"]
         delete(client, workspace_id, alert)
     elif args["list"]:
-        list(client, workspace_id)
+        inventory = Inventory(platform) if args["--offline"] else None
+        list(client, workspace_id, inventory)
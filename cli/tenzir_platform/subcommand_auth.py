@@ -34,10 +34,11 @@ import sys
 
 from docopt import docopt
 
-from tenzir_platform.helpers.cache import load_current_workspace
 from tenzir_platform.helpers.client import AppClient, TargetApi
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.startup import warm_up
+from tenzir_platform.helpers.user_keys import current_workspace_id
 
 
 _TOKEN_LIFETIME_SECONDS = 15 * 60
@@ -54,7 +55,7 @@ def print_token(platform: PlatformEnvironment):
     id_token = IdTokenClient(platform).load_id_token()
     app_cli = AppClient(platform)
     try:
-        workspace_id, _ = load_current_workspace(platform)
+        workspace_id = current_workspace_id(platform, app_cli)
     except FileNotFoundError:
         print(
             "Warning: no workspace selected; minting a workspace-less user key.",
@@ -81,6 +82,7 @@ def print_token(platform: PlatformEnvironment):
 
 def auth_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(__doc__, argv=argv)
+    warm_up(platform, oidc_login=True, workspace=args["token"])
     if args["login"]:
         explicit_interactive = args["--interactive"]
         explicit_noninteractive = args["--non-interactive"]
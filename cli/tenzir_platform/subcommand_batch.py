@@ -0,0 +1,147 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Usage:
+  tenzir-platform batch <file> [--parallel=<n>]
+
+Options:
+  <file>          A file containing one command per line. Use '-' to read
+                  the commands from stdin.
+  --parallel=<n>  The number of commands to run concurrently. [default: 1]
+
+Description:
+  tenzir-platform batch <file> [--parallel=<n>]
+    Run many commands in a single process. Compared to invoking
+    'tenzir-platform' once per command, this avoids repeating the startup,
+    the authentication and the connection setup for every command.
+
+    Every line contains the arguments of one command, as they would be
+    passed to 'tenzir-platform', for example 'node delete my-node' or
+    '--workspace=staging node list'. Global options on a line apply to
+    that command only, e.g. '--timings' only reports its requests.
+    Alternatively, a line can be a JSON array of arguments, so that the
+    input can be NDJSON. Empty lines and lines starting with '#' are
+    skipped.
+
+    For every command, a JSON object is written to stdout as soon as the
+    command finishes, containing the line number, the arguments, the exit
+    status and the captured stdout and stderr of the command. The batch
+    fails if at least one of the commands failed.
+"""
+
+import contextvars
+import json
+import shlex
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from docopt import docopt
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.streams import ThreadLocalStream
+
+
+def _parse_line(line: str) -> list[str] | None:
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("["):
+        args = json.loads(line)
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            raise PlatformCliError("expected a JSON array of strings")
+        return args
+    return shlex.split(line)
+
+
+def _exit_status(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    # docopt exits with the usage message on invalid arguments.
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def batch_subcommand(platform: PlatformEnvironment, argv):
+    # Imported here, because the entry point itself depends on this module.
+    from tenzir_platform.tenzir_platform import run_cli, subcommand_of
+
+    args = docopt(__doc__, argv=argv)
+    try:
+        parallel = int(args["--parallel"])
+    except ValueError:
+        raise PlatformCliError("--parallel must be a number")
+    if parallel < 1:
+        raise PlatformCliError("--parallel must be at least 1")
+
+    filename = args["<file>"]
+    try:
+        if filename == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(filename) as f:
+                lines = f.readlines()
+    except OSError as e:
+        raise PlatformCliError(f"failed to read commands from {filename}").add_hint(f"reason: {e}")
+
+    commands: list[tuple[int, list[str]]] = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            command = _parse_line(line)
+            if command is None:
+                continue
+            subcommand = subcommand_of(command) if command else None
+        except (ValueError, PlatformCliError) as e:
+            raise PlatformCliError(f"invalid command in line {number}").add_hint(f"reason: {e}")
+        if subcommand in ("batch", "shell"):
+            raise PlatformCliError(f"nested {subcommand} command in line {number}")
+        commands.append((number, command))
+
+    output, errors = sys.stdout, sys.stderr
+    output_lock = threading.Lock()
+    stdout = ThreadLocalStream(output)
+    stderr = ThreadLocalStream(errors)
+
+    def run(number: int, command: list[str]) -> int:
+        with stdout.capture() as captured_stdout, stderr.capture() as captured_stderr:
+            try:
+                if not command:
+                    print("empty command", file=sys.stderr)
+                    status = 1
+                else:
+                    status = run_cli(command, platform)
+            except SystemExit as e:
+                status = _exit_status(e)
+            except Exception as e:
+                print(f"unexpected error: {e!r}", file=sys.stderr)
+                status = 1
+        result = {
+            "line": number,
+            "args": command,
+            "exit_status": status,
+            "stdout": captured_stdout.getvalue(),
+            "stderr": captured_stderr.getvalue(),
+        }
+        with output_lock:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+        return status
+
+    sys.stdout, sys.stderr = stdout, stderr  # type: ignore[assignment]
+    try:
+        # Run every command in a copy of the current context, so that e.g.
+        # the timings of the batch include the requests of its commands.
+        contexts = [contextvars.copy_context() for _ in commands]
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            statuses = list(
+                executor.map(lambda context, item: context.run(run, *item), contexts, commands)
+            )
+    finally:
+        sys.stdout, sys.stderr = output, errors
+
+    failed = sum(1 for status in statuses if status != 0)
+    if failed:
+        raise PlatformCliError(f"{failed} of {len(statuses)} commands failed")
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 """Usage:
-  tenzir-platform node list [--json]
+  tenzir-platform node list [--json] [--offline]
   tenzir-platform node ping <node>
   tenzir-platform node create [--name=<node_name>]
   tenzir-platform node config <node> [-o filename] [--format=docker|tenzir|tenzir-node]
@@ -16,6 +16,8 @@ Options:
   --image=<container_image>  The docker image to use for the newly created node
   -o,--output=<filename>     Where to write the config file. Set to "-" to write to stdout.
   --format=<config_type>       The format of the downloaded config file. [default: docker]
+  --offline                  Answer from the local inventory instead of the
+                             platform, see 'tenzir-platform sync'.
 
 Description:
   tenzir-platform node list [--json]
@@ -55,49 +57,21 @@ import time
 from docopt import docopt
 from requests import HTTPError
 
-from tenzir_platform.helpers.cache import load_current_workspace
 from tenzir_platform.helpers.client import AppClient
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.inventory import Inventory
+from tenzir_platform.helpers.resolver import get_node_list, resolve_node_identifier
+from tenzir_platform.helpers.user_keys import offline_workspace_id, workspace_login
 
 
-def _is_node_id(identifier: str):
-    return bool(re.match(r"^n-[a-z0-9]{8}$", identifier))
-
-
-def _get_node_list(client: AppClient, workspace_id: str) -> list:
-    resp = client.post(
-        "list-nodes",
-        json={
-            "tenant_id": workspace_id,
-        },
-    )
-    resp.raise_for_status()
-    return resp.json()["nodes"]
-
-
-def _resolve_node_identifier(
-    client: AppClient, workspace_id: str, identifier: str
-) -> str:
-    # If we already have a node id, use that.
-    if _is_node_id(identifier):
-        return identifier
-
-    # Otherwise go through the list of nodes and look for a matching name.
-    nodes = _get_node_list(client, workspace_id)
-    name_matched = [node for node in nodes if node["name"] == identifier]
-    if len(name_matched) == 0:
-        raise PlatformCliError(f"unknown node {identifier}")
-    if len(name_matched) > 1:
-        matching_ids = [node["node_id"] for node in name_matched]
-        raise PlatformCliError(
-            f"ambiguous name {identifier} is shared by nodes {matching_ids}"
-        )
-    return name_matched[0]["node_id"]
-
-
-def list(client: AppClient, workspace_id: str, print_json: bool):
-    nodes = _get_node_list(client, workspace_id)
+def list(
+    client: AppClient, workspace_id: str, print_json: bool, inventory: Inventory | None = None
+):
+    if inventory is not None:
+        nodes = inventory.load(workspace_id, "nodes").objects
+    else:
+        nodes = get_node_list(client, workspace_id)
     if print_json:
         print(f"{json.dumps(nodes)}")
     else:
@@ -107,7 +81,7 @@ def list(client: AppClient, workspace_id: str, print_json: bool):
 
 
 def ping(client: AppClient, workspace_id: str, node: str):
-    node_id = _resolve_node_identifier(client, workspace_id, node)
+    node_id = resolve_node_identifier(client, workspace_id, node)
     start = time.time()
     resp = client.post(
         "proxy",
@@ -203,7 +177,7 @@ def config(
     config_format: str,
     output_file: str | None,
 ):
-    node_id = _resolve_node_identifier(client, workspace_id, node)
+    node_id = resolve_node_identifier(client, workspace_id, node)
     resp = client.post(
         "generate-client-config",
         json={
@@ -227,7 +201,7 @@ def config(
 
 
 def delete(client: AppClient, workspace_id: str, node: str):
-    node_id = _resolve_node_identifier(client, workspace_id, node)
+    node_id = resolve_node_identifier(client, workspace_id, node)
     resp = client.post(
         "delete-node",
         json={
@@ -242,7 +216,7 @@ def delete(client: AppClient, workspace_id: str, node: str):
 def proxy(
     client: AppClient, workspace_id: str, node: str, endpoint: str, body: str | None
 ):
-    node_id = _resolve_node_identifier(client, workspace_id, node)
+    node_id = resolve_node_identifier(client, workspace_id, node)
     endpoint = endpoint.lstrip("/")
     resp = client.post(
         f"node-proxy/{workspace_id}/{node_id}/{endpoint}",
@@ -260,9 +234,11 @@ def proxy(
 def node_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(__doc__, argv=argv)
     try:
-        workspace_id, user_key = load_current_workspace(platform)
         client = AppClient(platform=platform)
-        client.workspace_login(user_key)
+        if args["--offline"]:
+            workspace_id = offline_workspace_id(platform)
+        else:
+            workspace_id = workspace_login(platform, client)
     except PlatformCliError as e:
         raise e.add_context("while trying to load current workspace")
     except Exception as e:
@@ -274,7 +250,8 @@ def node_subcommand(platform: PlatformEnvironment, argv):
 
     if args["list"]:
         json = args["--json"]
-        list(client, workspace_id, json)
+        inventory = Inventory(platform) if args["--offline"] else None
+        list(client, workspace_id, json, inventory)
     elif args["ping"]:
         node = args["<node>"]
         ping(client, workspace_id, node)
@@ -296,5 +273,5 @@ def node_subcommand(platform: PlatformEnvironment, argv):
     elif args["proxy"]:
         node = args["<node>"]
         endpoint = args["<endpoint>"]
-        body_json = args.get("<body_json>", None)
+        body_json = args.get("<json_body>", None)
         proxy(client, workspace_id, node, endpoint, body_json)
@@ -19,10 +19,12 @@ from datetime import datetime, timezone
 from docopt import docopt  # type: ignore[import-untyped]
 from requests import HTTPError
 
+from tenzir_platform.helpers.async_client import run_concurrently
 from tenzir_platform.helpers.client import AppClient, TargetApi
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
 from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.startup import warm_up
 
 
 def _authenticate(platform: PlatformEnvironment) -> AppClient:
@@ -83,15 +85,20 @@ def create_workspace(platform: PlatformEnvironment, name: str | None):
 def info(platform: PlatformEnvironment):
     client = _authenticate(platform)
     org_id = _get_current_org_id(client)
-    org_resp = client.post("org/get", json={"organization_id": org_id})
+    org_resp, members_resp, invitations_resp = run_concurrently(
+        client,
+        [
+            ("org/get", {"organization_id": org_id}),
+            ("org/list-members", {"organization_id": org_id}),
+            ("org/list-invitations", {"organization_id": org_id}),
+        ],
+    )
     org_resp.raise_for_status()
-    members_resp = client.post("org/list-members", json={"organization_id": org_id})
     members_resp.raise_for_status()
     org = org_resp.json()
     members = members_resp.json().get("members", [])
     invitations = []
     try:
-        invitations_resp = client.post("org/list-invitations", json={"organization_id": org_id})
         invitations_resp.raise_for_status()
         invitations = invitations_resp.json().get("invitations", [])
     except HTTPError as e:
@@ -189,6 +196,7 @@ def leave(platform: PlatformEnvironment):
 
 def org_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(__doc__, argv=argv)
+    warm_up(platform, oidc_login=True)
     if args["info"]:
         info(platform=platform)
     elif args["create"]:
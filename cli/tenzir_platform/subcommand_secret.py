@@ -5,12 +5,12 @@
   tenzir-platform secret add <name> [--file=<file>] [--value=<value>] [--env]
   tenzir-platform secret update <secret> [--file=<file>] [--value=<value>] [--env]
   tenzir-platform secret delete <secret>
-  tenzir-platform secret list [--json] [--store=<store>]
+  tenzir-platform secret list [--json] [--store=<store>] [--offline]
   tenzir-platform secret store add aws --region=<region> --assumed-role-arn=<assumed_role_arn> [--name=<name>] [--access-key-id=<key_id>] [--secret-access-key=<key>]
   tenzir-platform secret store add vault --address=<address> --mount=<mount> (--token=<token> | --role-id=<role_id> --secret-id=<secret_id>) [--name=<name>] [--namespace=<namespace>]
   tenzir-platform secret store set-default <store>
   tenzir-platform secret store delete <store>
-  tenzir-platform secret store list [--json]
+  tenzir-platform secret store list [--json] [--offline]
 
 Options:
   <name>   The name of the secret.
@@ -18,6 +18,8 @@ Options:
   <store>  The name or store id of a secret store.
   <value>  The plain value of the secret.
   <file>   The path to a file containing the secret value.
+  --offline  Answer from the local inventory instead of the platform,
+             see 'tenzir-platform sync'.
 
 Description:
   tenzir-platform secret add <name> [--file <file>] [--value <value>] [--env]
@@ -52,14 +54,17 @@ Description:
 import json
 import os
 from datetime import datetime
+from typing import Any
 
 from docopt import docopt
 from pydantic import BaseModel
 
-from tenzir_platform.helpers.cache import load_current_workspace
 from tenzir_platform.helpers.client import AppClient
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.inventory import Inventory, secrets_kind
+from tenzir_platform.helpers.resolver import Resolver, resolver
+from tenzir_platform.helpers.user_keys import offline_workspace_id, workspace_login
 
 
 class Secret(BaseModel):
@@ -93,26 +98,17 @@ def _resolve_secret_name_or_id(
     name_or_id: str,
     store_id: str | None = None,
 ) -> Secret:
-    secrets = _list_secrets(client, workspace_id, store_id).secrets
-    matching_by_id = [secret for secret in secrets if secret.id == name_or_id]
-    if matching_by_id:
-        return matching_by_id[0]
-    matching_by_name = [secret for secret in secrets if secret.name == name_or_id]
-    if len(matching_by_name) > 1:
-        raise PlatformCliError(f"multiple secrets found with the name '{name_or_id}'")
-    if matching_by_name:
-        return matching_by_name[0]
-    raise PlatformCliError("secret not found").add_context(
-        f"while trying to resolve id or name '{name_or_id}'"
+    secrets = resolver(
+        "secret",
+        (workspace_id, store_id),
+        lambda: _list_secrets(client, workspace_id, store_id).secrets,
+        id_of=lambda secret: secret.id,
+        name_of=lambda secret: secret.name,
     )
+    return secrets.resolve(name_or_id)
 
 
-def _resolve_secret_store(client: AppClient, workspace_id: str, name_or_id: str) -> str:
-    """Resolve a store name or ID to a store ID."""
-    # If it looks like a store ID or is 'default', assume it's an ID
-    if name_or_id.startswith("st-") or name_or_id == "default":
-        return name_or_id
-
+def _list_stores(client: AppClient, workspace_id: str) -> dict[str, Any]:
     resp = client.post(
         "secrets/list-stores",
         json={
@@ -120,24 +116,23 @@ def _resolve_secret_store(client: AppClient, workspace_id: str, name_or_id: str)
         },
     )
     resp.raise_for_status()
-    stores = resp.json()["stores"]
+    return resp.json()
 
-    # Check for exact ID match (in case someone named their store something like "st-xyz")
-    matching_by_id = [store for store in stores if store["id"] == name_or_id]
-    if matching_by_id:
-        return matching_by_id[0]["id"]
 
-    # Check for name match
-    matching_by_name = [store for store in stores if store["name"] == name_or_id]
-    if len(matching_by_name) > 1:
-        matching_ids = [store["id"] for store in matching_by_name]
-        raise PlatformCliError(
-            f"ambiguous name '{name_or_id}' is shared by stores {matching_ids}"
-        )
-    if matching_by_name:
-        return matching_by_name[0]["id"]
+def _resolve_secret_store(client: AppClient, workspace_id: str, name_or_id: str) -> str:
+    """Resolve a store name or ID to a store ID."""
+    # If it looks like a store ID or is 'default', assume it's an ID
+    if name_or_id.startswith("st-") or name_or_id == "default":
+        return name_or_id
 
-    raise PlatformCliError(f"unknown secret store '{name_or_id}'")
+    stores = resolver(
+        "secret store",
+        workspace_id,
+        lambda: _list_stores(client, workspace_id)["stores"],
+        id_of=lambda store: store["id"],
+        name_of=lambda store: store["name"],
+    )
+    return stores.resolve(name_or_id)["id"]
 
 
 def add(
@@ -231,16 +226,38 @@ def delete(client: AppClient, workspace_id: str, name_or_id: str):
     print(f"deleted secret {name_or_id}")
 
 
+def _load_secrets(
+    inventory: Inventory, workspace_id: str, store: str | None
+) -> ListSecretsResponse:
+    store_id = None
+    if store is not None and store != "default":
+        stores = inventory.load(workspace_id, "stores")
+        store_id = Resolver(
+            "secret store",
+            stores.objects,
+            id_of=lambda store: store["id"],
+            name_of=lambda store: store["name"],
+        ).resolve(store)["id"]
+        if store_id == stores.metadata.get("default_store_id"):
+            store_id = None
+    secrets = inventory.load(workspace_id, secrets_kind(store_id)).objects
+    return ListSecretsResponse.model_validate({"secrets": secrets})
+
+
 def list(
     client: AppClient,
     workspace_id: str,
     json_format: bool,
     store: str | None = None,
+    inventory: Inventory | None = None,
 ):
-    store_id = None
-    if store is not None:
-        store_id = _resolve_secret_store(client, workspace_id, store)
-    secrets_list = _list_secrets(client, workspace_id, store_id)
+    if inventory is not None:
+        secrets_list = _load_secrets(inventory, workspace_id, store)
+    else:
+        store_id = None
+        if store is not None:
+            store_id = _resolve_secret_store(client, workspace_id, store)
+        secrets_list = _list_secrets(client, workspace_id, store_id)
     if json_format:
         print(secrets_list.model_dump_json(indent=4))
         return
@@ -254,15 +271,20 @@ def list(
         print(f"{name}")
 
 
-def list_stores(client: AppClient, workspace_id: str, json_format: bool):
-    resp = client.post(
-        "secrets/list-stores",
-        json={
-            "tenant_id": workspace_id,
-        },
-    )
-    resp.raise_for_status()
-    json_body = resp.json()
+def list_stores(
+    client: AppClient,
+    workspace_id: str,
+    json_format: bool,
+    inventory: Inventory | None = None,
+):
+    if inventory is not None:
+        stores = inventory.load(workspace_id, "stores")
+        json_body = {
+            "stores": stores.objects,
+            "default_store_id": stores.metadata["default_store_id"],
+        }
+    else:
+        json_body = _list_stores(client, workspace_id)
     if json_format:
         print(json_body)
         return
@@ -388,9 +410,11 @@ def add_store_vault(
 def secret_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(__doc__, argv=argv)
     try:
-        workspace_id, user_key = load_current_workspace(platform)
         client = AppClient(platform=platform)
-        client.workspace_login(user_key)
+        if args["--offline"]:
+            workspace_id = offline_workspace_id(platform)
+        else:
+            workspace_id = workspace_login(platform, client)
     except Exception as e:
         raise PlatformCliError(
             "failed to load current workspace, please run 'tenzir-platform workspace select' first"
@@ -433,7 +457,8 @@ def secret_subcommand(platform: PlatformEnvironment, argv):
             set_default_store(client, workspace_id, store)
         elif args["list"]:
             json_format = args["--json"]
-            list_stores(client, workspace_id, json_format)
+            inventory = Inventory(platform) if args["--offline"] else None
+            list_stores(client, workspace_id, json_format, inventory)
     elif args["add"]:
         name = args["<name>"]
         file = args["--file"]
@@ -452,4 +477,5 @@ def secret_subcommand(platform: PlatformEnvironment, argv):
     elif args["list"]:
         json_format = args["--json"]
         store = args["--store"]
-        list(client, workspace_id, json_format, store)
+        inventory = Inventory(platform) if args["--offline"] else None
+        list(client, workspace_id, json_format, store, inventory)
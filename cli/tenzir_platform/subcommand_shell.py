@@ -0,0 +1,271 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Usage:
+  tenzir-platform shell
+
+Description:
+  tenzir-platform shell
+    Start an interactive shell that runs 'tenzir-platform' commands, for
+    example 'node list' or 'workspace select my-workspace'. Global options
+    on a line apply to that command only, e.g. '--workspace=staging node
+    list'.
+
+    The shell keeps the validated id token, the workspace user key, the
+    identity provider configuration and the connections to the platform
+    between commands, so that only the first command pays for the startup.
+
+    Press <Tab> to complete commands, as well as the names of nodes,
+    workspaces, secrets and secret stores. Type 'help' to show the list of
+    commands, and 'exit' or press <Ctrl-D> to leave the shell.
+"""
+
+import cmd
+import re
+import shlex
+import sys
+from collections.abc import Callable
+
+from docopt import docopt  # type: ignore[import-untyped]
+
+from tenzir_platform import (
+    subcommand_admin,
+    subcommand_alert,
+    subcommand_auth,
+    subcommand_node,
+    subcommand_org,
+    subcommand_secret,
+    subcommand_sync,
+    subcommand_tools,
+    subcommand_workspace,
+)
+from tenzir_platform.helpers.client import AppClient, TargetApi
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.resolver import get_node_list
+from tenzir_platform.helpers.user_keys import workspace_login
+from tenzir_platform.helpers.workspaces import get_workspace_list
+
+# The usage strings of the subcommands, used to complete their verbs.
+_SUBCOMMAND_USAGES = {
+    "auth": subcommand_auth.__doc__,
+    "workspace": subcommand_workspace._USAGE,
+    "org": subcommand_org.__doc__,
+    "node": subcommand_node.__doc__,
+    "alert": subcommand_alert.__doc__,
+    "admin": subcommand_admin.__doc__,
+    "tools": subcommand_tools.__doc__,
+    "secret": subcommand_secret.__doc__,
+    "sync": subcommand_sync.__doc__,
+}
+
+# Commands that can't be nested inside the shell.
+_UNAVAILABLE_COMMANDS = {"shell", "batch"}
+
+# Global options that take their value from the next word.
+_OPTIONS_WITH_VALUES = {"--deadline", "--workspace"}
+
+
+def _without_global_options(words: list[str]) -> list[str]:
+    """The words of a command line, starting with the subcommand"""
+    index = 0
+    while index < len(words) and words[index].startswith("-"):
+        index += 2 if words[index] in _OPTIONS_WITH_VALUES else 1
+    return words[index:]
+
+
+def _verbs(usage: str | None) -> list[str]:
+    """Extract the words following the subcommand from a usage string"""
+    verbs: list[str] = []
+    for match in re.finditer(r"^\s*tenzir-platform \w+((?: [a-z][\w-]*)+)", usage or "", re.M):
+        verb = match.group(1).strip()
+        if verb not in verbs:
+            verbs.append(verb)
+    return verbs
+
+
+class _Shell(cmd.Cmd):
+    prompt = "tenzir-platform> "
+    intro = "Tenzir Platform CLI shell. Type 'help' for a list of commands, 'exit' to quit."
+
+    def __init__(self, platform: PlatformEnvironment) -> None:
+        super().__init__()
+        self.platform = platform
+        self.verbs = {command: _verbs(usage) for command, usage in _SUBCOMMAND_USAGES.items()}
+        # The argument completions for the current command line. Cleared
+        # after every command, as the command may change the lists.
+        self._completions: dict[str, list[str]] = {}
+        self._completers: dict[tuple[str, ...], Callable[[], list[str]]] = {
+            ("node", "ping"): self._node_names,
+            ("node", "config"): self._node_names,
+            ("node", "delete"): self._node_names,
+            ("node", "proxy"): self._node_names,
+            ("alert", "add"): self._node_names,
+            ("workspace", "select"): self._workspace_names,
+            ("secret", "update"): self._secret_names,
+            ("secret", "delete"): self._secret_names,
+            ("secret", "store", "set-default"): self._store_names,
+            ("secret", "store", "delete"): self._store_names,
+        }
+
+    def emptyline(self) -> bool:
+        return False
+
+    def _run(self, line: str) -> bool:
+        # Imported here, because the entry point itself depends on this module.
+        from tenzir_platform.tenzir_platform import run_cli, subcommand_of
+
+        if line.strip() in ("EOF", "exit", "quit"):
+            if line.strip() == "EOF":
+                print()
+            return True
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print(f"invalid command: {e}", file=sys.stderr)
+            return False
+        if argv and argv[0] == "tenzir-platform":
+            argv = argv[1:]
+        if not argv:
+            return False
+        try:
+            subcommand = subcommand_of(argv)
+        except PlatformCliError as e:
+            print(e.error, file=sys.stderr)
+            return False
+        if subcommand in _UNAVAILABLE_COMMANDS:
+            print(f"'{subcommand}' is not available in the shell", file=sys.stderr)
+            return False
+        try:
+            # Lines may start with global options, e.g. '--workspace=staging'.
+            run_cli(argv, self.platform)
+        except SystemExit as e:
+            # docopt exits with the usage message on invalid arguments.
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+        except KeyboardInterrupt:
+            print("interrupted", file=sys.stderr)
+        finally:
+            self._completions.clear()
+        return False
+
+    def onecmd(self, line: str) -> bool:
+        # Every line is a `tenzir-platform` command, so don't let `cmd.Cmd`
+        # interpret it except for the help.
+        if line.strip() in ("help", "?"):
+            from tenzir_platform.tenzir_platform import _USAGE
+
+            print(_USAGE.strip())
+            print("\nType 'exit' or press <Ctrl-D> to leave the shell.")
+            return False
+        if not line.strip():
+            return self.emptyline()
+        return self._run(line)
+
+    def completenames(self, text: str, *ignored: object) -> list[str]:
+        commands = [*self.verbs, "help", "exit"]
+        return [command for command in commands if command.startswith(text)]
+
+    def completedefault(self, text: str, line: str, begidx: int, endidx: int) -> list[str]:
+        try:
+            words = shlex.split(line[:begidx])
+        except ValueError:
+            return []
+        if words and words[0] == "tenzir-platform":
+            words = words[1:]
+        words = _without_global_options(words)
+        if not words:
+            return self.completenames(text)
+        # Complete the verb of a subcommand, word by word.
+        typed = " ".join(words[1:] + [text])
+        candidates = set()
+        for verb in self.verbs.get(words[0], []):
+            if verb.startswith(typed):
+                next_word = verb[len(typed) - len(text) :].split(" ")[0]
+                if next_word:
+                    candidates.add(next_word)
+        if candidates:
+            return sorted(candidates)
+        # Complete the names of existing objects.
+        for prefix, completer in self._completers.items():
+            if tuple(words) == prefix:
+                key = " ".join(prefix)
+                if key not in self._completions:
+                    try:
+                        self._completions[key] = completer()
+                    except (Exception, SystemExit):
+                        # Completion must never interrupt the shell.
+                        self._completions[key] = []
+                return [name for name in self._completions[key] if name.startswith(text)]
+        return []
+
+    def _workspace_client(self) -> tuple[AppClient, str]:
+        client = AppClient(platform=self.platform)
+        workspace_id = workspace_login(self.platform, client)
+        return client, workspace_id
+
+    def _node_names(self) -> list[str]:
+        client, workspace_id = self._workspace_client()
+        nodes: list[dict[str, str]] = get_node_list(client, workspace_id)
+        return [node["name"] for node in nodes] + [node["node_id"] for node in nodes]
+
+    def _workspace_names(self) -> list[str]:
+        # Don't start an interactive login from within the completion.
+        id_token = IdTokenClient(self.platform).load_cached_id_token()
+        if id_token is None:
+            return []
+        client = AppClient(platform=self.platform)
+        workspaces = get_workspace_list(client, id_token)
+        return [workspace["name"] for workspace in workspaces]
+
+    def _secret_names(self) -> list[str]:
+        client, workspace_id = self._workspace_client()
+        secrets = subcommand_secret._list_secrets(client, workspace_id).secrets
+        return [secret.name for secret in secrets]
+
+    def _store_names(self) -> list[str]:
+        client, workspace_id = self._workspace_client()
+        resp = client.post("secrets/list-stores", json={"tenant_id": workspace_id})
+        resp.raise_for_status()
+        return [store["name"] for store in resp.json()["stores"]]
+
+
+def _complete_whole_words() -> None:
+    # By default, readline also splits words at '-', so that e.g. the node
+    # name 'my-node' would be completed from 'node' instead of 'my-node'.
+    try:
+        import readline
+    except ImportError:
+        return
+    readline.set_completer_delims(" \t\n")
+
+
+def shell_subcommand(platform: PlatformEnvironment, argv):
+    docopt(__doc__, argv=argv)
+    shell = _Shell(platform)
+    if not sys.stdin.isatty():
+        shell.intro = ""
+        shell.prompt = ""
+    _complete_whole_words()
+    # Warm up the authentication and the connection to the platform, so
+    # that the first command is as fast as the following ones.
+    try:
+        id_token = IdTokenClient(platform).load_cached_id_token()
+        if id_token is not None:
+            AppClient(platform=platform).post(
+                "get-login-info",
+                json={"id_token": id_token},
+                target_api=TargetApi.USER_PUBLIC,
+            )
+    except Exception as e:
+        if platform.verbose:
+            print(f"failed to warm up the connection: {e}", file=sys.stderr)
+    while True:
+        try:
+            shell.cmdloop()
+            break
+        except KeyboardInterrupt:
+            # Discard the current line, like other shells do.
+            print()
+            shell.intro = ""
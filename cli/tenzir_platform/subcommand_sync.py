@@ -0,0 +1,112 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Usage:
+  tenzir-platform sync
+
+Description:
+  tenzir-platform sync
+    Download the workspaces, as well as the nodes, secrets, secret stores
+    and alerts of the current workspace into the local inventory.
+
+    Only the objects of the current workspace are downloaded. To use other
+    workspaces offline, sync each of them with the global '--workspace'
+    option, e.g. 'tenzir-platform --workspace=staging sync'.
+
+  The inventory is a SQLite database in the cache directory. List commands
+  run with '--offline' answer from it without contacting the platform,
+  e.g. 'tenzir-platform node list --offline'. Only objects that changed
+  since the previous sync are written.
+
+  With the global '--cached' option, the lists are revalidated against
+  the local response cache, so that unchanged lists are not downloaded
+  again. Otherwise, the responses are only stored in the inventory.
+"""
+
+from docopt import docopt  # type: ignore[import-untyped]
+from requests import HTTPError
+
+from tenzir_platform.helpers.async_client import run_concurrently
+from tenzir_platform.helpers.client import AppClient
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.inventory import GLOBAL, Inventory, secrets_kind
+from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.startup import warm_up
+from tenzir_platform.helpers.user_keys import workspace_login
+from tenzir_platform.helpers.workspaces import get_workspace_list
+
+
+def _revalidating(platform: PlatformEnvironment) -> PlatformEnvironment:
+    """The settings for the requests of a sync"""
+    if not platform.response_cache:
+        return platform
+    # Revalidate all cached responses, so the inventory is up to date
+    # while unchanged lists still cost only a `304 Not Modified`.
+    return platform.model_copy(
+        update={"response_cache_ttls": {key: 0 for key in platform.response_cache_ttls}}
+    )
+
+
+def sync(platform: PlatformEnvironment):
+    platform = _revalidating(platform)
+    inventory = Inventory(platform)
+    client = AppClient(platform)
+    id_token = IdTokenClient(platform).load_id_token()
+    workspaces = get_workspace_list(client, id_token)
+    result = inventory.record(GLOBAL, "workspaces", workspaces, "tenant_id", "name")
+    print(f"workspaces: {result}")
+
+    workspace_id = workspace_login(platform, client)
+    payload = {"tenant_id": workspace_id}
+    responses = run_concurrently(
+        client,
+        [
+            ("list-nodes", payload),
+            ("secrets/list-stores", payload),
+            ("secrets/list", payload),
+            ("alert/list", payload),
+        ],
+    )
+    for resp in responses:
+        resp.raise_for_status()
+    nodes, stores, secrets, alerts = (resp.json() for resp in responses)
+    result = inventory.record(workspace_id, "nodes", nodes["nodes"], "node_id", "name")
+    print(f"nodes: {result}")
+    default_store_id = stores["default_store_id"]
+    result = inventory.record(
+        workspace_id,
+        "stores",
+        stores["stores"],
+        "id",
+        "name",
+        metadata={"default_store_id": default_store_id},
+    )
+    print(f"secret stores: {result}")
+    result = inventory.record(workspace_id, secrets_kind(None), secrets["secrets"], "id", "name")
+    print(f"secrets: {result}")
+    result = inventory.record(workspace_id, "alerts", alerts["alerts"], "id")
+    print(f"alerts: {result}")
+
+    # The default store was already listed above.
+    store_ids = [store["id"] for store in stores["stores"] if store["id"] != default_store_id]
+    responses = run_concurrently(
+        client,
+        [("secrets/list", {"tenant_id": workspace_id, "store_id": id}) for id in store_ids],
+    )
+    for store_id, resp in zip(store_ids, responses, strict=True):
+        try:
+            resp.raise_for_status()
+        except HTTPError as e:
+            # Some external stores can't list their secrets.
+            print(f"secrets in store {store_id}: skipped ({e.response.status_code})")
+            continue
+        result = inventory.record(
+            workspace_id, secrets_kind(store_id), resp.json()["secrets"], "id", "name"
+        )
+        print(f"secrets in store {store_id}: {result}")
+
+
+def sync_subcommand(platform: PlatformEnvironment, argv):
+    docopt(__doc__, argv=argv)
+    warm_up(platform, oidc_login=True, workspace=True)
+    sync(platform)
@@ -15,26 +15,33 @@ configuration for a self-hosted Tenzir Platform instance.
 """
 
 import os
+from typing import TYPE_CHECKING
 
-import base58
 from docopt import docopt
 
-from tenzir_platform.helpers.environment import PlatformEnvironment
-from tenzir_platform.subcommand_admin import auth_rule_from_arguments
+if TYPE_CHECKING:
+    from tenzir_platform.helpers.environment import PlatformEnvironment
+
+# The tools are often used in scripts and don't contact the platform, so
+# their dependencies are only imported by the tool that needs them.
 
 
 def print_workspace_token(workspace_id: str) -> None:
+    import base58
+
     base58_workspace_id = base58.b58encode(workspace_id.encode()).decode()
     random_bytes = os.urandom(24).hex()
     print(f"wsk_{random_bytes}{base58_workspace_id}")
 
 
-def tools_subcommand(_: PlatformEnvironment, argv):
+def tools_subcommand(_: "PlatformEnvironment | None", argv):
     args = docopt(__doc__, argv=argv)
 
     if args["generate-workspace-token"]:
         workspace_id = args["<workspace_id>"]
         print_workspace_token(workspace_id=workspace_id)
     elif args["print-auth-rule"]:
+        from tenzir_platform.helpers.auth_rule import auth_rule_from_arguments
+
         rule = auth_rule_from_arguments(args)
         print(rule.model_dump_json())
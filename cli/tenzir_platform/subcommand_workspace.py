@@ -4,7 +4,7 @@
 _USAGE = """
 Usage:
   tenzir-platform workspace select <workspace>
-  tenzir-platform workspace list [--json]
+  tenzir-platform workspace list [--json] [--offline]
   tenzir-platform workspace invite [--role=<role>] [--label=<label>]
   tenzir-platform workspace list-invitations
   tenzir-platform workspace revoke-invitation <invitation_id>
@@ -18,6 +18,8 @@ Description:
 
   tenzir-platform workspace list
     Display a list of all workspaces accessible for the current user.
+    With '--offline', answer from the local inventory instead of the
+    platform, see 'tenzir-platform sync'.
 
   tenzir-platform workspace invite [--role=<role>] [--label=<label>]
     Create an invitation for the currently selected workspace.
@@ -38,66 +40,33 @@ Description:
 """
 
 import json
-import re
 
 from docopt import docopt  # type: ignore[import-untyped]
 
-from tenzir_platform.helpers.cache import load_current_workspace, store_workspace
+from tenzir_platform.helpers.cache import load_vault_entry, store_workspace
 from tenzir_platform.helpers.client import AppClient, TargetApi
 from tenzir_platform.helpers.environment import PlatformEnvironment
 from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.inventory import GLOBAL, Inventory
 from tenzir_platform.helpers.oidc import IdTokenClient
+from tenzir_platform.helpers.startup import warm_up
+from tenzir_platform.helpers.user_keys import (
+    current_workspace_id,
+    is_expiring,
+    mint_user_key,
+    workspace_login,
+)
+from tenzir_platform.helpers.workspaces import get_workspace_list, resolve_workspace_identifier
 
 
-def _is_workspace_id(identifier: str):
-    return bool(re.match(r"^t-[a-z0-9]{8}$", identifier))
-
-
-def _get_workspace_list(client: AppClient, id_token: str) -> list[dict[str, str]]:
-    resp = client.post(
-        "get-login-info",
-        json={
-            "id_token": id_token,
-        },
-        target_api=TargetApi.USER_PUBLIC,
-    )
-    resp.raise_for_status()
-    return resp.json()["allowed_tenants"]
-
-
-def _resolve_workspace_identifier(client: AppClient, id_token: str, identifier: str) -> str:
-    # If we already have a node id, use that.
-    if _is_workspace_id(identifier):
-        return identifier
-
-    # Otherwise go through the list of workspaces
-    workspaces = _get_workspace_list(client, id_token)
-
-    # If we're given a number, interpret it as a workspace index
-    try:
-        return workspaces[int(identifier)]["tenant_id"]
-    except ValueError:
-        pass
-    except IndexError:
-        raise PlatformCliError(f"only have {len(workspaces)} workspaces")
-
-    # Else, look for a matching workspace name
-    name_matched = [workspace for workspace in workspaces if workspace["name"] == identifier]
-    if len(name_matched) == 0:
-        raise PlatformCliError(f"unknown workspace {identifier}")
-    if len(name_matched) > 1:
-        matching_ids = [workspace["tenant_id"] for workspace in name_matched]
-        raise PlatformCliError(
-            f"ambiguous name {identifier} is shared by workspaces {matching_ids}"
-        )
-    return name_matched[0]["tenant_id"]
-
-
-def list_workspaces(platform: PlatformEnvironment, print_json: bool) -> None:
+def list_workspaces(platform: PlatformEnvironment, print_json: bool, offline: bool) -> None:
     """Get list of authorized workspaces for the current CLI user"""
-    id_token = IdTokenClient(platform).load_id_token()
-    app_cli = AppClient(platform=platform)
-    workspaces = _get_workspace_list(app_cli, id_token)
+    if offline:
+        workspaces = Inventory(platform).load(GLOBAL, "workspaces").objects
+    else:
+        id_token = IdTokenClient(platform).load_id_token()
+        app_cli = AppClient(platform=platform)
+        workspaces = get_workspace_list(app_cli, id_token)
     if print_json:
         print(f"{json.dumps(workspaces)}")
     else:
@@ -106,9 +75,8 @@ def list_workspaces(platform: PlatformEnvironment, print_json: bool) -> None:
 
 
 def invite(platform: PlatformEnvironment, role: str, label: str):
-    workspace_id, user_key = load_current_workspace(platform)
     app_cli = AppClient(platform)
-    app_cli.workspace_login(user_key)
+    workspace_id = workspace_login(platform, app_cli)
     resp = app_cli.post(
         "workspace/create-invitation",
         json={
@@ -124,9 +92,8 @@ def invite(platform: PlatformEnvironment, role: str, label: str):
 
 
 def list_invitations(platform: PlatformEnvironment):
-    workspace_id, user_key = load_current_workspace(platform)
     app_cli = AppClient(platform)
-    app_cli.workspace_login(user_key)
+    workspace_id = workspace_login(platform, app_cli)
     resp = app_cli.post(
         "workspace/list-invitations",
         json={"tenant_id": workspace_id},
@@ -144,9 +111,8 @@ def list_invitations(platform: PlatformEnvironment):
 
 
 def revoke_invitation(platform: PlatformEnvironment, invitation_id: str):
-    workspace_id, user_key = load_current_workspace(platform)
     app_cli = AppClient(platform)
-    app_cli.workspace_login(user_key)
+    workspace_id = workspace_login(platform, app_cli)
     resp = app_cli.post(
         "workspace/revoke-invitation",
         json={
@@ -181,18 +147,14 @@ def select(platform: PlatformEnvironment, workspace_id_or_name: str):
     """Log in to a tenant as the current CLI user"""
     id_token = IdTokenClient(platform).load_id_token()
     app_cli = AppClient(platform)
-    workspace_id = _resolve_workspace_identifier(app_cli, id_token, workspace_id_or_name)
-    resp = app_cli.post(
-        "switch-tenant",
-        json={
-            "id_token": id_token,
-            "tenant_id": workspace_id,
-        },
-        target_api=TargetApi.USER_PUBLIC,
-    )
-    resp.raise_for_status()
-    user_key = resp.json()["user_key"]
-    store_workspace(platform, workspace_id, user_key)
+    workspace_id = resolve_workspace_identifier(app_cli, id_token, workspace_id_or_name)
+    # Reuse the key of a previously used workspace while it's still valid.
+    entry = load_vault_entry(platform, workspace_id)
+    if entry is not None and entry.get("expires_at") is not None and not is_expiring(entry):
+        store_workspace(platform, workspace_id, entry["user_key"], entry["expires_at"])
+    else:
+        user_key, expires_at = mint_user_key(app_cli, workspace_id, id_token)
+        store_workspace(platform, workspace_id, user_key, expires_at)
     print(f"Switched to workspace {workspace_id}")
 
 
@@ -212,9 +174,12 @@ def rename(platform: PlatformEnvironment, workspace_id: str, name: str):
 
 def workspace_subcommand(platform: PlatformEnvironment, argv):
     args = docopt(_USAGE, argv=argv)
+    oidc_login = args["select"] or args["list"] or args["redeem-invitation"]
+    if not args["--offline"]:
+        warm_up(platform, oidc_login=oidc_login, workspace=not oidc_login)
     if args["list"]:
         json = args["--json"]
-        list_workspaces(platform, json)
+        list_workspaces(platform, json, args["--offline"])
     if args["invite"]:
         role = args["--role"] or "member"
         if role not in ("admin", "member"):
@@ -230,6 +195,6 @@ def workspace_subcommand(platform: PlatformEnvironment, argv):
         workspace_id = args["<workspace>"]
         select(platform, workspace_id)
     if args["rename"]:
-        workspace_id, user_key = load_current_workspace(platform)
+        workspace_id = current_workspace_id(platform, AppClient(platform))
         name = args["<name>"]
         rename(platform=platform, workspace_id=workspace_id, name=name)
@@ -3,12 +3,25 @@
 
 _USAGE = """Tenzir Platform CLI.
 
-Usage: tenzir-platform [-v|--verbose] <command> [<args>...]
+Usage: tenzir-platform [-v|--verbose] [--timings|--timings-json] [--cached|--no-cache]
+                       [--deadline=<duration>] [--workspace=<workspace>]
+                       <command> [<args>...]
        tenzir-platform [--help] [--version]
 
 Options:
   -h, --help                  Show this screen.
   -v, --verbose               Enable verbose logging.
+  --timings                   Print a timing breakdown of all HTTP requests
+                              to stderr when the command finishes.
+  --timings-json              Like --timings, but print the timings as JSON.
+  --cached                    Reuse recent responses of read-only requests
+                              from a local cache instead of fetching them
+                              again, e.g. for repeated lookups in scripts.
+  --no-cache                  Don't use locally cached API responses.
+  --deadline=<duration>       The time budget for all requests made by the
+                              command, e.g. '30s' or '2m'.
+  --workspace=<workspace>     Use this workspace id or name instead of the
+                              selected workspace, without selecting it.
   --version                   Show version.
 
 Commands:
@@ -20,30 +33,61 @@ Commands:
    admin      Administer local on-prem platform infrastructure.
    tools      Utility commands for configuring the platform.
    secret     Manage secrets.
+   sync       Download the local inventory for offline use.
+   batch      Run many commands in a single process.
+   shell      Run commands interactively.
+   agent      Manage the background agent.
 
 See 'tenzir-platform <command> --help' for more information on a specific command.
 """
 
-import importlib.metadata
+import importlib
+import os
 import sys
 import traceback
+from typing import TYPE_CHECKING
 
-from docopt import docopt
-from requests import HTTPError
+from docopt import DocoptExit, docopt
 
-from tenzir_platform.helpers.cache import filename_in_cache
-from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.deadline import command_deadline
 from tenzir_platform.helpers.exceptions import PlatformCliError
-from tenzir_platform.subcommand_admin import admin_subcommand
-from tenzir_platform.subcommand_alert import alert_subcommand
-from tenzir_platform.subcommand_auth import auth_subcommand
-from tenzir_platform.subcommand_node import node_subcommand
-from tenzir_platform.subcommand_org import org_subcommand
-from tenzir_platform.subcommand_secret import secret_subcommand
-from tenzir_platform.subcommand_tools import tools_subcommand
-from tenzir_platform.subcommand_workspace import workspace_subcommand
 
-version = importlib.metadata.version("tenzir-platform")
+if TYPE_CHECKING:
+    from tenzir_platform.helpers.environment import PlatformEnvironment
+
+# The module and function of every subcommand. Only the dispatched
+# subcommand is imported, so that trivial invocations like `--help` don't
+# pay for loading the HTTP, JWT and settings libraries. For the same
+# reason, the remaining imports in this module are deferred until they
+# are needed.
+_SUBCOMMANDS = {
+    "auth": ("subcommand_auth", "auth_subcommand"),
+    "alert": ("subcommand_alert", "alert_subcommand"),
+    "workspace": ("subcommand_workspace", "workspace_subcommand"),
+    "org": ("subcommand_org", "org_subcommand"),
+    "node": ("subcommand_node", "node_subcommand"),
+    "admin": ("subcommand_admin", "admin_subcommand"),
+    "tools": ("subcommand_tools", "tools_subcommand"),
+    "secret": ("subcommand_secret", "secret_subcommand"),
+    "sync": ("subcommand_sync", "sync_subcommand"),
+    "batch": ("subcommand_batch", "batch_subcommand"),
+    "shell": ("subcommand_shell", "shell_subcommand"),
+    "agent": ("subcommand_agent", "agent_subcommand"),
+}
+
+# Subcommands that don't contact the platform and therefore run without
+# loading its configuration.
+_LOCAL_SUBCOMMANDS = {"tools"}
+
+
+# The arguments that make docopt print the usage of a subcommand.
+_HELP_OPTIONS = {"-h", "--help"}
+
+
+def _version() -> str:
+    import importlib.metadata
+
+    return importlib.metadata.version("tenzir-platform")
 
 
 def _pretty_print_cli_error(e: PlatformCliError, verbose: bool):
@@ -56,37 +100,80 @@ def _pretty_print_cli_error(e: PlatformCliError, verbose: bool):
         traceback.print_exc(file=sys.stderr)
 
 
-def main():
-    if len(sys.argv) == 1:
-        sys.argv.append("--help")
-    arguments = docopt(
-        _USAGE,
-        version=f"Tenzir Platform CLI {version}",
-        options_first=True,
-    )
+def _usage_of(module: str) -> str | None:
+    """The usage text of a subcommand module, read from its source without
+    importing it, if it is a plain string literal"""
+    # Imported here because only help requests parse the source.
+    import ast
+    import importlib.util
+
+    spec = importlib.util.find_spec(f"tenzir_platform.{module}")
+    if spec is None or spec.origin is None or not spec.origin.endswith(".py"):
+        return None
     try:
-        platform = PlatformEnvironment.load()
-        if arguments["--verbose"]:
-            platform.verbose = True
-        argv = [arguments["<command>"]] + arguments["<args>"]
-        if arguments["<command>"] == "auth":
-            auth_subcommand(platform, argv)
-        elif arguments["<command>"] == "alert":
-            alert_subcommand(platform, argv)
-        elif arguments["<command>"] == "workspace":
-            workspace_subcommand(platform, argv)
-        elif arguments["<command>"] == "org":
-            org_subcommand(platform, argv)
-        elif arguments["<command>"] == "node":
-            node_subcommand(platform, argv)
-        elif arguments["<command>"] == "admin":
-            admin_subcommand(platform, argv)
-        elif arguments["<command>"] == "tools":
-            tools_subcommand(platform, argv)
-        elif arguments["<command>"] == "secret":
-            secret_subcommand(platform, argv)
-        else:
-            print("unknown subcommand, see 'tenzir-platform --help' for usage")
+        with open(spec.origin, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), spec.origin)
+    except (OSError, SyntaxError):
+        return None
+    docstring = ast.get_docstring(tree, clean=False)
+    if docstring is not None:
+        return docstring
+    # Some modules keep their usage in `_USAGE` instead.
+    for statement in tree.body:
+        if (
+            isinstance(statement, ast.Assign)
+            and [target.id for target in statement.targets if isinstance(target, ast.Name)]
+            == ["_USAGE"]
+            and isinstance(statement.value, ast.Constant)
+            and isinstance(statement.value.value, str)
+        ):
+            return statement.value.value
+    return None
+
+
+def _print_help(argv: list[str]) -> bool:
+    """Print the usage of a subcommand like docopt would, but without
+    importing the subcommand and its dependencies first.
+
+    Only handles help options that follow plain words, which can't be the
+    value of another option. Returns whether the help was printed."""
+    if argv[0] not in _SUBCOMMANDS:
+        return False
+    for arg in argv[1:]:
+        if arg in _HELP_OPTIONS:
+            break
+        if arg.startswith("-"):
+            return False
+    else:
+        return False
+    usage = _usage_of(_SUBCOMMANDS[argv[0]][0])
+    if usage is None:
+        return False
+    print(usage.strip("\n"))
+    return True
+
+
+def _dispatch(platform: "PlatformEnvironment | None", argv: list[str]) -> None:
+    command = argv[0]
+    if command not in _SUBCOMMANDS:
+        raise PlatformCliError(f"unknown subcommand '{command}'").add_hint(
+            "see 'tenzir-platform --help' for usage"
+        )
+    module, function = _SUBCOMMANDS[command]
+    subcommand = getattr(importlib.import_module(f"tenzir_platform.{module}"), function)
+    subcommand(platform, argv)
+
+
+def run_command(platform: "PlatformEnvironment", argv: list[str]) -> int:
+    """Run a single subcommand and return its exit status"""
+    from requests import HTTPError
+
+    from tenzir_platform.helpers.cache import filename_in_cache
+    from tenzir_platform.helpers.memo import memoize_requests
+
+    try:
+        with command_deadline(platform.deadline), memoize_requests():
+            _dispatch(platform, argv)
     except HTTPError as e:
         if e.response.status_code == 403:
             detail = None
@@ -100,7 +187,8 @@ def main():
                     "but the current session was established without it."
                 )
                 print(
-                    f"Please delete the cached token at {filename_in_cache(platform, 'id_token')} "
+                    f"Please delete the cached tokens at {filename_in_cache(platform, 'id_token')} "
+                    f"and {filename_in_cache(platform, 'refresh_token')} "
                     "and log in again by running 'tenzir-platform auth login'."
                 )
             else:
@@ -122,12 +210,115 @@ def main():
             if detail:
                 error.add_hint(f"detail: {detail}")
             if platform.verbose and e.response is not None:
-                error.add_hint(f"response: {e.response.content}")
+                error.add_hint(f"response: {e.response.content!r}")
             _pretty_print_cli_error(error, platform.verbose)
-            exit(-1)
+        return -1
     except PlatformCliError as e:
         _pretty_print_cli_error(e, platform.verbose)
-        exit(-1)
+        return -1
+    return 0
+
+
+def _run_local_command(argv: list[str], verbose: bool) -> int:
+    """Run a subcommand that doesn't need the platform configuration"""
+    try:
+        _dispatch(None, argv)
+    except PlatformCliError as e:
+        _pretty_print_cli_error(e, verbose)
+        return -1
+    return 0
+
+
+def subcommand_of(argv: list[str]) -> str:
+    """The subcommand of a command line with global options"""
+    try:
+        return docopt(_USAGE, argv=argv, options_first=True, help=False)["<command>"]
+    except DocoptExit:
+        raise PlatformCliError("invalid global options, see 'tenzir-platform --help'")
+
+
+def run_cli(argv: list[str], platform: "PlatformEnvironment | None" = None) -> int:
+    """Run a full command line, including the global options.
+
+    A `platform` that is passed in is copied before applying the options."""
+    if not argv:
+        argv = ["--help"]
+    arguments = docopt(_USAGE, argv=argv, options_first=True)
+    if arguments["--version"]:
+        print(f"Tenzir Platform CLI {_version()}")
+        return 0
+    command = [arguments["<command>"]] + arguments["<args>"]
+    if _print_help(command):
+        return 0
+    if platform is None and command[0] in _LOCAL_SUBCOMMANDS:
+        return _run_local_command(command, arguments["--verbose"])
+    from tenzir_platform.helpers.environment import PlatformEnvironment
+
+    timings = arguments["--timings"] or arguments["--timings-json"]
+    if platform is None:
+        try:
+            platform = PlatformEnvironment.load()
+        except PlatformCliError as e:
+            _pretty_print_cli_error(e, arguments["--verbose"])
+            return -1
+    else:
+        platform = platform.model_copy()
+    if arguments["--verbose"]:
+        platform.verbose = True
+    if timings:
+        platform.timings = True
+    if arguments["--cached"]:
+        platform.response_cache = True
+    if arguments["--no-cache"]:
+        platform.response_cache = False
+    if arguments["--deadline"] is not None:
+        from pytimeparse2 import parse as parse_duration
+
+        deadline = parse_duration(arguments["--deadline"])
+        if deadline is None or deadline <= 0:
+            _pretty_print_cli_error(
+                PlatformCliError(f"invalid deadline '{arguments['--deadline']}'").add_hint(
+                    "use a duration like '30s' or '2m'"
+                ),
+                platform.verbose,
+            )
+            return -1
+        platform.deadline = deadline
+    if arguments["--workspace"] is not None:
+        platform.workspace = arguments["--workspace"]
+    if not timings:
+        return run_command(platform, command)
+    from tenzir_platform.helpers.timings import print_summary as print_timings
+    from tenzir_platform.helpers.timings import record_requests
+
+    with record_requests() as records:
+        try:
+            return run_command(platform, command)
+        finally:
+            print_timings(records, as_json=arguments["--timings-json"])
+
+
+def _agent_enabled() -> bool:
+    """Whether commands should be forwarded to the agent.
+
+    This mirrors the `agent` setting of `PlatformEnvironment`, but is read
+    without loading the settings or the agent client, so that commands that
+    don't use the agent start quickly."""
+    value = os.environ.get("TENZIR_PLATFORM_CLI_AGENT", "")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def main():
+    argv = sys.argv[1:]
+    status = None
+    if _agent_enabled():
+        from tenzir_platform.helpers import agent
+
+        status = agent.forward(argv)
+    if status is None:
+        status = run_cli(argv)
+    if status != 0:
+        exit(status)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+
+import pytest
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+
+
+@pytest.fixture(autouse=True)
+def isolated_environment(monkeypatch, tmp_path):
+    """Keep the settings and the cache of the user out of the tests"""
+    for name in os.environ:
+        if name.startswith("TENZIR_PLATFORM_CLI_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def platform() -> PlatformEnvironment:
+    return PlatformEnvironment(stage_identifier="test")
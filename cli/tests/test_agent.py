@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+
+from tenzir_platform import tenzir_platform
+from tenzir_platform.helpers import agent
+from tenzir_platform.helpers.agent import Agent
+
+
+def _run(argv: list[str]) -> int:
+    """Prints its arguments one by one, so that concurrent commands interleave"""
+    for arg in argv:
+        print(arg)
+        time.sleep(0.01)
+    print(f"ran {len(argv)} arguments", file=sys.stderr)
+    return len(argv)
+
+
+@pytest.fixture
+def cache_home(monkeypatch) -> Iterator[str]:
+    # The path of a Unix socket is limited to about 100 characters, which
+    # the temporary directories of pytest may exceed.
+    with tempfile.TemporaryDirectory() as directory:
+        monkeypatch.setenv("XDG_CACHE_HOME", directory)
+        yield directory
+
+
+# The agent replaces `sys.stdout` and `sys.stderr` while it serves, and so
+# does pytest before every test, so it must only be started by the tests.
+@contextmanager
+def _serving() -> Iterator[Agent]:
+    instance = Agent(_run, idle_timeout=60, verbose=False)
+    thread = threading.Thread(target=instance.serve, daemon=True)
+    thread.start()
+    while not os.path.exists(agent.socket_path()):
+        time.sleep(0.01)
+    yield instance
+    agent.control("stop")
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_commands_are_forwarded_to_the_agent(cache_home, capsys):
+    with _serving() as running_agent:
+        assert agent.forward(["node", "list"]) == 2
+    assert running_agent.commands == 1
+    assert capsys.readouterr() == ("node\nlist\n", "ran 2 arguments\n")
+
+
+def test_concurrent_commands_only_receive_their_own_output(cache_home):
+    def forward(name: str) -> tuple[str, str, int]:
+        sock = agent._connect()
+        assert sock is not None
+        output = {"stdout": "", "stderr": ""}
+        with sock:
+            for message in agent._request(sock, {"argv": ["node", "ping", name]}):
+                if "exit_status" in message:
+                    return output["stdout"], output["stderr"], message["exit_status"]
+                output[message["stream"]] += message["data"]
+        raise AssertionError("missing exit status")
+
+    names = [f"node-{i}" for i in range(4)]
+    with _serving(), ThreadPoolExecutor(max_workers=len(names)) as executor:
+        results = list(executor.map(forward, names))
+    assert results == [(f"node\nping\n{name}\n", "ran 3 arguments\n", 3) for name in names]
+
+
+def test_local_commands_are_not_forwarded(cache_home):
+    with _serving() as running_agent:
+        assert agent.forward(["shell"]) is None
+        assert agent.forward(["node", "run", "--help"]) is None
+        assert agent.forward(["secret", "add", "name"]) is None
+    assert running_agent.commands == 0
+
+
+def test_the_agent_is_started_on_first_use(cache_home, monkeypatch):
+    started = []
+    monkeypatch.setattr(agent, "start", lambda: started.append(True))
+    ran = []
+    monkeypatch.setattr(tenzir_platform, "run_cli", lambda argv: ran.append(argv) or 0)
+    monkeypatch.setenv("TENZIR_PLATFORM_CLI_AGENT", "true")
+    monkeypatch.setattr(sys, "argv", ["tenzir-platform", "node", "list"])
+    tenzir_platform.main()
+    assert started == [True]
+    assert ran == [["node", "list"]]
+
+
+def test_only_one_agent_serves_a_configuration(cache_home):
+    with _serving():
+        assert not Agent(_run, idle_timeout=60, verbose=False).serve()
+
+
+def test_idle_agents_exit(cache_home):
+    start = time.monotonic()
+    assert Agent(_run, idle_timeout=0.1, verbose=False).serve()
+    assert time.monotonic() - start < 3
+    assert not os.path.exists(agent.socket_path())
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import threading
+import time
+
+import pytest
+from requests import Response
+
+from tenzir_platform.helpers.async_client import gather_bounded, run_concurrently
+from tenzir_platform.helpers.client import AppClient
+
+
+class _Recorder:
+    """Stands in for `AppClient.request` and tracks the requests in flight"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, method, endpoint_suffix, json, target_api, connection_retry) -> Response:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later calls finish first, so that the order of the responses
+        # doesn't follow from the order of completion.
+        time.sleep(0.05 / (json["index"] + 1))
+        with self.lock:
+            self.in_flight -= 1
+        resp = Response()
+        resp.status_code = 200
+        resp._content = endpoint_suffix.encode()
+        return resp
+
+
+@pytest.fixture
+def client(platform, monkeypatch) -> AppClient:
+    client = AppClient(platform)
+    monkeypatch.setattr(client, "request", _Recorder())
+    return client
+
+
+_CALLS = [(f"endpoint-{i}", {"index": i}) for i in range(8)]
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_concurrency_is_capped(client, max_concurrency):
+    run_concurrently(client, _CALLS, max_concurrency=max_concurrency)
+    assert client.request.max_in_flight == max_concurrency
+
+
+def test_responses_are_in_the_order_of_the_calls(client):
+    responses = run_concurrently(client, _CALLS, max_concurrency=8)
+    assert [resp.text for resp in responses] == [endpoint for endpoint, _ in _CALLS]
+
+
+def test_works_inside_a_running_event_loop(client):
+    async def main() -> list[Response]:
+        return run_concurrently(client, _CALLS[:2])
+
+    assert [resp.text for resp in asyncio.run(main())] == ["endpoint-0", "endpoint-1"]
+
+
+def test_gather_bounded_keeps_the_order():
+    async def value(i: int) -> int:
+        await asyncio.sleep(0.01 / (i + 1))
+        return i
+
+    assert asyncio.run(gather_bounded((value(i) for i in range(5)), 2)) == list(range(5))
@@ -0,0 +1,25 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import pytest
+
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.subcommand_batch import _parse_line
+from tenzir_platform.tenzir_platform import run_cli, subcommand_of
+
+
+def test_lines_may_start_with_global_options():
+    command = _parse_line("--workspace=staging -v node list")
+    assert command == ["--workspace=staging", "-v", "node", "list"]
+    assert subcommand_of(command) == "node"
+    assert subcommand_of(["--deadline", "30s", "shell"]) == "shell"
+
+
+def test_invalid_global_options_are_rejected():
+    with pytest.raises(PlatformCliError):
+        subcommand_of(["--bogus", "node", "list"])
+
+
+def test_unknown_subcommands_fail(platform, capsys):
+    assert run_cli(["bogus"], platform) != 0
+    assert "unknown subcommand 'bogus'" in capsys.readouterr().err
@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+
+import pytest
+
+from tenzir_platform.helpers import cache
+from tenzir_platform.helpers.cache import cache_lock, write_cache_file
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.oidc import IdTokenClient
+
+
+def _renew(filename: str, renewals: list[str]) -> str:
+    """Renew the file unless another thread did already, like the token
+    renewal does"""
+    with cache_lock(filename):
+        try:
+            with open(filename) as f:
+                return f.read()
+        except OSError:
+            pass
+        renewals.append(threading.current_thread().name)
+        write_cache_file(filename, "renewed")
+        return "renewed"
+
+
+def test_waiters_use_the_result_of_the_first_renewal(tmp_path):
+    filename = str(tmp_path / "id_token")
+    renewals: list[str] = []
+    results = []
+    holder = cache_lock(filename)
+    holder.__enter__()
+    threads = [
+        threading.Thread(target=lambda: results.append(_renew(filename, renewals)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    holder.__exit__(None, None, None)
+    for thread in threads:
+        thread.join()
+    assert results == ["renewed"] * 4
+    assert len(renewals) == 1
+
+
+def test_waiting_for_the_lock_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_LOCK_TIMEOUT", 0.1)
+    filename = str(tmp_path / "id_token")
+    with (
+        cache_lock(filename),
+        pytest.raises(PlatformCliError, match="timed out waiting for the lock"),
+        cache_lock(filename),
+    ):
+        pass
+
+
+def test_interactive_login_does_not_hold_the_lock(platform, monkeypatch):
+    client = IdTokenClient(platform)
+    monkeypatch.setattr(client, "refresh_id_token", lambda: None)
+
+    def reauthenticate_token(interactive: bool = True) -> str:
+        # Other processes can still take the lock, e.g. to refresh a token.
+        monkeypatch.setattr(cache, "_LOCK_TIMEOUT", 0.1)
+        with cache_lock(client._filename_in_cache()):
+            pass
+        return "token"
+
+    monkeypatch.setattr(client, "reauthenticate_token", reauthenticate_token)
+    assert client.load_id_token(interactive=True) == "token"
@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import time
+
+import pytest
+from requests import Response
+
+from tenzir_platform.helpers.client import AppClient, _user_key_rejected
+from tenzir_platform.helpers.deadline import command_deadline
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+
+def _response(status_code: int, body: object) -> Response:
+    resp = Response()
+    resp.status_code = status_code
+    resp._content = json.dumps(body).encode()
+    return resp
+
+
+# Bodies of 403 responses as the platform sends them.
+_FORBIDDEN = {"detail": "Forbidden"}
+_MFA_REQUIRED = {"detail": {"error": "mfa_required"}}
+
+
+@pytest.mark.parametrize(
+    "status_code,body,expected",
+    [
+        (403, _FORBIDDEN, True),
+        (403, {"detail": "Not authenticated"}, True),
+        (403, "Forbidden", True),
+        (403, _MFA_REQUIRED, False),
+        (401, _FORBIDDEN, False),
+        (404, {"detail": "Not Found"}, False),
+    ],
+)
+def test_user_key_rejected(status_code, body, expected):
+    assert _user_key_rejected(_response(status_code, body)) == expected
+
+
+@pytest.mark.parametrize(
+    "detail,renewals",
+    [(_FORBIDDEN["detail"], 1), (_MFA_REQUIRED["detail"], 0)],
+)
+def test_user_key_is_only_renewed_when_rejected(platform, monkeypatch, detail, renewals):
+    client = AppClient(platform)
+    renewed = []
+
+    def renew() -> str:
+        renewed.append(True)
+        return "uk-new"
+
+    def request(method, endpoint_suffix, json, target_api, connection_retry):
+        if client.user_key == "uk-new":
+            return _response(200, {})
+        return _response(403, {"detail": detail})
+
+    client.workspace_login("uk-old", renew)
+    monkeypatch.setattr(client, "_request", request)
+    resp = client.request("POST", "list-nodes", {"tenant_id": "t-1"})
+    assert len(renewed) == renewals
+    assert resp.status_code == (200 if renewals else 403)
+
+
+def test_user_key_is_renewed_only_once(platform, monkeypatch):
+    client = AppClient(platform)
+    renewed = []
+
+    def renew() -> str:
+        renewed.append(True)
+        return f"uk-{len(renewed)}"
+
+    def request(method, endpoint_suffix, json, target_api, connection_retry):
+        # A denial that a new key doesn't fix, e.g. missing permissions.
+        return _response(403, _FORBIDDEN)
+
+    client.workspace_login("uk-old", renew)
+    monkeypatch.setattr(client, "_request", request)
+    for _ in range(3):
+        assert client.request("POST", "org/list-invitations", {}).status_code == 403
+    assert len(renewed) == 1
+
+
+def test_slow_responses_stop_at_the_deadline(platform, monkeypatch):
+    client = AppClient(platform)
+    client.workspace_login("uk-1")
+
+    def request(**_) -> Response:
+        # Every read is within the read timeout, but the whole response
+        # takes longer than the deadline.
+        time.sleep(0.2)
+        return _response(200, {})
+
+    monkeypatch.setattr(client.session, "request", request)
+    with command_deadline(0.1), pytest.raises(PlatformCliError, match="deadline"):
+        client.post("secrets/add", {"tenant_id": "t-1"})
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import gzip
+import json
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tenzir_platform.helpers import compression
+from tenzir_platform.helpers.client import AppClient, TargetApi
+from tenzir_platform.helpers.compression import compress_body
+from tenzir_platform.helpers.session import close_sessions
+
+_BODY = json.dumps({"nodes": [f"n-{i:08x}" for i in range(1000)]}).encode()
+
+
+@pytest.mark.parametrize("algorithm", ["gzip", "auto"])
+def test_bodies_below_the_threshold_are_sent_as_is(algorithm):
+    assert compress_body(_BODY, algorithm, len(_BODY) + 1) == (_BODY, None)
+
+
+def test_bodies_at_the_threshold_are_compressed():
+    compressed, encoding = compress_body(_BODY, "gzip", len(_BODY))
+    assert encoding == "gzip"
+    assert len(compressed) < len(_BODY)
+    assert gzip.decompress(compressed) == _BODY
+
+
+def test_compression_can_be_disabled():
+    assert compress_body(_BODY, "none", 0) == (_BODY, None)
+
+
+@pytest.mark.parametrize("algorithm", ["auto", "zstd"])
+def test_gzip_is_used_without_zstandard(monkeypatch, algorithm):
+    monkeypatch.setattr(compression, "ZSTD_AVAILABLE", False)
+    compressed, encoding = compress_body(_BODY, algorithm, 0)
+    assert encoding == "gzip"
+    assert gzip.decompress(compressed) == _BODY
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.server.requests.append(  # type: ignore[attr-defined]
+            (self.headers, self.rfile.read(int(self.headers["Content-Length"])))
+        )
+        body = gzip.compress(_BODY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server() -> Iterator[ThreadingHTTPServer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    close_sessions()
+
+
+@pytest.fixture
+def client(server, platform) -> AppClient:
+    platform.api_endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    platform.request_compression = "gzip"
+    platform.compression_threshold = 1024
+    return AppClient(platform)
+
+
+def test_large_bodies_are_sent_compressed(server, client):
+    client.post("list-nodes", json={"tenant_id": "t-00000001"}, target_api=TargetApi.USER_PUBLIC)
+    nodes = json.loads(_BODY)
+    client.post("list-nodes", json=nodes, target_api=TargetApi.USER_PUBLIC)
+    (small_headers, small_body), (large_headers, large_body) = server.requests
+    assert "Content-Encoding" not in small_headers
+    assert json.loads(small_body) == {"tenant_id": "t-00000001"}
+    assert large_headers["Content-Encoding"] == "gzip"
+    assert large_headers["Content-Type"] == "application/json"
+    assert json.loads(gzip.decompress(large_body)) == nodes
+
+
+def test_verbose_output_reports_the_bytes_on_the_wire(server, client, capsys):
+    client.verbose = True
+    resp = client.post("list-nodes", json=json.loads(_BODY), target_api=TargetApi.USER_PUBLIC)
+    assert resp.content == _BODY
+    [(_, sent)] = server.requests
+    received = len(gzip.compress(_BODY))
+    output = capsys.readouterr().out.rstrip()
+    assert f"sent {len(sent)} bytes (gzip), received {received} bytes" in output
+    assert output.endswith(f"bytes (gzip, {len(_BODY)} decoded)")
@@ -0,0 +1,25 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import importlib
+
+import pytest
+
+from tenzir_platform.tenzir_platform import _SUBCOMMANDS, _print_help
+
+
+@pytest.mark.parametrize("command", sorted(_SUBCOMMANDS))
+def test_help_matches_docopt(command, capsys):
+    assert _print_help([command, "--help"])
+    fast = capsys.readouterr().out
+    module, function = _SUBCOMMANDS[command]
+    subcommand = getattr(importlib.import_module(f"tenzir_platform.{module}"), function)
+    with pytest.raises(SystemExit):
+        subcommand(None, [command, "--help"])
+    assert fast == capsys.readouterr().out
+
+
+def test_help_after_options_is_left_to_docopt():
+    assert not _print_help(["secret", "add", "name", "--value", "--help"])
+    assert not _print_help(["node", "list"])
+    assert not _print_help(["bogus", "--help"])
@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import gzip
+import json
+from collections.abc import Callable
+
+import pytest
+import requests
+import requests.exceptions
+
+from tenzir_platform.helpers.http2 import HTTP2_AVAILABLE, Http2Session
+
+if not HTTP2_AVAILABLE:
+    pytest.skip("the 'http2' extra is not installed", allow_module_level=True)
+
+import httpx  # noqa: E402
+
+_URL = "https://rest.example.com/user/list-nodes"
+
+
+def _response(status_code: int, body: bytes = b"", headers: dict | None = None) -> httpx.Response:
+    # Like the responses of a real transport, the body is only read by the
+    # client, which also measures the elapsed time then.
+    return httpx.Response(status_code, headers=headers, stream=httpx.ByteStream(body))
+
+
+def _session(platform, handler: Callable[[httpx.Request], httpx.Response]) -> Http2Session:
+    session = Http2Session(platform)
+    session._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return session
+
+
+# httpx only warns about raw bodies passed as `data`, and will reject them.
+@pytest.mark.filterwarnings("error::DeprecationWarning")
+def test_raw_bodies_are_sent_as_content(platform):
+    received = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received.append(request)
+        return _response(200, b"{}")
+
+    body = gzip.compress(b'{"tenant_id": "t-00000001"}')
+    session = _session(platform, handler)
+    session.request("POST", _URL, data=body, headers={"Content-Encoding": "gzip"})
+    session.request("POST", _URL, json={"tenant_id": "t-00000001"})
+    raw, encoded = received
+    assert raw.content == body
+    assert raw.headers["Content-Encoding"] == "gzip"
+    assert "Content-Type" not in raw.headers
+    assert json.loads(encoded.content) == {"tenant_id": "t-00000001"}
+    assert encoded.headers["Content-Type"] == "application/json"
+
+
+def test_responses_become_requests_responses(platform):
+    body = json.dumps({"nodes": []}).encode()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return _response(
+            200, gzip.compress(body), {"Content-Encoding": "gzip", "X-Request-Id": "1"}
+        )
+
+    resp = _session(platform, handler).request("POST", _URL, json={})
+    assert isinstance(resp, requests.Response)
+    assert (resp.status_code, resp.reason, resp.url) == (200, "OK", _URL)
+    assert resp.headers["x-request-id"] == "1"
+    assert resp.content == body
+    assert resp.json() == {"nodes": []}
+    assert resp.request.method == "POST"
+    assert resp.request.url == _URL
+    assert resp.http_version == "HTTP/1.1"
+    assert resp.wire_bytes == len(gzip.compress(body))
+
+
+def test_error_statuses_raise_requests_errors(platform):
+    session = _session(platform, lambda request: _response(404, b'{"detail": "Not Found"}'))
+    resp = session.request("POST", _URL, json={})
+    with pytest.raises(requests.HTTPError, match="404 Client Error: Not Found"):
+        resp.raise_for_status()
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (httpx.ConnectTimeout("connect timed out"), requests.exceptions.ConnectTimeout),
+        (httpx.ReadTimeout("read timed out"), requests.exceptions.Timeout),
+        (httpx.ConnectError("refused"), requests.exceptions.ConnectionError),
+        (httpx.RemoteProtocolError("disconnected"), requests.exceptions.ConnectionError),
+    ],
+)
+def test_transport_errors_become_requests_errors(platform, error, expected):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise error
+
+    with pytest.raises(requests.exceptions.RequestException) as e:
+        _session(platform, handler).request("POST", _URL, json={})
+    assert type(e.value) is expected
+    assert e.value.__cause__ is error
+
+
+def test_timeouts_are_converted(platform):
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"])
+        return _response(200)
+
+    session = _session(platform, handler)
+    session.request("GET", _URL, timeout=(1.0, 2.0))
+    session.request("GET", _URL, timeout=3.0)
+    assert timeouts == [
+        {"connect": 1.0, "read": 2.0, "write": 2.0, "pool": 2.0},
+        {"connect": 3.0, "read": 3.0, "write": 3.0, "pool": 3.0},
+    ]
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+
+import pytest
+
+from tenzir_platform.helpers import oidc
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.inventory import GLOBAL, Inventory
+from tenzir_platform.helpers.user_keys import offline_workspace_id
+from tenzir_platform.subcommand_sync import _revalidating
+
+_NODES = [
+    {"node_id": "n-1", "name": "alpha"},
+    {"node_id": "n-2", "name": "beta"},
+    {"node_id": "n-3", "name": "gamma"},
+]
+
+
+def _record(inventory: Inventory, nodes: list[dict[str, str]]) -> tuple[int, int, int, int]:
+    result = inventory.record("t-00000001", "nodes", nodes, "node_id", "name")
+    return result.added, result.changed, result.removed, result.total
+
+
+def test_record_counts_the_differences(platform):
+    inventory = Inventory(platform)
+    assert _record(inventory, _NODES) == (3, 0, 0, 3)
+    assert _record(inventory, _NODES) == (0, 0, 0, 3)
+    renamed = {"node_id": "n-2", "name": "delta"}
+    assert _record(inventory, [_NODES[0], renamed]) == (0, 1, 1, 2)
+    assert inventory.load("t-00000001", "nodes").objects == [_NODES[0], renamed]
+
+
+def test_reordering_is_not_a_change(platform):
+    inventory = Inventory(platform)
+    _record(inventory, _NODES)
+    assert _record(inventory, _NODES[::-1]) == (0, 0, 0, 3)
+    assert inventory.load("t-00000001", "nodes").objects == _NODES[::-1]
+
+
+def test_kinds_and_workspaces_are_separate(platform):
+    inventory = Inventory(platform)
+    _record(inventory, _NODES)
+    result = inventory.record("t-00000002", "nodes", [], "node_id")
+    assert result.removed == 0
+    assert len(inventory.load("t-00000001", "nodes").objects) == 3
+    with pytest.raises(PlatformCliError, match="no alerts in the local inventory"):
+        inventory.load("t-00000001", "alerts")
+
+
+def test_database_errors_are_reported(platform):
+    inventory = Inventory(platform)
+    os.makedirs(os.path.dirname(inventory.filename), exist_ok=True)
+    with open(inventory.filename, "w") as f:
+        f.write("not a database")
+    with pytest.raises(PlatformCliError, match="failed to update the local inventory"):
+        _record(inventory, _NODES)
+    with pytest.raises(PlatformCliError, match="failed to read the local inventory"):
+        inventory.load("t-00000001", "nodes")
+
+
+def test_offline_workspace_names_are_resolved_from_the_inventory(platform, monkeypatch):
+    def login(*_):
+        raise AssertionError("must not log in")
+
+    monkeypatch.setattr(oidc.IdTokenClient, "load_id_token", login)
+    workspaces = [
+        {"tenant_id": "t-00000001", "name": "prod"},
+        {"tenant_id": "t-00000002", "name": "staging"},
+    ]
+    Inventory(platform).record(GLOBAL, "workspaces", workspaces, "tenant_id", "name")
+    platform.workspace = "staging"
+    assert offline_workspace_id(platform) == "t-00000002"
+    platform.workspace = "0"
+    assert offline_workspace_id(platform) == "t-00000001"
+    platform.workspace = "t-00000003"
+    assert offline_workspace_id(platform) == "t-00000003"
+    platform.workspace = "stagign"
+    with pytest.raises(PlatformCliError, match="unknown workspace stagign"):
+        offline_workspace_id(platform)
+
+
+def test_sync_only_uses_the_response_cache_when_enabled(platform):
+    assert not _revalidating(platform).response_cache
+    platform.response_cache = True
+    revalidating = _revalidating(platform)
+    assert revalidating.response_cache
+    assert set(revalidating.response_cache_ttls.values()) == {0}
+    assert platform.response_cache_ttls != revalidating.response_cache_ttls
@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests import Response
+
+from tenzir_platform.helpers.memo import RequestMemo, current_memo, memoize_requests
+
+
+def _response(status_code: int = 200) -> Response:
+    resp = Response()
+    resp.status_code = status_code
+    return resp
+
+
+def test_concurrent_requests_are_coalesced():
+    memo = RequestMemo()
+    started = threading.Event()
+    release = threading.Event()
+    calls = 0
+
+    def fetch() -> Response:
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait()
+        return _response()
+
+    with ThreadPoolExecutor(4) as executor:
+        first = executor.submit(memo.fetch, "list-nodes", fetch)
+        started.wait()
+        others = [executor.submit(memo.fetch, "list-nodes", fetch) for _ in range(3)]
+        release.set()
+        resp, shared = first.result()
+        assert not shared
+        assert all(other.result() == (resp, True) for other in others)
+    assert calls == 1
+
+
+def test_failed_responses_are_not_kept():
+    memo = RequestMemo()
+    resp, _ = memo.fetch("list-nodes", lambda: _response(502))
+    assert resp.status_code == 502
+    resp, shared = memo.fetch("list-nodes", lambda: _response(200))
+    assert resp.status_code == 200
+    assert not shared
+
+
+def test_exceptions_are_not_kept():
+    memo = RequestMemo()
+
+    def fail() -> Response:
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        memo.fetch("list-nodes", fail)
+    _, shared = memo.fetch("list-nodes", _response)
+    assert not shared
+
+
+def test_invalidate_drops_responses_and_derived_values():
+    memo = RequestMemo()
+    memo.fetch("list-nodes", _response)
+    assert memo.derived("index", lambda: 1) == 1
+    assert memo.derived("index", lambda: 2) == 1
+    memo.invalidate()
+    _, shared = memo.fetch("list-nodes", _response)
+    assert not shared
+    assert memo.derived("index", lambda: 2) == 2
+
+
+def test_memo_is_scoped_to_the_block():
+    assert current_memo() is None
+    with memoize_requests() as memo:
+        assert current_memo() is memo
+    assert current_memo() is None
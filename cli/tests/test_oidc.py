@@ -0,0 +1,209 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import threading
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import jwt
+import pytest
+import requests
+from requests import Response
+
+from tenzir_platform.helpers import oidc
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.oidc import IdTokenClient
+
+
+class _UnreachableSession:
+    def __init__(self, exception: Exception) -> None:
+        self.exception = exception
+
+    def request(self, *args, **kwargs):
+        raise self.exception
+
+
+@pytest.mark.parametrize(
+    ("exception", "message"),
+    [
+        (requests.exceptions.ConnectTimeout(), "timed out"),
+        (requests.exceptions.ConnectionError("refused"), "failed to reach"),
+        (requests.exceptions.SSLError("bad certificate"), "failed to reach"),
+    ],
+)
+def test_request_errors_become_cli_errors(platform, exception, message):
+    client = IdTokenClient(platform)
+    client.session = _UnreachableSession(exception)
+    with pytest.raises(PlatformCliError, match=message):
+        client._request("GET", "https://idp.example.com/.well-known/openid-configuration")
+
+
+def test_exit_waits_for_background_refreshes_only_briefly(monkeypatch):
+    monkeypatch.setattr(oidc, "_BACKGROUND_REFRESH_GRACE_PERIOD", 0.1)
+    done = threading.Event()
+    hanging = threading.Thread(target=done.wait, daemon=True)
+    finished = threading.Thread(target=lambda: None, daemon=True)
+    monkeypatch.setattr(oidc, "_background_refresh_threads", {hanging, finished})
+    hanging.start()
+    finished.start()
+    start = time.monotonic()
+    oidc._wait_for_background_refreshes()
+    assert time.monotonic() - start < 1
+    assert not finished.is_alive()
+    done.set()
+
+
+_ISSUER = "https://idp.example.com"
+_DISCOVERY_URL = f"{_ISSUER}/.well-known/openid-configuration"
+_JWKS_URL = f"{_ISSUER}/jwks"
+_SECRET = "0123456789abcdef0123456789abcdef"
+
+
+def _jwk(kid: str) -> dict[str, str]:
+    secret = jwt.utils.base64url_encode(_SECRET.encode()).decode()
+    return {"kty": "oct", "kid": kid, "use": "sig", "alg": "HS256", "k": secret}
+
+
+def _token(kid: str) -> str:
+    return jwt.encode({"sub": "user"}, _SECRET, algorithm="HS256", headers={"kid": kid})
+
+
+class _StubIdp:
+    """Serves the discovery document and the signing keys of an identity
+    provider, like the session of an `IdTokenClient`"""
+
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+        self.headers: dict[str, str] = {}
+        self.keys = [_jwk("k1")]
+        self.failing = False
+        self.requests: list[str] = []
+
+    def request(self, method, url, **kwargs) -> Response:
+        self.requests.append(url)
+        if self.failing:
+            raise requests.exceptions.ConnectionError("refused")
+        if url == _DISCOVERY_URL:
+            body: dict = {"jwks_uri": _JWKS_URL, "token_endpoint": f"{_ISSUER}/token"}
+        else:
+            assert url == _JWKS_URL
+            body = {"keys": self.keys}
+        resp = Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = json.dumps(body).encode()
+        resp.headers.update({"Date": formatdate(self.now, usegmt=True), **self.headers})
+        return resp
+
+
+@pytest.fixture
+def idp(platform, monkeypatch) -> _StubIdp:
+    idp = _StubIdp()
+    # Only the caches on disk are shared between the clients of a test.
+    monkeypatch.setattr(oidc, "_discovery_documents", {})
+    monkeypatch.setattr(oidc, "_signing_key_sets", {})
+    monkeypatch.setattr(
+        oidc, "time", SimpleNamespace(time=lambda: idp.now, monotonic=time.monotonic)
+    )
+    platform.issuer_url = _ISSUER
+    return idp
+
+
+def _client(platform, idp: _StubIdp, fresh_process: bool = False) -> IdTokenClient:
+    if fresh_process:
+        oidc._discovery_documents.clear()
+        oidc._signing_key_sets.clear()
+    client = IdTokenClient(platform)
+    client.session = idp
+    return client
+
+
+@pytest.mark.parametrize(
+    ("headers", "lifetime"),
+    [
+        ({}, oidc._DEFAULT_DISCOVERY_TTL),
+        ({"Cache-Control": "public, max-age=600"}, 600),
+        ({"Cache-Control": "max-age=600", "Age": "100"}, 500),
+        ({"Cache-Control": "no-cache, max-age=600"}, 0),
+        ({"Expires": formatdate(1_700_000_300, usegmt=True)}, 300),
+        ({"Expires": formatdate(1_700_000_300, usegmt=True), "Age": "100"}, 200),
+        ({"Expires": "0"}, 0),
+    ],
+)
+def test_discovery_documents_are_kept_as_long_as_allowed(platform, idp, headers, lifetime):
+    idp.headers = headers
+    assert _client(platform, idp).jwks_url == _JWKS_URL
+    expires_at, _ = oidc._discovery_documents[_DISCOVERY_URL]
+    assert expires_at - idp.now == lifetime
+
+
+def test_discovery_documents_are_cached_on_disk(platform, idp):
+    idp.headers = {"Cache-Control": "max-age=600"}
+    assert _client(platform, idp).jwks_url == _JWKS_URL
+    idp.now += 599
+    assert _client(platform, idp, fresh_process=True).jwks_url == _JWKS_URL
+    assert idp.requests == [_DISCOVERY_URL]
+    idp.now += 1
+    assert _client(platform, idp, fresh_process=True).jwks_url == _JWKS_URL
+    assert idp.requests == [_DISCOVERY_URL] * 2
+
+
+def test_stale_documents_are_used_when_the_idp_fails(platform, idp, capsys):
+    idp.headers = {"Cache-Control": "max-age=60"}
+    _client(platform, idp)._discover()
+    idp.now += 3600
+    idp.failing = True
+    platform.verbose = True
+    assert _client(platform, idp, fresh_process=True).jwks_url == _JWKS_URL
+    assert idp.requests == [_DISCOVERY_URL] * 2
+    assert capsys.readouterr().out.splitlines() == [
+        f"fetching {_DISCOVERY_URL}",
+        f"failed to refresh {_DISCOVERY_URL}, using cached document",
+    ]
+
+
+def test_failures_without_a_cached_document_are_errors(platform, idp):
+    idp.failing = True
+    with pytest.raises(PlatformCliError, match="failed to reach the identity provider"):
+        _client(platform, idp)._discover()
+
+
+def test_stale_signing_keys_are_used_when_the_idp_fails(platform, idp, capsys):
+    idp.headers = {"Cache-Control": "max-age=60"}
+    _client(platform, idp)._signing_key(_token("k1"))
+    idp.now += 3600
+    idp.failing = True
+    platform.verbose = True
+    client = _client(platform, idp, fresh_process=True)
+    assert client._signing_key(_token("k1")).key_id == "k1"
+    assert idp.requests == [_DISCOVERY_URL, _JWKS_URL] * 2
+    assert f"failed to refresh {_JWKS_URL}, using cached keys" in capsys.readouterr().out
+
+
+def test_unknown_key_ids_trigger_a_refetch(platform, idp):
+    _client(platform, idp)._signing_key(_token("k1"))
+    idp.now += oidc._JWKS_REFETCH_INTERVAL
+    idp.keys = [_jwk("k1"), _jwk("k2")]
+    client = _client(platform, idp, fresh_process=True)
+    assert client._signing_key(_token("k2")).key_id == "k2"
+    assert idp.requests == [_DISCOVERY_URL, _JWKS_URL, _JWKS_URL]
+    # The new keys replace the old ones on disk.
+    assert _client(platform, idp, fresh_process=True)._signing_key(_token("k2"))
+    assert len(idp.requests) == 3
+
+
+def test_refetches_are_rate_limited(platform, idp):
+    client = _client(platform, idp)
+    client._signing_key(_token("k1"))
+    idp.now += oidc._JWKS_REFETCH_INTERVAL - 1
+    idp.keys = [_jwk("k2")]
+    for _ in range(3):
+        with pytest.raises(PlatformCliError, match="invalid JWT") as e:
+            client._signing_key(_token("k2"))
+        assert e.value.hints == [f"no signing key with id k2 found at {_JWKS_URL}"]
+    assert idp.requests == [_DISCOVERY_URL, _JWKS_URL]
+    idp.now += 1
+    assert client._signing_key(_token("k2")).key_id == "k2"
+    assert idp.requests == [_DISCOVERY_URL, _JWKS_URL, _JWKS_URL]
@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import time
+
+import pytest
+
+from tenzir_platform.helpers.deadline import command_deadline
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.rate_limit import AdaptiveConcurrency, Throttle, TokenBucket
+
+
+def _start_requests(concurrency: AdaptiveConcurrency, count: int) -> list[float]:
+    starts = []
+    for _ in range(count):
+        concurrency.acquire()
+        starts.append(time.monotonic())
+    return starts
+
+
+def test_concurrency_is_halved_once_per_burst():
+    concurrency = AdaptiveConcurrency(8)
+    starts = _start_requests(concurrency, 8)
+    decreases = [concurrency.release(start, overloaded=True) for start in starts]
+    assert decreases == [True] + [False] * 7
+    assert concurrency.limit == 4
+
+
+def test_concurrency_is_halved_again_by_later_requests():
+    concurrency = AdaptiveConcurrency(8)
+    (start,) = _start_requests(concurrency, 1)
+    assert concurrency.release(start, overloaded=True)
+    (start,) = _start_requests(concurrency, 1)
+    assert concurrency.release(start, overloaded=True)
+    assert concurrency.limit == 2
+
+
+def test_concurrency_never_drops_below_one():
+    concurrency = AdaptiveConcurrency(2)
+    for _ in range(4):
+        (start,) = _start_requests(concurrency, 1)
+        concurrency.release(start, overloaded=True)
+    assert concurrency.limit == 1
+
+
+def test_concurrency_grows_by_one_per_window():
+    concurrency = AdaptiveConcurrency(8)
+    concurrency.limit = 4
+    for start in _start_requests(concurrency, 4):
+        concurrency.release(start, overloaded=False)
+    assert 4.9 < concurrency.limit < 5.1
+
+
+def test_rate_is_halved_once_per_burst():
+    bucket = TokenBucket(rate=16, burst=4)
+    start = time.monotonic()
+    assert bucket.decrease(start)
+    assert not bucket.decrease(start)
+    assert bucket.rate == 8
+    assert bucket.decrease(time.monotonic())
+    assert bucket.rate == 4
+
+
+def test_rate_recovers_additively():
+    bucket = TokenBucket(rate=16, burst=4)
+    bucket.decrease(time.monotonic())
+    bucket.increase()
+    assert bucket.rate == 9
+
+
+def test_waiting_for_a_slot_stops_at_the_deadline():
+    concurrency = AdaptiveConcurrency(1)
+    _start_requests(concurrency, 1)
+    start = time.monotonic()
+    with command_deadline(0.1), pytest.raises(PlatformCliError, match="deadline"):
+        concurrency.acquire()
+    assert time.monotonic() - start < 1
+
+
+def test_waiting_for_a_token_stops_at_the_deadline(monkeypatch):
+    bucket = TokenBucket(rate=0.1, burst=1)
+    bucket.acquire()
+    monkeypatch.setattr(time, "sleep", lambda _: pytest.fail("must not wait"))
+    with command_deadline(1), pytest.raises(PlatformCliError, match="deadline"):
+        bucket.acquire()
+
+
+def test_the_slot_is_returned_when_the_deadline_is_exceeded(platform):
+    platform.rate_limit = 0.1
+    platform.rate_limit_burst = 1
+    platform.adaptive_concurrency = True
+    platform.max_concurrency = 1
+    throttle = Throttle(platform)
+    assert throttle.bucket is not None and throttle.concurrency is not None
+    throttle.release(throttle.acquire(), 200)
+    with command_deadline(1), pytest.raises(PlatformCliError):
+        throttle.acquire()
+    assert throttle.concurrency._in_flight == 0
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import pytest
+
+from tenzir_platform.helpers.exceptions import PlatformCliError
+from tenzir_platform.helpers.resolver import Resolver
+
+_NODES = [
+    {"node_id": "n-1a2b3c4d", "name": "prod"},
+    {"node_id": "n-1a2b9999", "name": "staging"},
+    {"node_id": "n-77777777", "name": "twin"},
+    {"node_id": "n-88888888", "name": "twin"},
+]
+
+
+@pytest.fixture
+def nodes() -> Resolver[dict[str, str]]:
+    return Resolver(
+        "node", _NODES, id_of=lambda node: node["node_id"], name_of=lambda node: node["name"]
+    )
+
+
+def test_exact_ids_and_names_match(nodes):
+    assert nodes.resolve("n-1a2b3c4d") is _NODES[0]
+    assert nodes.resolve("staging") is _NODES[1]
+
+
+def test_shared_names_are_ambiguous(nodes):
+    with pytest.raises(PlatformCliError, match="ambiguous name twin"):
+        nodes.resolve("twin")
+    assert nodes.resolve("n-77777777") is _NODES[2]
+
+
+def test_unique_id_prefixes_match(nodes):
+    assert nodes.resolve("n-1a2b3") is _NODES[0]
+    assert nodes.resolve("n-7777") is _NODES[2]
+    with pytest.raises(PlatformCliError, match="ambiguous node id prefix n-1a2b"):
+        nodes.resolve("n-1a2b")
+
+
+@pytest.mark.parametrize("identifier", ["", "n", "n-", "n-1a2", "1a2b3c4d"])
+def test_short_or_untagged_prefixes_dont_match(nodes, identifier):
+    assert nodes.find(identifier) is None
+    with pytest.raises(PlatformCliError, match="unknown node"):
+        nodes.resolve(identifier)
+
+
+def test_typos_come_with_suggestions(nodes):
+    with pytest.raises(PlatformCliError, match="unknown node stagign") as e:
+        nodes.resolve("stagign")
+    assert e.value.hints == ["did you mean 'staging'?"]
+
+
+@pytest.mark.parametrize("identifier", ["w-abcd", "t-1a2b", "st-1a2b3c"])
+def test_prefixes_of_other_kinds_dont_match(identifier):
+    objects = [{"id": "w-abcd1234"}, {"id": "t-1a2b3c4d"}, {"id": "st-1a2b3c4d"}]
+    nodes = Resolver("node", objects, id_of=lambda obj: obj["id"], name_of=lambda obj: obj["id"])
+    assert nodes.find(identifier) is None
+
+
+def test_kinds_without_a_type_tag_need_full_ids():
+    secrets = Resolver(
+        "secret", [{"id": "s-1a2b3c4d"}], id_of=lambda s: s["id"], name_of=lambda s: s["id"]
+    )
+    assert secrets.find("s-1a2b3c4d") is not None
+    assert secrets.find("s-1a2b") is None
@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import time
+
+import pytest
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from tenzir_platform.helpers.cache import ResponseCache
+
+_USER = {"X-Tenzir-UserKey": "uk-1"}
+_LIST_NODES = {"tenant_id": "t-1"}
+
+
+def _response(content: bytes, etag: str | None = None) -> Response:
+    resp = Response()
+    resp.status_code = 200
+    resp._content = content
+    resp.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+    if etag is not None:
+        resp.headers["ETag"] = etag
+    return resp
+
+
+@pytest.fixture
+def cache(platform) -> ResponseCache:
+    platform.response_cache = True
+    platform.response_cache_ttls = {"list-nodes": 10}
+    return ResponseCache(platform)
+
+
+def test_cache_is_opt_in(platform):
+    cache = ResponseCache(platform)
+    assert cache.ttl("list-nodes") is None
+
+
+def test_entries_are_fresh_within_their_ttl(cache, monkeypatch):
+    cache.store("user", "list-nodes", _LIST_NODES, _USER, _response(b'{"nodes":[]}'))
+    entry = cache.lookup("user", "list-nodes", _LIST_NODES, _USER)
+    assert entry is not None
+    assert cache.is_fresh(entry, "list-nodes")
+    assert cache.to_response(entry, "url").json() == {"nodes": []}
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert not cache.is_fresh(entry, "list-nodes")
+
+
+def test_refresh_renews_an_entry(cache, monkeypatch):
+    cache.store("user", "list-nodes", _LIST_NODES, _USER, _response(b"{}", etag='"1"'))
+    entry = cache.lookup("user", "list-nodes", _LIST_NODES, _USER)
+    assert entry is not None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    cache.refresh("user", "list-nodes", _LIST_NODES, _USER, entry)
+    entry = cache.lookup("user", "list-nodes", _LIST_NODES, _USER)
+    assert entry is not None
+    assert entry["etag"] == '"1"'
+    assert cache.is_fresh(entry, "list-nodes")
+
+
+def test_entries_are_not_shared_across_credentials(cache):
+    cache.store("user", "list-nodes", _LIST_NODES, _USER, _response(b"{}"))
+    other = {"X-Tenzir-UserKey": "uk-2"}
+    assert cache.lookup("user", "list-nodes", _LIST_NODES, other) is None
+    revalidation = {**_USER, "If-None-Match": '"1"'}
+    assert cache.lookup("user", "list-nodes", _LIST_NODES, revalidation) is not None
+
+
+def test_modifying_requests_invalidate_their_workspace(cache):
+    other_workspace = {"tenant_id": "t-2"}
+    cache.store("user", "list-nodes", _LIST_NODES, _USER, _response(b"{}"))
+    cache.store("user", "list-nodes", other_workspace, _USER, _response(b"{}"))
+    cache.store("user", "get-login-info", None, {}, _response(b"{}"))
+    cache.invalidate({"tenant_id": "t-1", "name": "new-node"})
+    assert cache.lookup("user", "list-nodes", _LIST_NODES, _USER) is None
+    assert cache.lookup("user", "get-login-info", None, {}) is None
+    assert cache.lookup("user", "list-nodes", other_workspace, _USER) is not None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "not json",
+        "[]",
+        '{"status_code": 200, "content": "{}"}',
+        '{"stored_at": "yesterday", "status_code": 200, "content": "{}"}',
+    ],
+)
+def test_malformed_entries_are_ignored(cache, content):
+    cache.store("user", "list-nodes", _LIST_NODES, _USER, _response(b"{}"))
+    filename = cache._filename("user", "list-nodes", _LIST_NODES, _USER)
+    assert os.path.exists(filename)
+    with open(filename, "w") as f:
+        f.write(content)
+    assert cache.lookup("user", "list-nodes", _LIST_NODES, _USER) is None
+    assert not cache.is_fresh({}, "list-nodes")
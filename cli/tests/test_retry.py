@@ -0,0 +1,157 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import ssl
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests.exceptions
+import urllib3.exceptions
+from requests import Response
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from tenzir_platform.helpers.environment import PlatformEnvironment
+from tenzir_platform.helpers.retry import (
+    EndpointKind,
+    RetryPolicy,
+    certificate_rejected,
+    endpoint_kind,
+    is_idempotent,
+    is_read_only,
+)
+
+
+def _response(status_code: int, headers: dict[str, str] | None = None) -> Response:
+    resp = Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    return resp
+
+
+@pytest.fixture
+def policy() -> RetryPolicy:
+    return RetryPolicy(
+        PlatformEnvironment(
+            retry_max_retries=3,
+            retry_backoff_base=0.5,
+            retry_backoff_max=4,
+            retry_max_elapsed=10,
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "method,endpoint,expected",
+    [
+        ("GET", "global-tenant-list", EndpointKind.READ_ONLY),
+        ("POST", "global-tenant-list", EndpointKind.READ_ONLY),
+        ("POST", "list-nodes", EndpointKind.READ_ONLY),
+        ("POST", "secrets/list", EndpointKind.READ_ONLY),
+        ("POST", "org/get", EndpointKind.READ_ONLY),
+        ("POST", "org/list-members", EndpointKind.READ_ONLY),
+        ("POST", "get-login-info", EndpointKind.READ_ONLY),
+        ("POST", "switch-tenant", EndpointKind.IDEMPOTENT),
+        ("POST", "authenticate", EndpointKind.IDEMPOTENT),
+        ("POST", "create-node", EndpointKind.MODIFYING),
+        ("POST", "delete-node", EndpointKind.MODIFYING),
+        ("POST", "secrets/add", EndpointKind.MODIFYING),
+        ("POST", "org/create", EndpointKind.MODIFYING),
+        ("POST", "node-proxy/t-12345678/n-12345678/pipeline/list", EndpointKind.MODIFYING),
+        ("POST", "/node-proxy/t-12345678/n-12345678/get", EndpointKind.MODIFYING),
+        ("GET", "node-proxy/t-12345678/n-12345678/status", EndpointKind.MODIFYING),
+    ],
+)
+def test_endpoint_kind(method, endpoint, expected):
+    assert endpoint_kind(method, endpoint) == expected
+
+
+@pytest.mark.parametrize(
+    "endpoint", ["org/get", "list-nodes", "switch-tenant", "delete-node", "proxy"]
+)
+def test_read_only_endpoints_are_idempotent(endpoint):
+    if is_read_only("POST", endpoint):
+        assert is_idempotent("POST", endpoint)
+    assert is_idempotent("POST", endpoint) == (
+        endpoint_kind("POST", endpoint) is not EndpointKind.MODIFYING
+    )
+
+
+def test_read_only_gateway_errors_are_retried(policy):
+    assert policy.retryable_response(_response(502), is_idempotent("POST", "org/get"))
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_unprocessed_responses_are_always_retried(policy, status_code):
+    assert policy.retryable_response(_response(status_code), idempotent=False)
+
+
+@pytest.mark.parametrize("status_code", [502, 504])
+def test_gateway_errors_are_only_retried_when_idempotent(policy, status_code):
+    assert policy.retryable_response(_response(status_code), idempotent=True)
+    assert not policy.retryable_response(_response(status_code), idempotent=False)
+
+
+@pytest.mark.parametrize("status_code", [400, 403, 404, 500])
+def test_other_errors_are_not_retried(policy, status_code):
+    assert not policy.retryable_response(_response(status_code), idempotent=True)
+
+
+def test_connect_errors_are_always_retried(policy):
+    refused = MaxRetryError(None, "/", NewConnectionError(None, "refused"))  # type: ignore[arg-type]
+    e = requests.exceptions.ConnectionError(refused)
+    assert policy.retryable_exception(e, idempotent=False)
+    assert policy.retryable_exception(requests.exceptions.ConnectTimeout(), idempotent=False)
+
+
+def test_read_errors_are_only_retried_when_idempotent(policy):
+    e = requests.exceptions.ReadTimeout()
+    assert policy.retryable_exception(e, idempotent=True)
+    assert not policy.retryable_exception(e, idempotent=False)
+
+
+def test_rejected_certificates_are_not_retried(policy):
+    reason = urllib3.exceptions.SSLError()
+    reason.__cause__ = ssl.SSLCertVerificationError(
+        "certificate doesn't match any pinned certificate"
+    )
+    e = requests.exceptions.SSLError(MaxRetryError(None, "/", reason))  # type: ignore[arg-type]
+    assert certificate_rejected(e)
+    assert not policy.retryable_exception(e, idempotent=True)
+
+
+def test_invalid_requests_are_not_retried(policy):
+    e = requests.exceptions.InvalidURL()
+    assert not policy.retryable_exception(e, idempotent=True)
+
+
+def test_backoff_grows_exponentially_up_to_the_maximum(policy, monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    assert [policy.delay(retry, None) for retry in range(1, 6)] == [0.5, 1, 2, 4, 4]
+
+
+def test_backoff_uses_full_jitter(policy):
+    delays = [policy.delay(3, None) for _ in range(100)]
+    assert all(0 <= delay <= 2 for delay in delays)
+
+
+def test_retry_after_seconds_take_precedence(policy):
+    assert policy.delay(1, _response(503, {"Retry-After": "7"})) == 7
+
+
+def test_retry_after_date_take_precedence(policy):
+    date = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = policy.delay(1, _response(429, {"Retry-After": format_datetime(date, usegmt=True)}))
+    assert 25 < delay <= 30
+
+
+def test_invalid_retry_after_falls_back_to_backoff(policy):
+    assert policy.delay(1, _response(503, {"Retry-After": "soon"})) <= 0.5
+
+
+def test_retries_stay_within_the_budget(policy):
+    start = time.monotonic()
+    assert policy.within_budget(start, 9)
+    assert not policy.within_budget(start, 11)
+    assert not policy.within_budget(start - 8, 3)
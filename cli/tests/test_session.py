@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tenzir_platform.helpers.session import PreconnectingSession, close_sessions, preconnect
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        self.server.connections += 1  # type: ignore[attr-defined]
+        super().setup()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _respond(self) -> None:
+        # Make the connection setup slow enough for the requests to overlap.
+        time.sleep(0.1)
+        self.send_response(200 if self.command == "POST" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_HEAD = _respond
+    do_POST = _respond
+
+
+@pytest.fixture
+def server() -> Iterator[ThreadingHTTPServer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.connections = 0  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_use_the_connection_opened_ahead_of_time(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = PreconnectingSession()
+    preconnect = threading.Thread(target=session.preconnect, args=(url, (1, 1)))
+    preconnect.start()
+    time.sleep(0.02)
+    assert session.request("POST", url + "/user/list-nodes", timeout=1).status_code == 200
+    preconnect.join()
+    assert server.connections == 1
+
+
+def test_no_preconnect_to_contacted_hosts(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = PreconnectingSession()
+    session.request("POST", url + "/user/list-nodes", timeout=1)
+    start = time.monotonic()
+    session.preconnect(url, (1, 1))
+    assert time.monotonic() - start < 0.05
+    assert server.connections == 1
+
+
+def test_preconnect_is_opt_in(server, platform):
+    platform.api_endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    preconnect(platform, platform.api_endpoint)
+    assert server.connections == 0
+    platform.preconnect = True
+    preconnect(platform, platform.api_endpoint)
+    assert server.connections == 1
+    close_sessions()
@@ -0,0 +1,43 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+from tenzir_platform import tenzir_platform
+from tenzir_platform.subcommand_shell import _Shell
+
+
+def test_completes_verbs(platform):
+    shell = _Shell(platform)
+    assert "list" in shell.completedefault("li", "node li", 5, 7)
+
+
+def test_completes_names_with_hyphens(platform):
+    shell = _Shell(platform)
+    shell._completions["node ping"] = ["my-node", "my-other-node", "node"]
+    line = "node ping my-o"
+    assert shell.completedefault("my-o", line, 10, len(line)) == ["my-other-node"]
+
+
+def test_completes_after_global_options(platform):
+    shell = _Shell(platform)
+    line = "--workspace staging -v node li"
+    assert "list" in shell.completedefault("li", line, len(line) - 2, len(line))
+
+
+def test_lines_may_start_with_global_options(platform, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(
+        tenzir_platform, "_dispatch", lambda platform, argv: dispatched.append((platform, argv))
+    )
+    shell = _Shell(platform)
+    shell.onecmd("--workspace=staging -v node list")
+    [(command_platform, argv)] = dispatched
+    assert argv == ["node", "list"]
+    assert command_platform.workspace == "staging"
+    assert command_platform.verbose
+    assert platform.workspace is None
+
+
+def test_nested_shells_are_rejected(platform, capsys):
+    shell = _Shell(platform)
+    shell.onecmd("-v shell")
+    assert "'shell' is not available in the shell" in capsys.readouterr().err
@@ -0,0 +1,191 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import contextvars
+import json
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from tenzir_platform.helpers.session import close_sessions, shared_session
+from tenzir_platform.helpers.timings import (
+    Http2TraceRecorder,
+    RequestTiming,
+    begin_request,
+    print_summary,
+    record_requests,
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = b'{"nodes": []}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server() -> Iterator[ThreadingHTTPServer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def records() -> Iterator[list[RequestTiming]]:
+    with record_requests() as records:
+        yield records
+
+
+def test_requests_are_recorded(server, platform, records):
+    platform.timings = True
+    url = f"http://127.0.0.1:{server.server_address[1]}/user/list-nodes"
+    session = shared_session(platform)
+    try:
+        for _ in range(2):
+            assert session.request("POST", url, data=b"{}", timeout=1).status_code == 200
+    finally:
+        close_sessions()
+    first, second = records
+    assert not first.reused_connection
+    assert second.reused_connection
+    for record in (first, second):
+        assert record.method == "POST"
+        assert record.status_code == 200
+        assert record.http_version == "HTTP/1.1"
+        assert (record.bytes_sent, record.bytes_received) == (2, 13)
+        assert record.dns is None and record.connect is None and record.tls is None
+        assert record.total is not None and record.ttfb is not None
+        assert record.transfer is not None
+        assert record.ttfb + record.transfer <= record.total
+
+
+def test_http2_trace_events_fill_the_phases(records):
+    recorder = Http2TraceRecorder("POST", "https://example.com/user/list-nodes")
+    for event in [
+        "connection.connect_tcp.started",
+        "connection.connect_tcp.complete",
+        "connection.start_tls.started",
+        "connection.start_tls.complete",
+        "http2.send_request_headers.started",
+        "http2.send_request_headers.complete",
+        "http2.receive_response_headers.started",
+        "http2.receive_response_headers.complete",
+    ]:
+        recorder(event, {})
+    resp = SimpleNamespace(
+        status_code=200,
+        http_version="HTTP/2",
+        num_bytes_downloaded=13,
+        request=SimpleNamespace(content=b"{}"),
+    )
+    recorder.finish(resp)
+    [record] = records
+    assert not record.reused_connection
+    assert record.connect is not None and record.tls is not None
+    assert record.ttfb is not None and record.transfer is not None
+    assert (record.status_code, record.http_version) == (200, "HTTP/2")
+    assert (record.bytes_sent, record.bytes_received) == (2, 13)
+
+
+def test_summary_lists_every_request_and_the_total(records, capsys):
+    records.append(
+        RequestTiming(
+            method="POST",
+            url="https://example.com/user/list-nodes",
+            status_code=200,
+            ttfb=0.02,
+            transfer=0.001,
+            total=0.021,
+            bytes_sent=2,
+            bytes_received=13,
+        )
+    )
+    records.append(RequestTiming(method="POST", url="https://example.com/user/alert/list"))
+    records[-1].error = "ConnectTimeout"
+    print_summary(records)
+    lines = capsys.readouterr().err.splitlines()
+    assert lines[0] == "durations in ms, sizes in bytes"
+    assert lines[1].split() == [
+        "method",
+        "host",
+        "path",
+        "status",
+        "dns",
+        "connect",
+        "tls",
+        "ttfb",
+        "transfer",
+        "total",
+        "sent",
+        "received",
+    ]
+    assert lines[2].split() == [
+        "POST",
+        "example.com",
+        "/user/list-nodes",
+        "200",
+        "-",
+        "-",
+        "-",
+        "20.0",
+        "1.0",
+        "21.0",
+        "2",
+        "13",
+    ]
+    assert lines[3].split()[3] == "ConnectTimeout"
+    assert lines[4].split()[:4] == ["total", "2", "requests", "0.0"]
+
+
+def test_summary_as_json(records, capsys):
+    records.append(RequestTiming(method="POST", url="https://example.com/user/list-nodes"))
+    print_summary(records, as_json=True)
+    [record] = json.loads(capsys.readouterr().err)
+    assert record["method"] == "POST"
+    assert record["reused_connection"]
+
+
+def test_summary_without_requests(records, capsys):
+    print_summary(records)
+    assert capsys.readouterr().err == "no requests were made\n"
+
+
+def test_commands_only_record_their_own_requests(records):
+    def command(name: str) -> list[RequestTiming]:
+        with record_requests() as own:
+            begin_request("POST", f"https://example.com/user/{name}")
+        return own
+
+    # Like the commands of a parallel batch.
+    names = ["c0", "c1"]
+    contexts = [contextvars.copy_context() for _ in names]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(
+            executor.map(lambda context, name: context.run(command, name), contexts, names)
+        )
+    assert [[record.url for record in result] for result in results] == [
+        ["https://example.com/user/c0"],
+        ["https://example.com/user/c1"],
+    ]
+    assert sorted(record.url for record in records) == [
+        "https://example.com/user/c0",
+        "https://example.com/user/c1",
+    ]
+    begin_request("POST", "https://example.com/user/outside")
+    assert len(records) == 3
@@ -0,0 +1,26 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+from urllib3.util.ssl_ import create_urllib3_context
+
+from tenzir_platform.helpers.tls import (
+    _URLLIB3_CONTEXT_SETTINGS,
+    PlatformSSLContext,
+    shared_ssl_context,
+)
+
+
+def test_context_has_the_settings_of_urllib3(platform):
+    context = shared_ssl_context(platform)
+    assert isinstance(context, PlatformSSLContext)
+    defaults = create_urllib3_context()
+    for setting in _URLLIB3_CONTEXT_SETTINGS:
+        assert getattr(context, setting, None) == getattr(defaults, setting, None), setting
+
+
+def test_pins_apply_to_the_api_endpoint_only(platform):
+    platform.api_endpoint = "https://rest.example.com/v1"
+    platform.pinned_certificates = ["AB:CD"]
+    context = shared_ssl_context(platform)
+    assert context.pinned_hosts == {"rest.example.com"}
+    assert context.pinned_fingerprints == {"abcd"}
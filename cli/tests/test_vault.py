@@ -0,0 +1,53 @@
+# SPDX-FileCopyrightText: (c) 2024 The Tenzir Contributors
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import time
+
+import pytest
+
+from tenzir_platform.helpers import cache
+from tenzir_platform.helpers.cache import load_vault_entry, store_workspace
+from tenzir_platform.helpers.exceptions import PlatformCliError
+
+
+def test_entries_are_found_by_id_and_name(platform):
+    store_workspace(platform, "t-00000001", "uk-1", name="prod", select=False)
+    assert load_vault_entry(platform, "t-00000001")["user_key"] == "uk-1"
+    assert load_vault_entry(platform, "prod")["user_key"] == "uk-1"
+    assert load_vault_entry(platform, "staging") is None
+
+
+def test_renewing_a_key_keeps_the_name(platform):
+    store_workspace(platform, "t-00000001", "uk-1", name="prod", select=False)
+    store_workspace(platform, "t-00000001", "uk-2", select=False)
+    assert load_vault_entry(platform, "prod")["user_key"] == "uk-2"
+
+
+def test_stale_names_are_not_used(platform, monkeypatch):
+    store_workspace(platform, "t-00000001", "uk-1", name="prod", select=False)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + cache._WORKSPACE_NAME_TTL)
+    assert load_vault_entry(platform, "prod") is None
+    assert load_vault_entry(platform, "t-00000001") is not None
+
+
+def test_names_move_to_the_workspace_that_has_them_now(platform):
+    store_workspace(platform, "t-00000001", "uk-1", name="prod", select=False)
+    store_workspace(platform, "t-00000002", "uk-2", name="prod", select=False)
+    assert load_vault_entry(platform, "prod")["workspace_id"] == "t-00000002"
+    assert load_vault_entry(platform, "t-00000001")["name"] is None
+
+
+def test_ambiguous_names_fail(platform):
+    store_workspace(platform, "t-00000001", "uk-1", name="prod", select=False)
+    store_workspace(platform, "t-00000002", "uk-2", name="staging", select=False)
+    # E.g. written by an older version that didn't keep names unique.
+    filename = cache._vault_filename(platform, "t-00000002")
+    with open(filename) as f:
+        entry = json.load(f)
+    entry["name"] = "prod"
+    with open(filename, "w") as f:
+        json.dump(entry, f)
+    with pytest.raises(PlatformCliError, match="ambiguous name prod"):
+        load_vault_entry(platform, "prod")